@@ -0,0 +1,37 @@
+"""Add next_index to shows
+
+Revision ID: 8d1c3f0a2b71
+Revises: 5ba77e74c697
+Create Date: 2026-10-17 09:12:41.218305
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "8d1c3f0a2b71"
+down_revision: Union[str, Sequence[str], None] = "5ba77e74c697"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table("shows", schema=None) as batch_op:
+        batch_op.add_column(sa.Column("next_index", sa.Integer(), nullable=True))
+
+    # Shows saved before this column existed continue after their last episode.
+    op.execute(
+        "UPDATE shows SET next_index = "
+        "(SELECT MAX(episode_index) + 1 FROM episodes WHERE episodes.show_id = shows.id)"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table("shows", schema=None) as batch_op:
+        batch_op.drop_column("next_index")
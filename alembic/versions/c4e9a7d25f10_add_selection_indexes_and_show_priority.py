@@ -0,0 +1,47 @@
+"""Add selection indexes and show priority
+
+Revision ID: c4e9a7d25f10
+Revises: 8d1c3f0a2b71
+Create Date: 2026-10-17 10:03:17.542816
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "c4e9a7d25f10"
+down_revision: Union[str, Sequence[str], None] = "8d1c3f0a2b71"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table("shows", schema=None) as batch_op:
+        batch_op.add_column(sa.Column("priority", sa.Integer(), nullable=True))
+
+    with op.batch_alter_table("episodes", schema=None) as batch_op:
+        batch_op.create_index(
+            "ix_episodes_show_id_modification_time",
+            ["show_id", "modification_time"],
+            unique=False,
+        )
+        batch_op.create_index(
+            "ix_episodes_show_id_episode_index",
+            ["show_id", "episode_index"],
+            unique=False,
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table("episodes", schema=None) as batch_op:
+        batch_op.drop_index("ix_episodes_show_id_episode_index")
+        batch_op.drop_index("ix_episodes_show_id_modification_time")
+
+    with op.batch_alter_table("shows", schema=None) as batch_op:
+        batch_op.drop_column("priority")
@@ -0,0 +1,40 @@
+import os
+import pathlib
+import tempfile
+
+
+def write_bytes(path: pathlib.Path, data: bytes) -> None:
+    """Replace |path| with |data| so a crash leaves either the old or new file.
+
+    The data is written to a temporary file in the same folder, flushed to
+    disk and then renamed over |path|.
+    """
+    fd, temp_path = tempfile.mkstemp(
+        prefix=path.name + ".", suffix=".tmp", dir=path.parent
+    )
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+    fsync_folder(path.parent)
+
+
+def write_text(path: pathlib.Path, text: str) -> None:
+    write_bytes(path, text.encode("utf-8"))
+
+
+def fsync_folder(folder: pathlib.Path) -> None:
+    """Flush a folder's entries, so a rename or new file in it survives a crash."""
+    # Windows can't open folders, and flushes renames without being asked.
+    if os.name == "nt":
+        return
+    fd = os.open(folder, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
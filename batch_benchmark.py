@@ -0,0 +1,102 @@
+import argparse
+import datetime
+import pathlib
+import random
+import sys
+import time
+import typing
+
+import full_podcast_episode
+import podcast_database
+import podcast_episode
+import podcast_show
+
+
+def _create_database(
+    num_shows: int, num_episodes: int, rng: random.Random
+) -> podcast_database.PodcastDatabase:
+    podcast_shows = []
+    for show_index in range(num_shows):
+        show = podcast_show.PodcastShow(
+            pathlib.Path("show_%04d" % (show_index)).absolute(),
+            rng.choice(podcast_show.PRIORITY_RANGE),
+            speed=rng.choice([1.0, 1.25, 1.55, 2.0]),
+        )
+        show.episodes = [
+            podcast_episode.PodcastEpisode(
+                pathlib.Path(show.podcast_folder, "episode_%04d.mp3" % (i)),
+                i + 1,
+                # Between 10 minutes and 3 hours long.
+                rng.randint(10 * 60, 3 * 60 * 60),
+                rng.randint(0, 365 * 24 * 60 * 60),
+            )
+            for i in range(num_episodes)
+        ]
+        podcast_shows.append(show)
+    return podcast_database.PodcastDatabase(podcast_shows, False)
+
+
+def _time(
+    select: typing.Callable[[], typing.List[full_podcast_episode.FullPodcastEpisode]],
+    repeat: int,
+) -> typing.Tuple[float, datetime.timedelta]:
+    best = None
+    listening_time = datetime.timedelta()
+    for _ in range(repeat):
+        start = time.perf_counter()
+        episodes = select()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+        listening_time = sum((x.listening_time for x in episodes), datetime.timedelta())
+    assert best is not None
+    return best, listening_time
+
+
+def main(args: typing.Optional[typing.List[str]]) -> int:
+    parser = argparse.ArgumentParser(
+        description="Compare picking a batch at random with the batch optimizer"
+    )
+    parser.add_argument("--shows", type=int, default=200, help="Number of shows")
+    parser.add_argument(
+        "--episodes", type=int, default=20, help="Number of episodes per show"
+    )
+    parser.add_argument(
+        "--hours", type=float, default=40, help="Listening time to fill, in hours"
+    )
+    parser.add_argument(
+        "--seed", type=int, default=0, help="Seed for the shows and random picks"
+    )
+    parser.add_argument(
+        "--repeat", type=int, default=3, help="Number of times to time each pick"
+    )
+    parsed_args = parser.parse_args(args)
+
+    database = _create_database(
+        parsed_args.shows, parsed_args.episodes, random.Random(parsed_args.seed)
+    )
+    duration_limit = datetime.timedelta(hours=parsed_args.hours)
+
+    random_time, random_total = _time(
+        lambda: database.get_podcast_episodes_by_priority(
+            duration_limit, lambda _: True, rng=random.Random(parsed_args.seed)
+        ),
+        parsed_args.repeat,
+    )
+    optimized_time, optimized_total = _time(
+        lambda: database.fill_podcast_episodes_by_priority(
+            duration_limit, lambda _: True
+        ),
+        parsed_args.repeat,
+    )
+
+    print(
+        "Filling %s from %d episodes"
+        % (duration_limit, parsed_args.shows * parsed_args.episodes)
+    )
+    print("random:    %.3fs, %s listening time" % (random_time, random_total))
+    print("optimized: %.3fs, %s listening time" % (optimized_time, optimized_total))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
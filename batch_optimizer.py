@@ -0,0 +1,107 @@
+import datetime
+import heapq
+import itertools
+import time
+import typing
+
+import full_podcast_episode
+
+# Give up on an exact fill after this long, and fill greedily instead.
+DEFAULT_TIME_LIMIT_SECONDS = 2.0
+
+_Episodes_TypeAlias = typing.Sequence[full_podcast_episode.FullPodcastEpisode]
+
+
+def _seconds(episode: full_podcast_episode.FullPodcastEpisode) -> int:
+    return round(episode.listening_time.total_seconds())
+
+
+def _prefix_times(episodes: _Episodes_TypeAlias, capacity: int) -> typing.List[int]:
+    """The listening time of each prefix of |episodes| that fits in |capacity|."""
+    prefix_times = []
+    for total in itertools.accumulate(_seconds(x) for x in episodes):
+        if total > capacity:
+            break
+        prefix_times.append(total)
+    return prefix_times
+
+
+def _first_fit(
+    shows: typing.Sequence[_Episodes_TypeAlias], capacity: int
+) -> typing.List[full_podcast_episode.FullPodcastEpisode]:
+    """Add the oldest episodes that fit, stopping a show at its first miss."""
+    picked = []
+    full_shows = set()
+    used = 0
+    for show_index, episode in heapq.merge(
+        *[[(i, x) for x in episodes] for i, episodes in enumerate(shows)],
+        key=lambda x: x[1].modification_time,
+    ):
+        if show_index in full_shows:
+            continue
+        seconds = _seconds(episode)
+        if used + seconds > capacity:
+            full_shows.add(show_index)
+            continue
+        used += seconds
+        picked.append(episode)
+    return picked
+
+
+def fill_duration(
+    shows: typing.Sequence[_Episodes_TypeAlias],
+    duration_limit: datetime.timedelta,
+    time_limit: float = DEFAULT_TIME_LIMIT_SECONDS,
+) -> typing.List[full_podcast_episode.FullPodcastEpisode]:
+    """Pick episodes whose listening time comes closest to |duration_limit|.
+
+    |shows| holds each show's episodes oldest first, and only a prefix of each
+    show is picked, so no episode is picked before an older one from its show.
+    The total never goes over |duration_limit|. Listening times are rounded to
+    the second.
+
+    This is a knapsack over the prefixes of each show, with the reachable
+    totals kept as the bits of an int. If that takes longer than |time_limit|
+    seconds, the oldest episodes that fit are picked instead.
+    """
+    capacity = int(duration_limit.total_seconds())
+    if capacity <= 0:
+        return []
+
+    deadline = time.monotonic() + time_limit
+    mask = (1 << (capacity + 1)) - 1
+    prefix_times = [_prefix_times(x, capacity) for x in shows]
+    # Bit t of reachable[i] is set if the first i shows can total t seconds.
+    reachable = [1]
+    for times in prefix_times:
+        previous = reachable[-1]
+        current = previous
+        for total in times:
+            # Checked for every episode, as one show can have a lot of them.
+            if time.monotonic() > deadline:
+                return _first_fit(shows, capacity)
+            current |= previous << total
+        reachable.append(current & mask)
+
+    # Walk back through the shows, finding a prefix of each that reaches the
+    # best total. Taking fewer episodes first leaves more for earlier shows.
+    target = reachable[-1].bit_length() - 1
+    counts = []
+    for show_index in reversed(range(len(shows))):
+        previous = reachable[show_index]
+        count = 0
+        if not (previous >> target) & 1:
+            for count, total in enumerate(prefix_times[show_index], 1):
+                if total <= target and (previous >> (target - total)) & 1:
+                    target -= total
+                    break
+        counts.append(count)
+    counts.reverse()
+
+    picked = [
+        episode
+        for episodes, count in zip(shows, counts)
+        for episode in episodes[:count]
+    ]
+    picked.sort(key=lambda x: x.modification_time)
+    return picked
@@ -0,0 +1,110 @@
+import datetime
+import itertools
+import pathlib
+import typing
+import unittest
+from unittest import mock
+
+import archive
+import batch_optimizer
+import full_podcast_episode
+
+
+def _show(
+    name: str, seconds: typing.List[int], speed: float = 1.0
+) -> typing.List[full_podcast_episode.FullPodcastEpisode]:
+    return [
+        full_podcast_episode.FullPodcastEpisode(
+            index=i + 1,
+            path=pathlib.Path(name, "podcast_%d.mp3" % (i)),
+            podcast_show_name=name,
+            speed=speed,
+            archive=archive.Archive.NO,
+            modification_time=datetime.datetime.fromtimestamp(1000 * i + len(name)),
+            duration=datetime.timedelta(seconds=x),
+        )
+        for i, x in enumerate(seconds)
+    ]
+
+
+class TestBatchOptimizer(unittest.TestCase):
+    def test_fill_duration(self) -> None:
+        first = _show("first", [30, 40])
+        second = _show("second", [50])
+
+        # 30 + 40 + 50 is too long, and 40 can't be picked without 30.
+        self.assertEqual(
+            [first[0], second[0]],
+            batch_optimizer.fill_duration(
+                [first, second], datetime.timedelta(seconds=90)
+            ),
+        )
+        # Picks come out oldest first.
+        self.assertEqual(
+            [first[0], second[0], first[1]],
+            batch_optimizer.fill_duration(
+                [first, second], datetime.timedelta(seconds=120)
+            ),
+        )
+
+    def test_fill_duration_uses_speed(self) -> None:
+        slow = _show("slow", [60])
+        fast = _show("fast", [100], speed=2.0)
+
+        self.assertEqual(
+            fast,
+            batch_optimizer.fill_duration([slow, fast], datetime.timedelta(seconds=55)),
+        )
+
+    def test_fill_duration_nothing_fits(self) -> None:
+        show = _show("show", [100])
+
+        self.assertEqual(
+            [], batch_optimizer.fill_duration([show], datetime.timedelta(seconds=50))
+        )
+        self.assertEqual(
+            [], batch_optimizer.fill_duration([show], datetime.timedelta())
+        )
+
+    def test_fill_duration_out_of_time(self) -> None:
+        first = _show("first", [60, 10])
+        second = _show("second", [20, 30])
+
+        # The oldest episodes are added while they fit, and a show stops at its
+        # first episode that doesn't.
+        self.assertEqual(
+            [first[0], second[0]],
+            batch_optimizer.fill_duration(
+                [first, second], datetime.timedelta(seconds=85), time_limit=-1
+            ),
+        )
+
+    @mock.patch("time.monotonic")
+    def test_fill_duration_out_of_time_in_one_show(
+        self, mock_monotonic: mock.Mock
+    ) -> None:
+        first = _show("first", [50])
+        large = _show("large", [40, 40] + [10] * 10000)
+        duration_limit = datetime.timedelta(seconds=80)
+
+        # Without a time limit, both of the large show's first episodes fit.
+        mock_monotonic.return_value = 0.0
+        self.assertEqual(
+            large[:2], batch_optimizer.fill_duration([first, large], duration_limit)
+        )
+
+        # Time runs out partway through the last show, which is still noticed
+        # before that show is done.
+        mock_monotonic.reset_mock()
+        mock_monotonic.side_effect = itertools.chain([0.0] * 3, itertools.repeat(1.0))
+        self.assertEqual(
+            first,
+            batch_optimizer.fill_duration(
+                [first, large], duration_limit, time_limit=0.5
+            ),
+        )
+        self.assertEqual(4, mock_monotonic.call_count)
+
+
+if __name__ == "__main__":
+    unittest.main()
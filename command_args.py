@@ -7,6 +7,12 @@ import typing
 class Args:
     dry_run: bool = False
     verbose: bool = False
+    # Fill the batch's time as tightly as possible instead of picking at random.
+    optimize_batch: bool = False
+    # Convert files in worker processes started once, instead of one per file.
+    worker_pool: bool = False
+    # Run ffmpeg directly from an event loop, with progress and timeouts.
+    async_conversion: bool = False
 
 
 def parse_args(args: typing.Optional[typing.List[str]] = None) -> Args:
@@ -17,6 +17,18 @@ class TestCommandsArgs(unittest.TestCase):
         parsed_args = command_args.parse_args(["--dry_run"])
         self.assertTrue(parsed_args.dry_run)
 
+    def test_set_optimize_batch(self) -> None:
+        parsed_args = command_args.parse_args(["--optimize_batch"])
+        self.assertTrue(parsed_args.optimize_batch)
+
+    def test_set_worker_pool(self) -> None:
+        parsed_args = command_args.parse_args(["--worker_pool"])
+        self.assertTrue(parsed_args.worker_pool)
+
+    def test_set_async_conversion(self) -> None:
+        parsed_args = command_args.parse_args(["--async_conversion"])
+        self.assertTrue(parsed_args.async_conversion)
+
     def test_try_set_invalid_parameter(self) -> None:
         with self.assertRaises(argparse.ArgumentError):
             command_args.parse_args(["--fake-flag-name"])
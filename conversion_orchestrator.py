@@ -0,0 +1,260 @@
+import asyncio
+import dataclasses
+import datetime
+import os
+import pathlib
+import shutil
+import subprocess
+import tempfile
+import typing
+
+import audio_metadata
+import conversions
+import loudness_cache
+
+DEFAULT_JOB_TIMEOUT = datetime.timedelta(hours=2)
+# Progress is reported each time a job gets this many percent further along.
+PROGRESS_REPORT_STEP = 10
+
+# Write progress to stdout instead of stats to stderr.
+FFMPEG_GLOBAL_ARGS = ["-nostdin", "-nostats", "-hide_banner", "-progress", "pipe:1"]
+# Conversions also quiet everything but errors, while measurements need the
+# loudness loudnorm logs.
+FFMPEG_CONVERSION_ARGS = FFMPEG_GLOBAL_ARGS + ["-loglevel", "error"]
+
+
+class ConversionError(Exception):
+    pass
+
+
+@dataclasses.dataclass
+class ConversionJob:
+    file: pathlib.Path
+    destination: pathlib.Path
+    title: str
+    album: str
+    speed: float
+    # How long the converted file should be, used to report progress.
+    expected_duration: datetime.timedelta
+    archive_destination: typing.Optional[pathlib.Path] = None
+    # Folder of the loudness cache, to normalize loudness in two passes.
+    loudness_cache: typing.Optional[pathlib.Path] = None
+    # Threads for each ffmpeg run, or None to let ffmpeg decide.
+    threads: typing.Optional[int] = None
+
+
+Report_Alias = typing.Callable[[ConversionJob, str], None]
+
+
+def parse_progress(line: str) -> typing.Optional[datetime.timedelta]:
+    """Return how much has been converted from a line of ffmpeg's -progress output."""
+    key, _, value = line.strip().partition("=")
+    if key != "out_time_us":
+        return None
+    try:
+        return datetime.timedelta(microseconds=int(value))
+    except ValueError:
+        # ffmpeg reports N/A until it has written something.
+        return None
+
+
+def _copy_into_place(working_copy: pathlib.Path, destination: pathlib.Path) -> None:
+    # The copy is renamed over |destination| once it's complete, so a partial
+    # file never shows up under the destination's name.
+    fd, temp_path = tempfile.mkstemp(
+        prefix=destination.name + ".", suffix=".tmp", dir=destination.parent
+    )
+    os.close(fd)
+    try:
+        shutil.copyfile(working_copy, temp_path)
+        os.replace(temp_path, destination)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+
+
+def _copy_to_archive(file: pathlib.Path, archive_destination: pathlib.Path) -> None:
+    os.makedirs(archive_destination.parent, exist_ok=True)
+    shutil.copyfile(file, archive_destination)
+
+
+async def _report_progress(
+    stdout: asyncio.StreamReader,
+    job: ConversionJob,
+    expected_duration: datetime.timedelta,
+    action: str,
+    report: Report_Alias,
+) -> None:
+    expected_seconds = expected_duration.total_seconds()
+    reported = 0
+    async for line in stdout:
+        converted = parse_progress(line.decode("utf-8", errors="replace"))
+        if converted is None or expected_seconds <= 0:
+            continue
+        percent = min(100, int(100 * converted.total_seconds() / expected_seconds))
+        step = percent - percent % PROGRESS_REPORT_STEP
+        if step > reported:
+            reported = step
+            report(job, "%d%% %s" % (step, action))
+
+
+async def _run_ffmpeg(
+    job: ConversionJob,
+    args: typing.List[str],
+    expected_duration: datetime.timedelta,
+    action: str,
+    report: Report_Alias,
+) -> str:
+    """Run ffmpeg with |args|, reporting its progress, and return its stderr."""
+    process = await asyncio.create_subprocess_exec(
+        *args,
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+    )
+    assert process.stdout is not None and process.stderr is not None
+
+    try:
+        _, output, return_code = await asyncio.gather(
+            _report_progress(process.stdout, job, expected_duration, action, report),
+            process.stderr.read(),
+            process.wait(),
+        )
+    except BaseException:
+        # Cancelled or timed out, so stop ffmpeg before its output is cleaned up.
+        if process.returncode is None:
+            process.kill()
+            await process.wait()
+        raise
+
+    errors = output.decode("utf-8", errors="replace").strip()
+    if return_code != 0:
+        raise ConversionError(
+            "ffmpeg failed on %s (exit code %d):\n%s" % (job.file, return_code, errors)
+        )
+    return errors
+
+
+async def _measure_loudness(
+    job: ConversionJob, cache_folder: pathlib.Path, report: Report_Alias
+) -> conversions.LoudnessMeasurement:
+    cache = loudness_cache.LoudnessCache(cache_folder)
+    measurement = await asyncio.to_thread(cache.get, job.file)
+    if measurement is not None:
+        report(job, "Using cached loudness measurement")
+        return measurement
+
+    args = conversions.loudness_measurement_args(
+        job.file, FFMPEG_GLOBAL_ARGS, job.threads
+    )
+    # The measurement is of the file before it's sped up.
+    output = await _run_ffmpeg(
+        job, args, job.expected_duration * job.speed, "measured", report
+    )
+    measurement = conversions.parse_loudness_measurement(output)
+    await asyncio.to_thread(cache.add, job.file, measurement)
+    return measurement
+
+
+async def _convert(
+    job: ConversionJob, working_copy: pathlib.Path, report: Report_Alias
+) -> None:
+    measurement = None
+    if job.loudness_cache:
+        measurement = await _measure_loudness(job, job.loudness_cache, report)
+
+    args = conversions.adjusted_podcast_for_playback_args(
+        job.file,
+        working_copy,
+        job.speed,
+        measurement,
+        FFMPEG_CONVERSION_ARGS,
+        job.threads,
+    )
+    await _run_ffmpeg(job, args, job.expected_duration, "converted", report)
+
+
+async def _run_job(
+    job: ConversionJob,
+    semaphore: asyncio.Semaphore,
+    dry_run: bool,
+    timeout: datetime.timedelta,
+    report: Report_Alias,
+) -> None:
+    async with semaphore:
+        if job.archive_destination:
+            if dry_run:
+                report(job, "Dry run, would have archived %s" % (job.file))
+            else:
+                report(
+                    job,
+                    "Making copy of %s in archive (%s)"
+                    % (job.file.name, job.archive_destination),
+                )
+                await asyncio.to_thread(
+                    _copy_to_archive, job.file, job.archive_destination
+                )
+
+        if dry_run:
+            report(
+                job, "Dry run, would have moved %s to %s" % (job.file, job.destination)
+            )
+            report(job, "With album %s" % job.album)
+            return
+
+        report(job, "Preparing Audio file %s" % job.file)
+        with tempfile.TemporaryDirectory() as tmpdir:
+            working_copy = pathlib.Path(tmpdir, job.file.name)
+            try:
+                async with asyncio.timeout(timeout.total_seconds()):
+                    await _convert(job, working_copy, report)
+            except TimeoutError:
+                raise ConversionError(
+                    "Timed out converting %s after %s" % (job.file, timeout)
+                )
+            await asyncio.to_thread(
+                audio_metadata.set_metadata,
+                working_copy,
+                title=job.title,
+                album=job.album,
+            )
+
+            report(job, "Moving %s to %s" % (job.file, job.destination))
+            await asyncio.to_thread(_copy_into_place, working_copy, job.destination)
+            os.remove(job.file)
+
+        report(job, "Done")
+
+
+async def run_jobs(
+    jobs: typing.List[ConversionJob],
+    max_concurrency: int,
+    dry_run: bool,
+    report: Report_Alias,
+    timeout: datetime.timedelta = DEFAULT_JOB_TIMEOUT,
+) -> typing.List[typing.Optional[BaseException]]:
+    """Run |jobs|, at most |max_concurrency| at a time.
+
+    Returns each job's exception, or None if it succeeded.
+    """
+    semaphore = asyncio.Semaphore(max_concurrency)
+    results = await asyncio.gather(
+        *(_run_job(job, semaphore, dry_run, timeout, report) for job in jobs),
+        return_exceptions=True,
+    )
+    return [x if isinstance(x, BaseException) else None for x in results]
+
+
+def convert(
+    jobs: typing.List[ConversionJob],
+    max_concurrency: int,
+    dry_run: bool,
+    report: Report_Alias,
+    timeout: datetime.timedelta = DEFAULT_JOB_TIMEOUT,
+) -> typing.List[typing.Optional[BaseException]]:
+    """Run |jobs| in an event loop, see run_jobs.
+
+    Ctrl-C cancels the jobs, which stops their ffmpeg processes and removes
+    their partial files, before KeyboardInterrupt is raised.
+    """
+    return asyncio.run(run_jobs(jobs, max_concurrency, dry_run, report, timeout))
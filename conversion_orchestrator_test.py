@@ -0,0 +1,210 @@
+import asyncio
+import datetime
+import os
+import pathlib
+import shutil
+import sys
+import tempfile
+import typing
+import unittest
+from unittest import mock
+
+import audio_metadata
+import conversion_orchestrator
+import conversions
+import test_utils
+
+# Stands in for ffmpeg, copying the input to the output with some progress.
+_FAKE_FFMPEG = """
+import shutil, sys, time
+input_file, output_file, sleep_seconds, exit_code = sys.argv[1:]
+print("out_time_us=N/A", flush=True)
+for seconds in (1, 2, 3):
+    print("out_time_us=%d" % (seconds * 1000000), flush=True)
+    print("progress=continue", flush=True)
+time.sleep(float(sleep_seconds))
+shutil.copyfile(input_file, output_file)
+sys.stderr.write("fake error\\n")
+sys.exit(int(exit_code))
+"""
+
+# Stands in for ffmpeg measuring loudness, which loudnorm prints to stderr.
+_FAKE_FFMPEG_MEASUREMENT = """
+import sys
+print("out_time_us=3000000", flush=True)
+sys.stderr.write('{"input_i": "-27.61", "input_tp": "-4.47", "input_lra": "18.06",')
+sys.stderr.write(' "input_thresh": "-39.20", "target_offset": "0.58"}\\n')
+"""
+
+
+class TestConversionOrchestrator(unittest.TestCase):
+    def setUp(self) -> None:
+        self._root_directory = tempfile.TemporaryDirectory()
+        self.root = pathlib.Path(self._root_directory.name)
+        self.destination_folder = self.root.joinpath("destination")
+        self.destination_folder.mkdir()
+
+        self.file = self.root.joinpath("podcast.mp3")
+        self._copy_test_file()
+        self.job = conversion_orchestrator.ConversionJob(
+            file=self.file,
+            destination=self.destination_folder.joinpath("podcast.mp3"),
+            title="title",
+            album="album",
+            speed=1.0,
+            expected_duration=datetime.timedelta(seconds=3),
+            archive_destination=self.root.joinpath("archive", "podcast.mp3"),
+        )
+        self.output: typing.List[str] = []
+        self.measurements: typing.List[
+            typing.Optional[conversions.LoudnessMeasurement]
+        ] = []
+
+    def tearDown(self) -> None:
+        self._root_directory.cleanup()
+
+    def _copy_test_file(self) -> None:
+        shutil.copyfile(
+            pathlib.Path(test_utils.TEST_DATA_DIR, test_utils.MP3_TEST_FILE), self.file
+        )
+        now = 1330712292
+        os.utime(self.file, (now, now))
+
+    def _report(self, job: conversion_orchestrator.ConversionJob, line: str) -> None:
+        self.assertIs(self.job, job)
+        self.output.append(line)
+
+    def _fake_ffmpeg(self, sleep_seconds: float = 0, exit_code: int = 0) -> typing.Any:
+        def args(
+            input_file: pathlib.Path,
+            output_file: pathlib.Path,
+            speed: float,
+            measurement: typing.Optional[conversions.LoudnessMeasurement] = None,
+            global_args: typing.Sequence[str] = (),
+            threads: typing.Optional[int] = None,
+        ) -> typing.List[str]:
+            self.measurements.append(measurement)
+            return [
+                sys.executable,
+                "-c",
+                _FAKE_FFMPEG,
+                str(input_file),
+                str(output_file),
+                str(sleep_seconds),
+                str(exit_code),
+            ]
+
+        return mock.patch("conversions.adjusted_podcast_for_playback_args", args)
+
+    def test_parse_progress(self) -> None:
+        self.assertEqual(
+            datetime.timedelta(seconds=1.5),
+            conversion_orchestrator.parse_progress("out_time_us=1500000\n"),
+        )
+        self.assertIsNone(conversion_orchestrator.parse_progress("out_time_us=N/A"))
+        self.assertIsNone(conversion_orchestrator.parse_progress("progress=continue"))
+
+    def test_convert(self) -> None:
+        with self._fake_ffmpeg():
+            errors = conversion_orchestrator.convert([self.job], 1, False, self._report)
+        self.assertEqual([None], errors)
+
+        self.assertFalse(self.file.exists())
+        self.assertTrue(
+            self.job.archive_destination and self.job.archive_destination.exists()
+        )
+        self.assertEqual(["podcast.mp3"], os.listdir(self.destination_folder))
+        self.assertEqual("title", audio_metadata.get_title(self.job.destination))
+        self.assertEqual("album", audio_metadata.get_album(self.job.destination))
+        self.assertEqual(
+            ["30% converted", "60% converted", "100% converted"],
+            [x for x in self.output if x.endswith("converted")],
+        )
+        self.assertEqual("Done", self.output[-1])
+
+    def test_convert_two_pass(self) -> None:
+        cache_folder = self.root.joinpath("loudness_cache")
+        self.job.loudness_cache = cache_folder
+        measurement = conversions.LoudnessMeasurement(-27.61, -4.47, 18.06, -39.2, 0.58)
+
+        with self._fake_ffmpeg(), mock.patch(
+            "conversions.loudness_measurement_args",
+            lambda *_: [sys.executable, "-c", _FAKE_FFMPEG_MEASUREMENT],
+        ):
+            errors = conversion_orchestrator.convert([self.job], 1, False, self._report)
+        self.assertEqual([None], errors)
+        self.assertEqual([measurement], self.measurements)
+        self.assertIn("100% measured", self.output)
+
+        # The measurement is reused when the same file is converted again.
+        self._copy_test_file()
+        self.output = []
+        with self._fake_ffmpeg(), mock.patch(
+            "conversions.loudness_measurement_args",
+            side_effect=AssertionError("Shouldn't measure again"),
+        ):
+            errors = conversion_orchestrator.convert([self.job], 1, False, self._report)
+        self.assertEqual([None], errors)
+        self.assertEqual([measurement, measurement], self.measurements)
+        self.assertIn("Using cached loudness measurement", self.output)
+
+    def test_convert_dry_run(self) -> None:
+        errors = conversion_orchestrator.convert([self.job], 1, True, self._report)
+        self.assertEqual([None], errors)
+
+        self.assertTrue(self.file.exists())
+        self.assertEqual([], os.listdir(self.destination_folder))
+        self.assertEqual(
+            [
+                "Dry run, would have archived %s" % (self.file),
+                "Dry run, would have moved %s to %s"
+                % (self.file, self.job.destination),
+                "With album album",
+            ],
+            self.output,
+        )
+
+    def test_convert_ffmpeg_error(self) -> None:
+        with self._fake_ffmpeg(exit_code=1):
+            errors = conversion_orchestrator.convert([self.job], 1, False, self._report)
+
+        self.assertIsInstance(errors[0], conversion_orchestrator.ConversionError)
+        self.assertIn("fake error", str(errors[0]))
+        self.assertTrue(self.file.exists())
+        self.assertEqual([], os.listdir(self.destination_folder))
+
+    def test_convert_timeout(self) -> None:
+        with self._fake_ffmpeg(sleep_seconds=60):
+            errors = conversion_orchestrator.convert(
+                [self.job],
+                1,
+                False,
+                self._report,
+                timeout=datetime.timedelta(seconds=0.5),
+            )
+
+        self.assertIsInstance(errors[0], conversion_orchestrator.ConversionError)
+        self.assertIn("Timed out", str(errors[0]))
+        self.assertTrue(self.file.exists())
+        self.assertEqual([], os.listdir(self.destination_folder))
+
+    def test_cancel(self) -> None:
+        async def run_and_cancel() -> None:
+            task = asyncio.create_task(
+                conversion_orchestrator.run_jobs([self.job], 1, False, self._report)
+            )
+            while "100% converted" not in self.output:
+                await asyncio.sleep(0.01)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+
+        with self._fake_ffmpeg(sleep_seconds=60):
+            asyncio.run(asyncio.wait_for(run_and_cancel(), timeout=30))
+
+        self.assertTrue(self.file.exists())
+        self.assertEqual([], os.listdir(self.destination_folder))
+
+
+if __name__ == "__main__":
+    unittest.main()
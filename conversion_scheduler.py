@@ -0,0 +1,40 @@
+import math
+import os
+import typing
+
+import conversion_orchestrator
+
+# CPUs left free so the computer can still be used while converting.
+RESERVED_CPUS = 2
+
+
+def _system_load() -> typing.Optional[float]:
+    try:
+        return os.getloadavg()[0]
+    except (AttributeError, OSError):
+        # Not available on Windows.
+        return None
+
+
+def max_conversions(
+    threads_per_conversion: typing.Optional[int] = None,
+    cpu_count: typing.Optional[int] = None,
+    load: typing.Optional[float] = None,
+) -> int:
+    """Return how many conversions to run at once.
+
+    Conversions get the CPUs that aren't reserved or already busy, going by
+    the one minute load average, with |threads_per_conversion| CPUs each.
+    """
+    cpu_count = cpu_count or os.cpu_count() or 1
+    load = _system_load() if load is None else load
+    busy_cpus = max(RESERVED_CPUS, math.ceil(load or 0))
+    return max((cpu_count - busy_cpus) // (threads_per_conversion or 1), 1)
+
+
+def longest_first(
+    jobs: typing.List[conversion_orchestrator.ConversionJob],
+) -> typing.List[conversion_orchestrator.ConversionJob]:
+    """Order |jobs| by how long they take, so no long job is left to run alone at the end."""
+    # The work is decoding and filtering the whole file, before it's sped up.
+    return sorted(jobs, key=lambda x: x.expected_duration * x.speed, reverse=True)
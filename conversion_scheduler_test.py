@@ -0,0 +1,61 @@
+import datetime
+import pathlib
+import unittest
+
+import conversion_orchestrator
+import conversion_scheduler
+
+
+def _job(
+    name: str, minutes: int, speed: float
+) -> conversion_orchestrator.ConversionJob:
+    return conversion_orchestrator.ConversionJob(
+        file=pathlib.Path(name),
+        destination=pathlib.Path("destination", name),
+        title=name,
+        album="album",
+        speed=speed,
+        expected_duration=datetime.timedelta(minutes=minutes),
+    )
+
+
+class TestConversionScheduler(unittest.TestCase):
+    def test_max_conversions(self) -> None:
+        # Two CPUs are always left free.
+        self.assertEqual(6, conversion_scheduler.max_conversions(cpu_count=8, load=0))
+        self.assertEqual(6, conversion_scheduler.max_conversions(cpu_count=8, load=1.5))
+        # CPUs already busy aren't used.
+        self.assertEqual(4, conversion_scheduler.max_conversions(cpu_count=8, load=3.2))
+        self.assertEqual(
+            3,
+            conversion_scheduler.max_conversions(
+                threads_per_conversion=2, cpu_count=8, load=0
+            ),
+        )
+        # There's always at least one conversion.
+        self.assertEqual(1, conversion_scheduler.max_conversions(cpu_count=2, load=0))
+        self.assertEqual(1, conversion_scheduler.max_conversions(cpu_count=8, load=20))
+        self.assertEqual(
+            1,
+            conversion_scheduler.max_conversions(
+                threads_per_conversion=16, cpu_count=8, load=0
+            ),
+        )
+
+    def test_max_conversions_measures_load(self) -> None:
+        self.assertGreaterEqual(conversion_scheduler.max_conversions(), 1)
+
+    def test_longest_first(self) -> None:
+        short = _job("short.mp3", 30, 1.0)
+        long = _job("long.mp3", 240, 1.0)
+        # Shorter to listen to, but more to convert before it's sped up.
+        fast = _job("fast.mp3", 100, 3.0)
+
+        self.assertEqual(
+            [fast, long, short],
+            conversion_scheduler.longest_first([short, long, fast]),
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
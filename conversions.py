@@ -1,6 +1,9 @@
+import dataclasses
+import json
 import math
 import os
 import pathlib
+import typing
 
 import ffmpeg
 
@@ -8,6 +11,27 @@ FFMPEG_EXE = "ffmpeg.exe"
 
 LOUDNESS_TARGET = -10.0
 
+_LOUDNESS_MEASUREMENT_KEYS = [
+    "input_i",
+    "input_tp",
+    "input_lra",
+    "input_thresh",
+    "target_offset",
+]
+
+
+class LoudnessMeasurementError(Exception):
+    pass
+
+
+@dataclasses.dataclass(frozen=True)
+class LoudnessMeasurement:
+    input_i: float
+    input_tp: float
+    input_lra: float
+    input_thresh: float
+    target_offset: float
+
 
 def _convert_file(input_file: pathlib.Path, output_file: pathlib.Path) -> None:
     print("Converting %s to %s" % (input_file, output_file))
@@ -30,13 +54,118 @@ def convert_matching_file_types_in_folder(
             _convert_file(file, file.with_suffix(output_file_type))
 
 
-def create_adjusted_podcast_for_playback(
-    input_file: pathlib.Path, output_file: pathlib.Path, speed: float
-) -> None:
+def _output_options(threads: typing.Optional[int]) -> typing.Dict[str, int]:
+    # Without a thread count, ffmpeg picks one based on the number of CPUs.
+    return {"threads": threads} if threads else {}
+
+
+def _loudness_measurement_stream(
+    input_file: pathlib.Path, threads: typing.Optional[int]
+) -> typing.Any:
+    stream = ffmpeg.input(str(input_file))
+    stream = ffmpeg.filter(
+        stream, filter_name="loudnorm", i=LOUDNESS_TARGET, print_format="json"
+    )
+    return ffmpeg.output(stream, "-", format="null", **_output_options(threads))
+
+
+def loudness_measurement_args(
+    input_file: pathlib.Path,
+    global_args: typing.Sequence[str] = (),
+    threads: typing.Optional[int] = None,
+) -> typing.List[str]:
+    """Return the ffmpeg command measure_loudness runs."""
+    stream = _loudness_measurement_stream(input_file, threads)
+    if global_args:
+        stream = stream.global_args(*global_args)
+    return [str(x) for x in stream.compile(cmd=FFMPEG_EXE)]
+
+
+def parse_loudness_measurement(output: str) -> LoudnessMeasurement:
+    """Parse the measurement loudnorm prints at the end of ffmpeg's output."""
+    start = output.rfind("{")
+    end = output.rfind("}")
+    try:
+        if start == -1 or end < start:
+            raise ValueError("no measurement found")
+        raw_json = json.loads(output[start : end + 1])
+        return LoudnessMeasurement(
+            *(float(raw_json[x]) for x in _LOUDNESS_MEASUREMENT_KEYS)
+        )
+    except (ValueError, KeyError) as e:
+        raise LoudnessMeasurementError(
+            "Failed to parse loudness measurement (%s) from:\n%s" % (e, output)
+        )
+
+
+def measure_loudness(
+    input_file: pathlib.Path, threads: typing.Optional[int] = None
+) -> LoudnessMeasurement:
+    stream = _loudness_measurement_stream(input_file, threads)
+    _, output = ffmpeg.run(stream, cmd=FFMPEG_EXE, capture_stderr=True)
+    return parse_loudness_measurement(output.decode("utf-8", errors="replace"))
+
+
+def _adjusted_podcast_stream(
+    input_file: pathlib.Path,
+    output_file: pathlib.Path,
+    speed: float,
+    measurement: typing.Optional[LoudnessMeasurement],
+    threads: typing.Optional[int],
+) -> typing.Any:
     stream = ffmpeg.input(str(input_file))
-    stream = ffmpeg.filter(stream, filter_name="loudnorm", i=LOUDNESS_TARGET)
+    # Silent files measure as -inf, which loudnorm can't use.
+    if measurement and all(math.isfinite(x) for x in dataclasses.astuple(measurement)):
+        stream = ffmpeg.filter(
+            stream,
+            filter_name="loudnorm",
+            i=LOUDNESS_TARGET,
+            measured_I=measurement.input_i,
+            measured_TP=measurement.input_tp,
+            measured_LRA=measurement.input_lra,
+            measured_thresh=measurement.input_thresh,
+            offset=measurement.target_offset,
+            linear="true",
+        )
+    else:
+        stream = ffmpeg.filter(stream, filter_name="loudnorm", i=LOUDNESS_TARGET)
     if not math.isclose(1.0, speed):
         stream = ffmpeg.filter(stream, filter_name="atempo", tempo=speed)
 
-    stream = ffmpeg.output(stream, str(output_file))
+    return ffmpeg.output(stream, str(output_file), **_output_options(threads))
+
+
+def create_adjusted_podcast_for_playback(
+    input_file: pathlib.Path,
+    output_file: pathlib.Path,
+    speed: float,
+    measurement: typing.Optional[LoudnessMeasurement] = None,
+    threads: typing.Optional[int] = None,
+) -> None:
+    """Normalize the loudness of |input_file| and speed it up by |speed|.
+
+    With a |measurement| of |input_file|'s loudness, from measure_loudness,
+    it's normalized linearly in a single pass. Otherwise loudnorm has to
+    adjust it dynamically as it goes. ffmpeg uses |threads| threads, if given.
+    """
+    stream = _adjusted_podcast_stream(
+        input_file, output_file, speed, measurement, threads
+    )
     ffmpeg.run(stream, cmd=FFMPEG_EXE)
+
+
+def adjusted_podcast_for_playback_args(
+    input_file: pathlib.Path,
+    output_file: pathlib.Path,
+    speed: float,
+    measurement: typing.Optional[LoudnessMeasurement] = None,
+    global_args: typing.Sequence[str] = (),
+    threads: typing.Optional[int] = None,
+) -> typing.List[str]:
+    """Return the ffmpeg command create_adjusted_podcast_for_playback runs."""
+    stream = _adjusted_podcast_stream(
+        input_file, output_file, speed, measurement, threads
+    )
+    if global_args:
+        stream = stream.global_args(*global_args)
+    return [str(x) for x in stream.compile(cmd=FFMPEG_EXE)]
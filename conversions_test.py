@@ -31,6 +31,62 @@ class TestConversions(unittest.TestCase):
 
         return copies
 
+    def test_parse_loudness_measurement(self) -> None:
+        output = """[Parsed_loudnorm_0 @ 0x1234]
+{
+    "input_i" : "-27.61",
+    "input_tp" : "-4.47",
+    "input_lra" : "18.06",
+    "input_thresh" : "-39.20",
+    "output_i" : "-10.58",
+    "target_offset" : "0.58"
+}
+"""
+        self.assertEqual(
+            conversions.LoudnessMeasurement(-27.61, -4.47, 18.06, -39.2, 0.58),
+            conversions.parse_loudness_measurement(output),
+        )
+
+        for bad_output in ["", "{}", '{"input_i" : "loud"}']:
+            with self.subTest(output=bad_output):
+                with self.assertRaises(conversions.LoudnessMeasurementError):
+                    conversions.parse_loudness_measurement(bad_output)
+
+    def test_adjusted_podcast_for_playback_args(self) -> None:
+        input_file = pathlib.Path("in.mp3")
+        output_file = pathlib.Path("out.mp3")
+
+        args = conversions.adjusted_podcast_for_playback_args(
+            input_file, output_file, 1.0
+        )
+        self.assertEqual(
+            [conversions.FFMPEG_EXE, "-i", "in.mp3", "-filter_complex"], args[:4]
+        )
+        self.assertNotIn("linear", args[4])
+
+        measurement = conversions.LoudnessMeasurement(-27.61, -4.47, 18.06, -39.2, 0.58)
+        args = conversions.adjusted_podcast_for_playback_args(
+            input_file, output_file, 1.5, measurement, ["-progress", "pipe:1"]
+        )
+        self.assertIn("measured_I=-27.61", args[4])
+        self.assertIn("linear=true", args[4])
+        self.assertIn("atempo=tempo=1.5", args[4])
+        self.assertEqual(["out.mp3", "-progress", "pipe:1"], args[-3:])
+
+        args = conversions.adjusted_podcast_for_playback_args(
+            input_file, output_file, 1.0, threads=2
+        )
+        self.assertEqual(["-threads", "2", "out.mp3"], args[-3:])
+
+        # Silent files can't be normalized linearly.
+        silent = conversions.LoudnessMeasurement(
+            float("-inf"), float("-inf"), 0.0, -70.0, 0.0
+        )
+        args = conversions.adjusted_podcast_for_playback_args(
+            input_file, output_file, 1.0, silent
+        )
+        self.assertNotIn("linear", args[4])
+
     def test_convert_matching_file_types_in_folder_m_p4s_to_mp3s(self) -> None:
         files = self.create_test_file_copies(test_utils.MP4_TEST_FILE)
 
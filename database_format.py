@@ -0,0 +1,243 @@
+import argparse
+import enum
+import io
+import pathlib
+import struct
+import sys
+import typing
+
+import atomic_file
+import podcast_episode
+
+# Binary databases start with this, text databases start with the show count.
+MAGIC = b"PODB"
+BINARY_VERSION = 1
+
+# magic, version, string table size in bytes, show count, episode count.
+_HEADER = struct.Struct("<4sHxxIII")
+# name string id, next_index, first episode, episode count.
+_SHOW = struct.Struct("<IqII")
+# folder string id, name string id, index, duration, modification time.
+_EPISODE = struct.Struct("<IIqqq")
+
+# Stored in place of a next_index of None, which is never negative otherwise.
+_NO_NEXT_INDEX = -1
+
+# Paths and show names can't contain NUL, so it separates the string table.
+_STRING_SEPARATOR = "\0"
+
+
+class DatabaseFormatError(Exception):
+    pass
+
+
+class Format(enum.Enum):
+    # The original line based format, with four lines per episode.
+    TEXT = 1
+    # A header, a NUL separated string table shared by all the paths, a show
+    # table and a packed episode table.
+    BINARY = 2
+
+
+DEFAULT_FORMAT = Format.BINARY
+
+
+class ShowRecord(typing.NamedTuple):
+    name: str
+    next_index: typing.Optional[int]
+    episodes: typing.List[podcast_episode.PodcastEpisode]
+
+
+def detect_format(data: bytes) -> Format:
+    if data.startswith(MAGIC):
+        return Format.BINARY
+    return Format.TEXT
+
+
+def decode(data: bytes) -> typing.List[ShowRecord]:
+    if detect_format(data) == Format.BINARY:
+        return _parse_binary(data)
+    return _parse_text(data.decode("utf-8"))
+
+
+def encode(
+    records: typing.Sequence[ShowRecord], file_format: Format = DEFAULT_FORMAT
+) -> bytes:
+    if file_format == Format.BINARY:
+        return _format_binary(records)
+    return _format_text(records).encode("utf-8")
+
+
+def read(path: pathlib.Path) -> typing.List[ShowRecord]:
+    """Read the shows in a database of either format, with a single read."""
+    with open(path, "rb") as f:
+        return decode(f.read())
+
+
+def write(
+    path: pathlib.Path,
+    records: typing.Sequence[ShowRecord],
+    file_format: Format = DEFAULT_FORMAT,
+) -> None:
+    atomic_file.write_bytes(path, encode(records, file_format))
+
+
+def _parse_text(text: str) -> typing.List[ShowRecord]:
+    f = io.StringIO(text)
+    num_podcasts = int(f.readline())
+
+    records = []
+    for _ in range(num_podcasts):
+        name = f.readline().strip()
+        # Each show repeats its own name before its contents.
+        show_name = f.readline().strip()
+        if show_name != name:
+            raise DatabaseFormatError(
+                "Found show %s where %s was expected" % (show_name, name)
+            )
+
+        raw_next_index = f.readline().strip()
+        next_index = None if raw_next_index == "None" else int(raw_next_index)
+        num_episodes = int(f.readline())
+        episodes = [podcast_episode.PodcastEpisode.load(f) for _ in range(num_episodes)]
+        records.append(ShowRecord(name, next_index, episodes))
+    return records
+
+
+def _format_text(records: typing.Sequence[ShowRecord]) -> str:
+    f = io.StringIO()
+    f.write(str(len(records)) + "\n")
+    for record in records:
+        f.write(record.name + "\n")
+        f.write(record.name + "\n")
+        f.write(str(record.next_index) + "\n")
+        f.write(str(len(record.episodes)) + "\n")
+        for episode in record.episodes:
+            episode.save(f)
+    return f.getvalue()
+
+
+def _parse_binary(data: bytes) -> typing.List[ShowRecord]:
+    try:
+        _, version, strings_size, num_shows, num_episodes = _HEADER.unpack_from(data)
+        if version != BINARY_VERSION:
+            raise DatabaseFormatError(
+                "Unsupported database version %d, expected %d"
+                % (version, BINARY_VERSION)
+            )
+
+        offset = _HEADER.size
+        strings = (
+            data[offset : offset + strings_size]
+            .decode("utf-8")
+            .split(_STRING_SEPARATOR)
+        )
+        offset += strings_size
+        shows_end = offset + _SHOW.size * num_shows
+        raw_shows = list(_SHOW.iter_unpack(data[offset:shows_end]))
+        episodes_end = shows_end + _EPISODE.size * num_episodes
+        raw_episodes = list(_EPISODE.iter_unpack(data[shows_end:episodes_end]))
+        if len(raw_shows) != num_shows or len(raw_episodes) != num_episodes:
+            raise DatabaseFormatError("Database is truncated")
+
+        # Every episode in a show shares a folder, so only build it once.
+        folders: typing.Dict[int, pathlib.Path] = {}
+
+        def episode_path(folder_id: int, name_id: int) -> pathlib.Path:
+            folder = folders.get(folder_id)
+            if folder is None:
+                folder = pathlib.Path(strings[folder_id])
+                folders[folder_id] = folder
+            return folder / strings[name_id]
+
+        records = []
+        for name_id, next_index, first_episode, episode_count in raw_shows:
+            episodes = [
+                podcast_episode.PodcastEpisode(
+                    episode_path(folder_id, file_id),
+                    index,
+                    duration,
+                    modification_time,
+                )
+                for folder_id, file_id, index, duration, modification_time in (
+                    raw_episodes[first_episode : first_episode + episode_count]
+                )
+            ]
+            records.append(
+                ShowRecord(
+                    strings[name_id],
+                    None if next_index == _NO_NEXT_INDEX else next_index,
+                    episodes,
+                )
+            )
+        return records
+    except (IndexError, struct.error, UnicodeDecodeError) as e:
+        raise DatabaseFormatError("Failed to parse binary database: %s" % (e))
+
+
+def _format_binary(records: typing.Sequence[ShowRecord]) -> bytes:
+    strings: typing.List[str] = []
+    string_ids: typing.Dict[str, int] = {}
+
+    def intern(s: str) -> int:
+        string_id = string_ids.get(s)
+        if string_id is None:
+            string_id = len(strings)
+            strings.append(s)
+            string_ids[s] = string_id
+        return string_id
+
+    shows: typing.List[bytes] = []
+    episodes: typing.List[bytes] = []
+    for record in records:
+        shows.append(
+            _SHOW.pack(
+                intern(record.name),
+                _NO_NEXT_INDEX if record.next_index is None else record.next_index,
+                len(episodes),
+                len(record.episodes),
+            )
+        )
+        for episode in record.episodes:
+            episodes.append(
+                _EPISODE.pack(
+                    intern(str(episode.path.parent)),
+                    intern(episode.path.name),
+                    episode.index,
+                    episode.duration,
+                    episode.modification_time,
+                )
+            )
+
+    string_table = _STRING_SEPARATOR.join(strings).encode("utf-8")
+    header = _HEADER.pack(
+        MAGIC, BINARY_VERSION, len(string_table), len(shows), len(episodes)
+    )
+    return b"".join([header, string_table] + shows + episodes)
+
+
+def main(args: typing.Optional[typing.List[str]]) -> int:
+    parser = argparse.ArgumentParser(
+        description="Convert a podcast database between the text and binary formats"
+    )
+    parser.add_argument("input", type=pathlib.Path, help="Database to convert")
+    parser.add_argument("output", type=pathlib.Path, help="Where to write it")
+    parser.add_argument(
+        "--to",
+        choices=[x.name.lower() for x in Format],
+        required=True,
+        help="Format to write",
+    )
+    parsed_args = parser.parse_args(args)
+
+    records = read(parsed_args.input)
+    write(parsed_args.output, records, Format[parsed_args.to.upper()])
+    print(
+        "Converted %d shows to %s in %s"
+        % (len(records), parsed_args.to, parsed_args.output)
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
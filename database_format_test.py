@@ -0,0 +1,107 @@
+import pathlib
+import tempfile
+import typing
+import unittest
+
+import database_format
+import podcast_episode
+
+
+def _episode_fields(
+    records: typing.List[database_format.ShowRecord],
+) -> typing.List[typing.Tuple[str, typing.Optional[int], typing.List[typing.Any]]]:
+    return [
+        (
+            x.name,
+            x.next_index,
+            [(e.path, e.index, e.duration, e.modification_time) for e in x.episodes],
+        )
+        for x in records
+    ]
+
+
+class TestDatabaseFormat(unittest.TestCase):
+    def setUp(self) -> None:
+        self._root_directory = tempfile.TemporaryDirectory()
+        self.root = pathlib.Path(self._root_directory.name)
+
+        folder = pathlib.Path(self.root, "show_ç")
+        self.records = [
+            database_format.ShowRecord("empty_show", None, []),
+            database_format.ShowRecord(
+                "show_ç",
+                3,
+                [
+                    podcast_episode.PodcastEpisode(
+                        pathlib.Path(folder, "episode_1.mp3"), 1, 3600, 1330712222
+                    ),
+                    podcast_episode.PodcastEpisode(
+                        pathlib.Path(folder, "episode_é.m4a"), 2, 60, 1330712292
+                    ),
+                ],
+            ),
+        ]
+
+    def tearDown(self) -> None:
+        self._root_directory.cleanup()
+
+    def test_round_trip(self) -> None:
+        for file_format in database_format.Format:
+            with self.subTest(file_format=file_format):
+                path = pathlib.Path(self.root, "database")
+                database_format.write(path, self.records, file_format)
+
+                with open(path, "rb") as f:
+                    self.assertEqual(
+                        file_format, database_format.detect_format(f.read())
+                    )
+                self.assertEqual(
+                    _episode_fields(self.records),
+                    _episode_fields(database_format.read(path)),
+                )
+
+    def test_binary_interns_folders(self) -> None:
+        path = pathlib.Path(self.root, "database")
+        database_format.write(path, self.records, database_format.Format.BINARY)
+
+        with open(path, "rb") as f:
+            data = f.read()
+        self.assertEqual(1, data.count(str(self.root).encode("utf-8")))
+
+    def test_unknown_version(self) -> None:
+        path = pathlib.Path(self.root, "database")
+        with open(path, "wb") as f:
+            f.write(database_format._HEADER.pack(database_format.MAGIC, 99, 0, 0, 0))
+
+        with self.assertRaises(database_format.DatabaseFormatError):
+            database_format.read(path)
+
+    def test_truncated(self) -> None:
+        path = pathlib.Path(self.root, "database")
+        database_format.write(path, self.records, database_format.Format.BINARY)
+        with open(path, "rb") as f:
+            data = f.read()
+        with open(path, "wb") as f:
+            f.write(data[:-10])
+
+        with self.assertRaises(database_format.DatabaseFormatError):
+            database_format.read(path)
+
+    def test_convert(self) -> None:
+        text_path = pathlib.Path(self.root, "database.txt")
+        binary_path = pathlib.Path(self.root, "database.db")
+        database_format.write(text_path, self.records, database_format.Format.TEXT)
+
+        database_format.main([str(text_path), str(binary_path), "--to", "binary"])
+        database_format.main([str(binary_path), str(text_path), "--to", "text"])
+
+        with open(binary_path, "rb") as f:
+            self.assertTrue(f.read().startswith(database_format.MAGIC))
+        self.assertEqual(
+            _episode_fields(self.records),
+            _episode_fields(database_format.read(text_path)),
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,138 @@
+import json
+import os
+import pathlib
+import struct
+import typing
+import zlib
+
+import atomic_file
+import database_format
+import podcast_episode
+
+# Each record is its payload's length and crc32, followed by the JSON payload.
+# After the first record, each record holds all the events of one commit, so a
+# commit is either read back whole or not at all.
+_RECORD_HEADER = struct.Struct("<II")
+
+# Events are dicts naming a show and one of:
+#   "add": [path, index, duration, modification_time]
+#   "remove": path
+#   "next_index": next_index
+# The first record of a journal is instead {"base": checksum}, the crc32 of
+# the database file the journal's events apply on top of.
+Event_TypeAlias = typing.Dict[str, typing.Any]
+
+
+class JournalContents(typing.NamedTuple):
+    events: typing.List[Event_TypeAlias]
+    # Whether the journal ended in a partially written record, so any further
+    # records appended after it couldn't be read back.
+    torn: bool
+
+
+def journal_path(database_path: pathlib.Path) -> pathlib.Path:
+    return database_path.with_name(database_path.name + ".journal")
+
+
+def checksum(data: bytes) -> int:
+    return zlib.crc32(data)
+
+
+def read(path: pathlib.Path, database_checksum: int) -> JournalContents:
+    """Read the events of the journal at |path|.
+
+    A journal written against a different database, such as one left over
+    from a crash just after the database was rewritten, has no events.
+    """
+    if not path.is_file():
+        return JournalContents([], False)
+
+    with open(path, "rb") as f:
+        data = f.read()
+
+    records = []
+    offset = 0
+    torn = False
+    while offset < len(data):
+        if offset + _RECORD_HEADER.size > len(data):
+            torn = True
+            break
+        length, crc = _RECORD_HEADER.unpack_from(data, offset)
+        payload = data[
+            offset + _RECORD_HEADER.size : offset + _RECORD_HEADER.size + length
+        ]
+        if len(payload) != length or zlib.crc32(payload) != crc:
+            torn = True
+            break
+        records.append(json.loads(payload.decode("utf-8")))
+        offset += _RECORD_HEADER.size + length
+
+    if not records or records[0].get("base") != database_checksum:
+        return JournalContents([], torn)
+    events = [event for record in records[1:] for event in record["events"]]
+    return JournalContents(events, torn)
+
+
+def start(
+    path: pathlib.Path, database_checksum: int, events: typing.List[Event_TypeAlias]
+) -> None:
+    """Replace the journal at |path| with one holding the commit of |events|."""
+    data = _encode_record({"base": database_checksum})
+    if events:
+        data += _encode_record({"events": events})
+    atomic_file.write_bytes(path, data)
+
+
+def append(path: pathlib.Path, events: typing.List[Event_TypeAlias]) -> None:
+    """Append the commit of |events| to the journal at |path|."""
+    with open(path, "ab") as f:
+        f.write(_encode_record({"events": events}))
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def remove(path: pathlib.Path) -> None:
+    if path.exists():
+        os.remove(path)
+
+
+def apply(
+    records: typing.List[database_format.ShowRecord],
+    events: typing.List[Event_TypeAlias],
+) -> typing.List[database_format.ShowRecord]:
+    """Return |records| with |events| applied in order."""
+    if not events:
+        return records
+
+    next_indices = dict((x.name, x.next_index) for x in records)
+    episodes = dict(
+        (x.name, dict((str(e.path), e) for e in x.episodes)) for x in records
+    )
+    for event in events:
+        show = event["show"]
+        if show not in next_indices:
+            raise database_format.DatabaseFormatError(
+                "Journal refers to unknown show %s" % (show)
+            )
+
+        if "add" in event:
+            path, index, duration, modification_time = event["add"]
+            episodes[show][path] = podcast_episode.PodcastEpisode(
+                pathlib.Path(path), index, duration, modification_time
+            )
+        elif "remove" in event:
+            episodes[show].pop(event["remove"], None)
+        else:
+            next_indices[show] = event["next_index"]
+
+    return [
+        database_format.ShowRecord(
+            x.name, next_indices[x.name], list(episodes[x.name].values())
+        )
+        for x in records
+    ]
+
+
+def _encode_record(record: typing.Dict[str, typing.Any]) -> bytes:
+    payload = json.dumps(record).encode("utf-8")
+    return _RECORD_HEADER.pack(len(payload), zlib.crc32(payload)) + payload
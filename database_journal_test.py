@@ -0,0 +1,114 @@
+import pathlib
+import tempfile
+import typing
+import unittest
+
+import database_format
+import database_journal
+import podcast_episode
+
+
+class TestDatabaseJournal(unittest.TestCase):
+    def setUp(self) -> None:
+        self._root_directory = tempfile.TemporaryDirectory()
+        self.root = pathlib.Path(self._root_directory.name)
+        self.journal = pathlib.Path(self.root, "podcast.db.journal")
+
+        self.first = pathlib.Path(self.root, "show", "episode_1.mp3")
+        self.second = pathlib.Path(self.root, "show", "episode_2.mp3")
+        self.records = [
+            database_format.ShowRecord(
+                "show",
+                2,
+                [podcast_episode.PodcastEpisode(self.first, 1, 60, 1330712222)],
+            )
+        ]
+        self.events: typing.List[database_journal.Event_TypeAlias] = [
+            {"show": "show", "add": [str(self.second), 2, 120, 1330712292]},
+            {"show": "show", "next_index": 3},
+            {"show": "show", "remove": str(self.first)},
+        ]
+
+    def tearDown(self) -> None:
+        self._root_directory.cleanup()
+
+    def test_journal_path(self) -> None:
+        self.assertEqual(
+            self.journal,
+            database_journal.journal_path(pathlib.Path(self.root, "podcast.db")),
+        )
+
+    def test_missing(self) -> None:
+        self.assertEqual(
+            database_journal.JournalContents([], False),
+            database_journal.read(self.journal, 1234),
+        )
+
+    def test_start_append_and_read(self) -> None:
+        database_journal.start(self.journal, 1234, self.events[:1])
+        database_journal.append(self.journal, self.events[1:])
+
+        self.assertEqual(
+            database_journal.JournalContents(self.events, False),
+            database_journal.read(self.journal, 1234),
+        )
+
+    def test_different_database(self) -> None:
+        database_journal.start(self.journal, 1234, self.events)
+
+        self.assertEqual([], database_journal.read(self.journal, 5678).events)
+
+    def test_torn_record(self) -> None:
+        database_journal.start(self.journal, 1234, self.events[:1])
+        database_journal.append(self.journal, self.events[1:])
+        with open(self.journal, "rb") as f:
+            data = f.read()
+        with open(self.journal, "wb") as f:
+            f.write(data[:-3])
+
+        self.assertEqual(
+            database_journal.JournalContents(self.events[:1], True),
+            database_journal.read(self.journal, 1234),
+        )
+
+    def test_torn_commit_discarded_whole(self) -> None:
+        database_journal.start(self.journal, 1234, [])
+        start_size = self.journal.stat().st_size
+        database_journal.append(self.journal, self.events)
+        with open(self.journal, "rb") as f:
+            data = f.read()
+
+        # However much of the commit made it to disk, none of its events are
+        # read back, so an add is never replayed without its next_index.
+        for end in range(start_size + 1, len(data)):
+            with self.subTest(end=end):
+                with open(self.journal, "wb") as f:
+                    f.write(data[:end])
+
+                self.assertEqual(
+                    database_journal.JournalContents([], True),
+                    database_journal.read(self.journal, 1234),
+                )
+
+    def test_apply(self) -> None:
+        records = database_journal.apply(self.records, self.events)
+
+        self.assertEqual(1, len(records))
+        self.assertEqual(3, records[0].next_index)
+        self.assertEqual(
+            [(self.second, 2, 120, 1330712292)],
+            [
+                (x.path, x.index, x.duration, x.modification_time)
+                for x in records[0].episodes
+            ],
+        )
+
+    def test_apply_unknown_show(self) -> None:
+        with self.assertRaises(database_format.DatabaseFormatError):
+            database_journal.apply(
+                self.records, [{"show": "other_show", "next_index": 3}]
+            )
+
+
+if __name__ == "__main__":
+    unittest.main()
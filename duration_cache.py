@@ -0,0 +1,116 @@
+import hashlib
+import json
+import os
+import pathlib
+import threading
+import typing
+
+import atomic_file
+
+CACHE_VERSION = 1
+
+# Number of bytes hashed from the start and end of a file when building its key.
+PARTIAL_HASH_BYTES = 64 * 1024
+
+# Durations for files that have long been listened to and deleted are never
+# looked up again, so only keep the most recently used entries.
+MAX_ENTRIES = 20000
+
+
+class DurationCacheLoadingError(Exception):
+    pass
+
+
+def file_key(
+    path: pathlib.Path, file_stat: typing.Optional[os.stat_result] = None
+) -> str:
+    """Build a key identifying the contents of |path|, independent of its name.
+
+    The key is made from the file size, modification time and a hash of the
+    first and last few KB, so a file keeps its key when renamed or moved
+    between show folders.
+    """
+    file_stat = path.stat() if file_stat is None else file_stat
+    size = file_stat.st_size
+
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        digest.update(f.read(PARTIAL_HASH_BYTES))
+        if size > PARTIAL_HASH_BYTES:
+            f.seek(max(size - PARTIAL_HASH_BYTES, PARTIAL_HASH_BYTES))
+            digest.update(f.read(PARTIAL_HASH_BYTES))
+
+    return "%d:%d:%s" % (size, int(file_stat.st_mtime), digest.hexdigest())
+
+
+class DurationCache(object):
+    def __init__(self, max_entries: int = MAX_ENTRIES) -> None:
+        self._max_entries = max_entries
+        self._durations: typing.Dict[str, int] = {}
+        # Shows are scanned concurrently, so guard updates to the entries.
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._durations)
+
+    def get(
+        self, path: pathlib.Path, file_stat: typing.Optional[os.stat_result] = None
+    ) -> typing.Optional[int]:
+        return self.get_key(file_key(path, file_stat))
+
+    def get_key(self, key: str) -> typing.Optional[int]:
+        with self._lock:
+            duration = self._durations.pop(key, None)
+            if duration is not None:
+                # Move the entry to the end so it is the last to be evicted.
+                self._durations[key] = duration
+        return duration
+
+    def add(
+        self,
+        path: pathlib.Path,
+        duration: int,
+        file_stat: typing.Optional[os.stat_result] = None,
+    ) -> None:
+        self.add_key(file_key(path, file_stat), duration)
+
+    def add_key(self, key: str, duration: int) -> None:
+        with self._lock:
+            self._durations.pop(key, None)
+            self._durations[key] = duration
+
+            while len(self._durations) > self._max_entries:
+                del self._durations[next(iter(self._durations))]
+
+    def load(self, path: pathlib.Path) -> int:
+        if not path.is_file():
+            return 0
+
+        with open(path, "r", encoding="utf-8") as f:
+            try:
+                raw_json = json.load(f)
+            except json.decoder.JSONDecodeError as e:
+                raise DurationCacheLoadingError(
+                    "Failed to parse duration cache %s. Error:\n%s" % (path, e)
+                )
+
+        if not isinstance(raw_json, dict) or raw_json.get("version") != CACHE_VERSION:
+            print("Ignoring duration cache %s with unknown version" % (path))
+            return 0
+
+        self._durations = {}
+        try:
+            for key, duration in raw_json["durations"].items():
+                self.add_key(key, int(duration))
+        except (AttributeError, KeyError, TypeError, ValueError) as e:
+            self._durations = {}
+            raise DurationCacheLoadingError(
+                "Failed to load durations from duration cache %s. Error:\n%r"
+                % (path, e)
+            )
+        return len(self._durations)
+
+    def save(self, path: pathlib.Path) -> None:
+        atomic_file.write_text(
+            path, json.dumps({"version": CACHE_VERSION, "durations": self._durations})
+        )
@@ -0,0 +1,124 @@
+import os
+import pathlib
+import shutil
+import tempfile
+import unittest
+
+import duration_cache
+import test_utils
+
+
+class TestDurationCache(unittest.TestCase):
+    def setUp(self) -> None:
+        self._root_directory = tempfile.TemporaryDirectory()
+        self.root = pathlib.Path(self._root_directory.name)
+
+        self.podcast_file = pathlib.Path(self.root, "podcast.mp3")
+        shutil.copyfile(
+            pathlib.Path(test_utils.TEST_DATA_DIR, test_utils.MP3_TEST_FILE),
+            self.podcast_file,
+        )
+        now = 1330712292
+        os.utime(self.podcast_file, (now, now))
+
+    def tearDown(self) -> None:
+        self._root_directory.cleanup()
+
+    def test_get_missing(self) -> None:
+        cache = duration_cache.DurationCache()
+        self.assertIsNone(cache.get(self.podcast_file))
+
+    def test_add_and_get(self) -> None:
+        cache = duration_cache.DurationCache()
+        cache.add(self.podcast_file, 66)
+        self.assertEqual(66, cache.get(self.podcast_file))
+
+    def test_renamed_and_moved_file_found(self) -> None:
+        cache = duration_cache.DurationCache()
+        cache.add(self.podcast_file, 66)
+
+        other_show = pathlib.Path(self.root, "other_show")
+        other_show.mkdir()
+        moved_file = pathlib.Path(other_show, "renamed.mp3")
+        self.podcast_file.rename(moved_file)
+
+        self.assertEqual(66, cache.get(moved_file))
+
+    def test_changed_file_not_found(self) -> None:
+        cache = duration_cache.DurationCache()
+        cache.add(self.podcast_file, 66)
+
+        with open(self.podcast_file, "ab") as f:
+            f.write(b"more audio")
+
+        self.assertIsNone(cache.get(self.podcast_file))
+
+    def test_different_modification_time_not_found(self) -> None:
+        cache = duration_cache.DurationCache()
+        cache.add(self.podcast_file, 66)
+
+        later = 1330712292 + 100
+        os.utime(self.podcast_file, (later, later))
+
+        self.assertIsNone(cache.get(self.podcast_file))
+
+    def test_least_recently_used_evicted(self) -> None:
+        files = []
+        for x in range(3):
+            path = pathlib.Path(self.root, "podcast_%d.mp3" % (x))
+            with open(path, "w") as f:
+                f.write(str(x))
+            files.append(path)
+
+        cache = duration_cache.DurationCache(max_entries=2)
+        cache.add(files[0], 0)
+        cache.add(files[1], 1)
+        # Using the first file makes the second file the oldest entry.
+        self.assertEqual(0, cache.get(files[0]))
+        cache.add(files[2], 2)
+
+        self.assertEqual(2, len(cache))
+        self.assertEqual(0, cache.get(files[0]))
+        self.assertIsNone(cache.get(files[1]))
+        self.assertEqual(2, cache.get(files[2]))
+
+    def test_save_and_load(self) -> None:
+        cache_file = pathlib.Path(self.root, "duration_cache.json")
+
+        cache = duration_cache.DurationCache()
+        cache.add(self.podcast_file, 66)
+        cache.save(cache_file)
+
+        loaded_cache = duration_cache.DurationCache()
+        self.assertEqual(1, loaded_cache.load(cache_file))
+        self.assertEqual(66, loaded_cache.get(self.podcast_file))
+
+    def test_load_missing_file(self) -> None:
+        cache = duration_cache.DurationCache()
+        self.assertEqual(0, cache.load(pathlib.Path(self.root, "missing.json")))
+
+    def test_load_bad_file(self) -> None:
+        cache_file = pathlib.Path(self.root, "duration_cache.json")
+        with open(cache_file, "w") as f:
+            f.write("not json")
+
+        cache = duration_cache.DurationCache()
+        with self.assertRaises(duration_cache.DurationCacheLoadingError):
+            cache.load(cache_file)
+
+    def test_load_bad_durations(self) -> None:
+        cache_file = pathlib.Path(self.root, "duration_cache.json")
+        with open(cache_file, "w") as f:
+            f.write(
+                '{"version": %d, "durations": {"key": "long"}}'
+                % (duration_cache.CACHE_VERSION)
+            )
+
+        cache = duration_cache.DurationCache()
+        with self.assertRaises(duration_cache.DurationCacheLoadingError):
+            cache.load(cache_file)
+        self.assertEqual(0, len(cache))
+
+
+if __name__ == "__main__":
+    unittest.main()
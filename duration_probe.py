@@ -0,0 +1,387 @@
+import argparse
+import pathlib
+import struct
+import sys
+import typing
+
+# Lightweight duration probing that only reads the few KB of container headers
+# needed to compute a duration, instead of setting up a full decoder.
+
+ID3V2_HEADER_SIZE = 10
+# How far past the ID3 tag to look for the first MP3 frame.
+MP3_SYNC_SEARCH_BYTES = 16 * 1024
+# Number of frames to sample before deciding a header-less MP3 is constant bitrate.
+MP3_CBR_SAMPLE_FRAMES = 32
+
+MPEG_1, MPEG_2, MPEG_2_5 = "1", "2", "2.5"
+_MPEG_VERSIONS = {0: MPEG_2_5, 2: MPEG_2, 3: MPEG_1}
+_MPEG_LAYERS = {1: 3, 2: 2, 3: 1}
+
+_SAMPLE_RATES = {
+    MPEG_1: (44100, 48000, 32000),
+    MPEG_2: (22050, 24000, 16000),
+    MPEG_2_5: (11025, 12000, 8000),
+}
+
+# Bitrates in kbps, indexed by (MPEG version is 1, layer)[bitrate_index].
+_BITRATES = {
+    (True, 1): (0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448),
+    (True, 2): (0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384),
+    (True, 3): (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    (False, 1): (0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256),
+    (False, 2): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+    (False, 3): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+
+M4A_CONTAINER_ATOMS = (b"moov", b"trak", b"mdia")
+
+
+class _Mp3Frame(typing.NamedTuple):
+    version: str
+    layer: int
+    bitrate: int
+    sample_rate: int
+    samples: int
+    length: int
+    mono: bool
+
+
+def _parse_mp3_frame_header(header: bytes) -> typing.Optional[_Mp3Frame]:
+    if len(header) < 4:
+        return None
+    (value,) = struct.unpack(">I", header[:4])
+    if (value >> 21) & 0x7FF != 0x7FF:
+        return None
+
+    version = _MPEG_VERSIONS.get((value >> 19) & 0x3)
+    layer = _MPEG_LAYERS.get((value >> 17) & 0x3)
+    bitrate_index = (value >> 12) & 0xF
+    sample_rate_index = (value >> 10) & 0x3
+    if version is None or layer is None:
+        return None
+    if bitrate_index in (0, 0xF) or sample_rate_index == 3:
+        return None
+
+    padding = (value >> 9) & 0x1
+    mono = (value >> 6) & 0x3 == 3
+    is_mpeg_1 = version == MPEG_1
+    bitrate = _BITRATES[(is_mpeg_1, layer)][bitrate_index] * 1000
+    sample_rate = _SAMPLE_RATES[version][sample_rate_index]
+
+    if layer == 1:
+        samples = 384
+        length = (12 * bitrate // sample_rate + padding) * 4
+    elif layer == 2 or is_mpeg_1:
+        samples = 1152
+        length = 144 * bitrate // sample_rate + padding
+    else:
+        samples = 576
+        length = 72 * bitrate // sample_rate + padding
+
+    return _Mp3Frame(version, layer, bitrate, sample_rate, samples, length, mono)
+
+
+def _skip_id3v2(f: typing.BinaryIO) -> int:
+    header = f.read(ID3V2_HEADER_SIZE)
+    if len(header) < ID3V2_HEADER_SIZE or header[:3] != b"ID3":
+        return 0
+
+    size = 0
+    for byte in header[6:10]:
+        size = (size << 7) | (byte & 0x7F)
+    size += ID3V2_HEADER_SIZE
+    # The footer flag adds another 10 bytes after the tag.
+    if header[5] & 0x10:
+        size += ID3V2_HEADER_SIZE
+    return size
+
+
+def _find_first_mp3_frame(
+    f: typing.BinaryIO, start: int
+) -> typing.Optional[typing.Tuple[int, _Mp3Frame]]:
+    f.seek(start)
+    data = f.read(MP3_SYNC_SEARCH_BYTES)
+    position = data.find(b"\xff")
+    while 0 <= position < len(data) - 4:
+        frame = _parse_mp3_frame_header(data[position : position + 4])
+        if frame:
+            # Require the following frame to also be valid to avoid being
+            # fooled by a stray sync pattern.
+            next_position = position + frame.length
+            if next_position + 4 > len(data):
+                f.seek(start + next_position)
+                next_header = f.read(4)
+            else:
+                next_header = data[next_position : next_position + 4]
+            if not next_header or _parse_mp3_frame_header(next_header):
+                return start + position, frame
+        position = data.find(b"\xff", position + 1)
+    return None
+
+
+def _xing_offset(frame: _Mp3Frame) -> int:
+    # The Xing header sits right after the side information of the first frame.
+    if frame.version == MPEG_1:
+        side_info = 17 if frame.mono else 32
+    else:
+        side_info = 9 if frame.mono else 17
+    return 4 + side_info
+
+
+def _duration_from_vbr_header(
+    first_frame: bytes, frame: _Mp3Frame
+) -> typing.Optional[float]:
+    xing_start = _xing_offset(frame)
+    tag = first_frame[xing_start : xing_start + 4]
+    if tag in (b"Xing", b"Info"):
+        (flags,) = struct.unpack(">I", first_frame[xing_start + 4 : xing_start + 8])
+        if not flags & 0x1:
+            return None
+        (frames,) = struct.unpack(">I", first_frame[xing_start + 8 : xing_start + 12])
+
+        # Skip over the optional byte count, table of contents and quality
+        # fields to find the LAME extension, which holds the gapless info.
+        lame_start = xing_start + 12
+        for flag, size in ((0x2, 4), (0x4, 100), (0x8, 4)):
+            if flags & flag:
+                lame_start += size
+
+        samples = int(frames) * frame.samples
+        lame_tag = first_frame[lame_start : lame_start + 24]
+        if len(lame_tag) == 24 and lame_tag[:4] in (b"LAME", b"Lavf", b"Lavc"):
+            delay = (lame_tag[21] << 4) | (lame_tag[22] >> 4)
+            padding = ((lame_tag[22] & 0xF) << 8) | lame_tag[23]
+            samples -= delay + padding
+        return max(samples, 0) / frame.sample_rate
+
+    vbri_start = 4 + 32
+    if first_frame[vbri_start : vbri_start + 4] == b"VBRI":
+        (frames,) = struct.unpack(">I", first_frame[vbri_start + 14 : vbri_start + 18])
+        return int(frames) * frame.samples / frame.sample_rate
+
+    return None
+
+
+def _audio_end(f: typing.BinaryIO, file_size: int) -> int:
+    # Trailing ID3v1 tags aren't audio, so exclude them from size estimates.
+    if file_size >= 128:
+        f.seek(file_size - 128)
+        if f.read(3) == b"TAG":
+            return file_size - 128
+    return file_size
+
+
+def _count_mp3_frames(
+    f: typing.BinaryIO, position: int, end: int, max_frames: typing.Optional[int]
+) -> typing.Tuple[int, int, typing.Set[int]]:
+    frames = 0
+    samples = 0
+    bitrates = set()
+    while position + 4 <= end and (max_frames is None or frames < max_frames):
+        f.seek(position)
+        frame = _parse_mp3_frame_header(f.read(4))
+        if not frame:
+            break
+        frames += 1
+        samples += frame.samples
+        bitrates.add(frame.bitrate)
+        position += frame.length
+    return frames, samples, bitrates
+
+
+def get_mp3_duration(path: pathlib.Path) -> typing.Optional[float]:
+    with open(path, "rb") as f:
+        f.seek(0, 2)
+        file_size = f.tell()
+        f.seek(0)
+        audio_start = _skip_id3v2(f)
+
+        found = _find_first_mp3_frame(f, audio_start)
+        if found is None:
+            return None
+        position, frame = found
+
+        f.seek(position)
+        first_frame = f.read(max(frame.length, 4 + 32 + 18))
+        duration = _duration_from_vbr_header(first_frame, frame)
+        if duration is not None:
+            return duration
+
+        # Without a VBR header, sample the first frames to see if the file is
+        # constant bitrate, in which case the duration follows from its size.
+        end = _audio_end(f, file_size)
+        frames, samples, bitrates = _count_mp3_frames(
+            f, position, end, MP3_CBR_SAMPLE_FRAMES
+        )
+        if frames < MP3_CBR_SAMPLE_FRAMES:
+            # The whole file was short enough to be sampled.
+            return samples / frame.sample_rate
+        if len(bitrates) == 1:
+            return (end - position) * 8 / frame.bitrate
+
+        # Variable bitrate without a header, so fall back to counting frames.
+        frames, samples, _ = _count_mp3_frames(f, position, end, None)
+        return samples / frame.sample_rate
+
+
+def _read_atom_header(
+    f: typing.BinaryIO, end: int
+) -> typing.Optional[typing.Tuple[bytes, int, int]]:
+    start = f.tell()
+    if start + 8 > end:
+        return None
+    header = f.read(8)
+    if len(header) < 8:
+        return None
+    size, atom_type = struct.unpack(">I4s", header)
+    if size == 1:
+        (size,) = struct.unpack(">Q", f.read(8))
+    elif size == 0:
+        size = end - start
+    if size < 8:
+        return None
+    return atom_type, f.tell(), start + size
+
+
+def _duration_from_header_atom(f: typing.BinaryIO) -> typing.Optional[float]:
+    # mvhd and mdhd share the same layout for the timescale and duration.
+    version = f.read(4)[0]
+    if version == 1:
+        _, _, timescale, duration = struct.unpack(">QQIQ", f.read(28))
+    else:
+        _, _, timescale, duration = struct.unpack(">IIII", f.read(16))
+    if not timescale or not duration:
+        return None
+    return float(duration / timescale)
+
+
+def _find_m4a_duration(
+    f: typing.BinaryIO, start: int, end: int
+) -> typing.Optional[float]:
+    media_duration = None
+    f.seek(start)
+    while True:
+        atom = _read_atom_header(f, end)
+        if atom is None:
+            break
+        atom_type, data_start, atom_end = atom
+
+        if atom_type == b"mvhd":
+            duration = _duration_from_header_atom(f)
+            if duration is not None:
+                return duration
+        elif atom_type == b"mdhd" and media_duration is None:
+            media_duration = _duration_from_header_atom(f)
+        elif atom_type in M4A_CONTAINER_ATOMS:
+            duration = _find_m4a_duration(f, data_start, atom_end)
+            if duration is not None:
+                return duration
+
+        # Skip over everything else, including the audio data, without reading it.
+        f.seek(atom_end)
+
+    return media_duration
+
+
+def get_m4a_duration(path: pathlib.Path) -> typing.Optional[float]:
+    with open(path, "rb") as f:
+        f.seek(0, 2)
+        file_size = f.tell()
+        return _find_m4a_duration(f, 0, file_size)
+
+
+def get_duration(path: pathlib.Path) -> typing.Optional[float]:
+    """Return the duration of |path| in seconds, or None if it can't be probed."""
+    ext = path.suffix.lower()
+    try:
+        if ext == ".mp3":
+            return get_mp3_duration(path)
+        elif ext == ".m4a":
+            return get_m4a_duration(path)
+    except (struct.error, IndexError):
+        return None
+    return None
+
+
+class CrossCheckResult(typing.NamedTuple):
+    file: pathlib.Path
+    probed: typing.Optional[float]
+    reference: typing.Optional[float]
+    # Whether the durations are within the tolerance of each other.
+    matches: bool
+
+
+def cross_check(
+    folder: pathlib.Path,
+    reference: typing.Callable[[pathlib.Path], typing.Optional[float]],
+    tolerance: float,
+) -> typing.List[CrossCheckResult]:
+    """Compare probed durations against |reference| for all files in |folder|.
+
+    Durations match if they differ by at most |tolerance| seconds.
+    """
+    results = []
+    for file in sorted(folder.iterdir()):
+        if file.suffix.lower() not in (".mp3", ".m4a"):
+            continue
+
+        probed = get_duration(file)
+        expected = reference(file)
+        matches = (
+            probed is not None
+            and expected is not None
+            and abs(probed - expected) <= tolerance
+        )
+        results.append(CrossCheckResult(file, probed, expected, matches))
+    return results
+
+
+def _pyglet_duration(path: pathlib.Path) -> typing.Optional[float]:
+    import pyglet
+
+    duration = pyglet.media.load(str(path)).duration
+    return None if duration is None else float(duration)
+
+
+def main(args: typing.Optional[typing.List[str]]) -> int:
+    parser = argparse.ArgumentParser(
+        description="Compare header probed durations with pyglet's decoded durations"
+    )
+    parser.add_argument(
+        "--cross-check",
+        type=pathlib.Path,
+        required=True,
+        help="Folder of mp3 and m4a files to compare",
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.5,
+        help="Allowed difference in seconds",
+    )
+    parsed_args = parser.parse_args(args)
+
+    results = cross_check(
+        parsed_args.cross_check, _pyglet_duration, parsed_args.tolerance
+    )
+    for result in results:
+        print(
+            "%s %s: probed %s, reference %s"
+            % (
+                "OK  " if result.matches else "FAIL",
+                result.file.name,
+                result.probed,
+                result.reference,
+            )
+        )
+
+    mismatches = [x for x in results if not x.matches]
+    if mismatches:
+        print("%d files didn't match" % (len(mismatches)))
+        return 1
+    print("All files matched")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
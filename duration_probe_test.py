@@ -0,0 +1,138 @@
+import pathlib
+import struct
+import tempfile
+import unittest
+
+import duration_probe
+import test_utils
+
+# MPEG 1 Layer III, 44.1kHz, joint stereo frame headers by bitrate.
+MP3_128_KBPS_HEADER = b"\xff\xfb\x90\x64"
+MP3_64_KBPS_HEADER = b"\xff\xfb\x50\x64"
+
+MP3_TEST_FILE_LENGTH = 9.7675
+M4A_TEST_FILE_LENGTH = 9.791
+
+
+def _mp3_frame(header: bytes) -> bytes:
+    frame = duration_probe._parse_mp3_frame_header(header)
+    assert frame is not None
+    return header + bytes(frame.length - len(header))
+
+
+def _atom(atom_type: bytes, payload: bytes) -> bytes:
+    return struct.pack(">I4s", len(payload) + 8, atom_type) + payload
+
+
+class TestDurationProbe(unittest.TestCase):
+    def setUp(self) -> None:
+        self._root_directory = tempfile.TemporaryDirectory()
+        self.root = pathlib.Path(self._root_directory.name)
+
+    def tearDown(self) -> None:
+        self._root_directory.cleanup()
+
+    def _write(self, name: str, data: bytes) -> pathlib.Path:
+        path = pathlib.Path(self.root, name)
+        with open(path, "wb") as f:
+            f.write(data)
+        return path
+
+    def test_test_data_mp3s(self) -> None:
+        for name in [
+            test_utils.MP3_TEST_FILE,
+            test_utils.MP3_NO_TITLE_NO_ALBUM,
+            test_utils.MP3_DIFFERENT_TITLE_ENCODING,
+            test_utils.MP3_WITH_EMOJI,
+            test_utils.MP3_WITH_MULTIPLE_UTF8,
+        ]:
+            with self.subTest(name=name):
+                duration = duration_probe.get_duration(
+                    pathlib.Path(test_utils.TEST_DATA_DIR, name)
+                )
+                assert duration is not None
+                self.assertAlmostEqual(MP3_TEST_FILE_LENGTH, duration, places=3)
+                self.assertEqual(test_utils.TEST_FILE_LENGTH_IN_SECONDS, int(duration))
+
+    def test_test_data_m4as(self) -> None:
+        for name in [
+            test_utils.M4A_TEST_FILE,
+            test_utils.M4A_NO_TITLE_NO_ALBUM,
+            test_utils.M4A_DIFFERENT_TITLE_ENCODING,
+        ]:
+            with self.subTest(name=name):
+                duration = duration_probe.get_duration(
+                    pathlib.Path(test_utils.TEST_DATA_DIR, name)
+                )
+                assert duration is not None
+                self.assertAlmostEqual(M4A_TEST_FILE_LENGTH, duration, places=3)
+                self.assertEqual(test_utils.TEST_FILE_LENGTH_IN_SECONDS, int(duration))
+
+    def test_unsupported_file_type(self) -> None:
+        self.assertIsNone(
+            duration_probe.get_duration(
+                pathlib.Path(test_utils.TEST_DATA_DIR, test_utils.WEBM_TEST_FILE)
+            )
+        )
+
+    def test_not_audio(self) -> None:
+        path = self._write("not_audio.mp3", b"this isn't an mp3 file" * 100)
+        self.assertIsNone(duration_probe.get_duration(path))
+
+    def test_constant_bitrate_mp3_without_header(self) -> None:
+        num_frames = 1000
+        frame = _mp3_frame(MP3_128_KBPS_HEADER)
+        id3v1_tag = b"TAG" + bytes(125)
+        path = self._write("cbr.mp3", frame * num_frames + id3v1_tag)
+
+        # Constant bitrate files are measured from their size, not frame count.
+        duration = duration_probe.get_duration(path)
+        assert duration is not None
+        self.assertAlmostEqual(num_frames * len(frame) * 8 / 128000, duration)
+
+    def test_variable_bitrate_mp3_without_header(self) -> None:
+        frames = [MP3_128_KBPS_HEADER, MP3_64_KBPS_HEADER] * 100
+        path = self._write("vbr.mp3", b"".join(_mp3_frame(x) for x in frames))
+
+        duration = duration_probe.get_duration(path)
+        assert duration is not None
+        self.assertAlmostEqual(len(frames) * 1152 / 44100, duration)
+
+    def test_m4a_with_large_atoms_and_only_media_header(self) -> None:
+        # mdhd version 1, 48kHz timescale, 90 minutes long.
+        mdhd = _atom(
+            b"mdhd",
+            struct.pack(">B3xQQIQ", 1, 0, 0, 48000, 48000 * 90 * 60) + bytes(4),
+        )
+        moov = _atom(b"moov", _atom(b"trak", _atom(b"mdia", mdhd)))
+        # A 64 bit sized mdat atom, which must be skipped over.
+        audio = bytes(1000)
+        mdat = struct.pack(">I4sQ", 1, b"mdat", len(audio) + 16) + audio
+        path = self._write("large.m4a", _atom(b"ftyp", b"M4A ") + mdat + moov)
+
+        self.assertEqual(90 * 60, duration_probe.get_duration(path))
+
+    def test_cross_check(self) -> None:
+        def reference(path: pathlib.Path) -> float:
+            if path.suffix == ".mp3":
+                return MP3_TEST_FILE_LENGTH
+            return M4A_TEST_FILE_LENGTH
+
+        results = duration_probe.cross_check(
+            pathlib.Path(test_utils.TEST_DATA_DIR), reference, tolerance=0.01
+        )
+        self.assertEqual(8, len(results))
+        self.assertTrue(all(x.matches for x in results))
+        self.assertTrue(
+            all(x.reference == reference(x.file) for x in results),
+        )
+
+        results = duration_probe.cross_check(
+            pathlib.Path(test_utils.TEST_DATA_DIR), lambda x: 100.0, tolerance=0.01
+        )
+        self.assertEqual(8, len(results))
+        self.assertFalse(any(x.matches for x in results))
+
+
+if __name__ == "__main__":
+    unittest.main()
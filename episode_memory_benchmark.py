@@ -0,0 +1,112 @@
+import argparse
+import pathlib
+import subprocess
+import sys
+import tracemalloc
+import typing
+
+import podcast_episode
+import podcast_show
+
+_EPISODES_PER_SHOW = 1000
+
+
+class _DictPodcastEpisode(object):
+    """PodcastEpisode as it was before __slots__, for comparison."""
+
+    def __init__(
+        self, path: pathlib.Path, index: int, duration: int, modification_time: int
+    ) -> None:
+        self.path = path
+        self.index = index
+        self.duration = duration
+        self.modification_time = modification_time
+
+
+_EPISODE_TYPES: typing.Dict[str, typing.Callable[..., typing.Any]] = {
+    "dict": _DictPodcastEpisode,
+    "slots": podcast_episode.PodcastEpisode,
+}
+
+
+def _create_library(
+    num_episodes: int, episode_type: typing.Callable[..., typing.Any]
+) -> typing.List[podcast_show.PodcastShow]:
+    podcast_shows = []
+    for show_index in range(0, num_episodes, _EPISODES_PER_SHOW):
+        show = podcast_show.PodcastShow(
+            pathlib.Path("show_%04d" % (show_index)).absolute(), podcast_show.P0
+        )
+        show.episodes = [
+            episode_type(
+                show.podcast_folder / ("episode_%06d.mp3" % (i)),
+                i + 1,
+                3600,
+                1330712222 + i,
+            )
+            for i in range(min(_EPISODES_PER_SHOW, num_episodes - show_index))
+        ]
+        podcast_shows.append(show)
+    return podcast_shows
+
+
+def _peak_rss_kib() -> typing.Optional[int]:
+    try:
+        import resource
+    except ImportError:
+        # Not available on Windows.
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS reports bytes, Linux reports KiB.
+    return peak // 1024 if sys.platform == "darwin" else peak
+
+
+def _measure(variant: str, num_episodes: int) -> None:
+    tracemalloc.start()
+    library = _create_library(num_episodes, _EPISODE_TYPES[variant])
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    assert sum(len(x.episodes) for x in library) == num_episodes
+    print("%d %d" % (peak // 1024, _peak_rss_kib() or 0))
+
+
+def main(args: typing.Optional[typing.List[str]]) -> int:
+    parser = argparse.ArgumentParser(
+        description="Compare the memory used by episodes with and without __slots__"
+    )
+    parser.add_argument(
+        "--episodes", type=int, default=100000, help="Number of episodes to create"
+    )
+    parser.add_argument("--variant", choices=_EPISODE_TYPES, help=argparse.SUPPRESS)
+    parsed_args = parser.parse_args(args)
+
+    if parsed_args.variant:
+        _measure(parsed_args.variant, parsed_args.episodes)
+        return 0
+
+    # Each variant runs in its own process so they each get their own peak.
+    print("Created %d episodes" % (parsed_args.episodes))
+    for variant in _EPISODE_TYPES:
+        output = subprocess.run(
+            [
+                sys.executable,
+                __file__,
+                "--episodes",
+                str(parsed_args.episodes),
+                "--variant",
+                variant,
+            ],
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout
+        allocated_kib, rss_kib = (int(x) for x in output.split())
+        print(
+            "%s: %d KiB allocated at peak, %s peak RSS"
+            % (variant, allocated_kib, "%d KiB" % (rss_kib) if rss_kib else "unknown")
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -7,6 +7,18 @@ import time_helper
 
 
 class FullPodcastEpisode(object):
+    __slots__ = (
+        "index",
+        "path",
+        "podcast_show_name",
+        "speed",
+        "archive",
+        "_modification_time",
+        "_modification_timestamp",
+        "_duration",
+        "_duration_seconds",
+    )
+
     def __init__(
         self,
         index: int,
@@ -22,8 +34,63 @@ class FullPodcastEpisode(object):
         self.podcast_show_name = podcast_show_name
         self.speed = speed
         self.archive = archive
-        self.modification_time = modification_time
-        self.duration = duration
+        self._modification_time: typing.Optional[datetime.datetime] = modification_time
+        self._modification_timestamp = 0
+        self._duration: typing.Optional[datetime.timedelta] = duration
+        self._duration_seconds = 0
+
+    @classmethod
+    def from_seconds(
+        cls,
+        index: int,
+        path: pathlib.Path,
+        podcast_show_name: str,
+        speed: float,
+        archive: archive.Archive,
+        modification_timestamp: int,
+        duration_seconds: int,
+    ) -> "FullPodcastEpisode":
+        """Create an episode whose datetime fields are only made when used."""
+        episode = cls.__new__(cls)
+        episode.index = index
+        episode.path = path
+        episode.podcast_show_name = podcast_show_name
+        episode.speed = speed
+        episode.archive = archive
+        episode._modification_time = None
+        episode._modification_timestamp = modification_timestamp
+        episode._duration = None
+        episode._duration_seconds = duration_seconds
+        return episode
+
+    @property
+    def modification_time(self) -> datetime.datetime:
+        if self._modification_time is None:
+            self._modification_time = datetime.datetime.fromtimestamp(
+                self._modification_timestamp
+            )
+        return self._modification_time
+
+    @modification_time.setter
+    def modification_time(self, modification_time: datetime.datetime) -> None:
+        self._modification_time = modification_time
+
+    @property
+    def duration(self) -> datetime.timedelta:
+        if self._duration is None:
+            self._duration = datetime.timedelta(seconds=self._duration_seconds)
+        return self._duration
+
+    @duration.setter
+    def duration(self, duration: datetime.timedelta) -> None:
+        self._duration = duration
+
+    @property
+    def listening_time(self) -> datetime.timedelta:
+        """How long the episode takes to play at its speed, to the second."""
+        return datetime.timedelta(
+            seconds=round(self.duration.total_seconds() / self.speed)
+        )
 
     def __str__(self) -> str:
         return (
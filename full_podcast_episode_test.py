@@ -50,6 +50,32 @@ class TestFullPodcastEpisode(unittest.TestCase):
         wrong_duration.duration += datetime.timedelta(hours=1)
         self.assertNotEqual(selected, wrong_duration)
 
+    def test_from_seconds(self) -> None:
+        modification_time = datetime.datetime.fromisoformat("2020-02-02")
+        selected = full_podcast_episode.FullPodcastEpisode.from_seconds(
+            index=1,
+            path=pathlib.Path("Test/Path"),
+            podcast_show_name="Test Show",
+            speed=1.0,
+            archive=archive.Archive.NO,
+            modification_timestamp=int(modification_time.timestamp()),
+            duration_seconds=10,
+        )
+
+        self.assertEqual(
+            full_podcast_episode.FullPodcastEpisode(
+                index=1,
+                path=pathlib.Path("Test/Path"),
+                podcast_show_name="Test Show",
+                speed=1.0,
+                archive=archive.Archive.NO,
+                modification_time=modification_time,
+                duration=datetime.timedelta(seconds=10),
+            ),
+            selected,
+        )
+        self.assertIs(selected.modification_time, selected.modification_time)
+
     def test_str(self) -> None:
         selected = full_podcast_episode.FullPodcastEpisode(
             index=1,
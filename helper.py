@@ -2,19 +2,34 @@ import os
 import pathlib
 import shutil
 import tempfile
+import typing
 
 import audio_metadata
 import conversions
+import loudness_cache
 
 
 def prepare_audio_and_move(
-    file: pathlib.Path, dest: pathlib.Path, title: str, album: str, speed: float
+    file: pathlib.Path,
+    dest: pathlib.Path,
+    title: str,
+    album: str,
+    speed: float,
+    loudness_cache_folder: typing.Optional[pathlib.Path] = None,
+    threads: typing.Optional[int] = None,
 ) -> None:
     print("Preparing Audio file %s" % file)
 
+    measurement = None
+    if loudness_cache_folder:
+        cache = loudness_cache.LoudnessCache(loudness_cache_folder)
+        measurement = cache.measure(file, threads)
+
     with tempfile.TemporaryDirectory() as tmpdir:
         working_copy = pathlib.Path(tmpdir, file.name)
-        conversions.create_adjusted_podcast_for_playback(file, working_copy, speed)
+        conversions.create_adjusted_podcast_for_playback(
+            file, working_copy, speed, measurement, threads
+        )
 
         audio_metadata.set_metadata(working_copy, title=title, album=album)
 
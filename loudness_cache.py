@@ -0,0 +1,89 @@
+import dataclasses
+import json
+import os
+import pathlib
+import typing
+
+import atomic_file
+import conversions
+import duration_cache
+
+CACHE_VERSION = 1
+
+# Measurements are only reused until a file has been converted, so only keep
+# the most recent ones around.
+MAX_ENTRIES = 2000
+
+
+class LoudnessCache(object):
+    """Loudness measurements of source files, keyed by their contents.
+
+    Each measurement is its own file in |folder|, written as soon as it's
+    taken. This lets separate conversion processes share the cache and keeps
+    the measurements from a run that was stopped part way through.
+    """
+
+    def __init__(self, folder: pathlib.Path) -> None:
+        self._folder = folder
+
+    def _entry_path(self, path: pathlib.Path) -> pathlib.Path:
+        # Colons aren't allowed in file names on Windows.
+        key = duration_cache.file_key(path).replace(":", "_")
+        return pathlib.Path(self._folder, key + ".json")
+
+    def get(
+        self, path: pathlib.Path
+    ) -> typing.Optional[conversions.LoudnessMeasurement]:
+        try:
+            with open(self._entry_path(path), "r", encoding="utf-8") as f:
+                raw_json = json.load(f)
+        except FileNotFoundError:
+            return None
+        except json.decoder.JSONDecodeError as e:
+            print("Ignoring unreadable loudness measurement for %s: %s" % (path, e))
+            return None
+
+        if raw_json.get("version") != CACHE_VERSION:
+            return None
+        return conversions.LoudnessMeasurement(**raw_json["measurement"])
+
+    def add(
+        self, path: pathlib.Path, measurement: conversions.LoudnessMeasurement
+    ) -> None:
+        self._folder.mkdir(parents=True, exist_ok=True)
+        atomic_file.write_text(
+            self._entry_path(path),
+            json.dumps(
+                {
+                    "version": CACHE_VERSION,
+                    "measurement": dataclasses.asdict(measurement),
+                }
+            ),
+        )
+
+    def measure(
+        self, path: pathlib.Path, threads: typing.Optional[int] = None
+    ) -> conversions.LoudnessMeasurement:
+        """Return the loudness of |path|, only measuring it if it isn't cached."""
+        measurement = self.get(path)
+        if measurement is None:
+            measurement = conversions.measure_loudness(path, threads)
+            self.add(path, measurement)
+        return measurement
+
+    def prune(self, max_entries: int = MAX_ENTRIES) -> int:
+        """Remove all but the |max_entries| newest measurements.
+
+        Returns the number of measurements removed.
+        """
+        if not self._folder.is_dir():
+            return 0
+
+        entries = sorted(
+            (x for x in os.scandir(self._folder) if x.name.endswith(".json")),
+            key=lambda x: x.stat().st_mtime,
+            reverse=True,
+        )
+        for entry in entries[max_entries:]:
+            os.remove(entry.path)
+        return max(len(entries) - max_entries, 0)
@@ -0,0 +1,92 @@
+import os
+import pathlib
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import conversions
+import loudness_cache
+import test_utils
+
+_MEASUREMENT = conversions.LoudnessMeasurement(-27.61, -4.47, 18.06, -39.2, 0.58)
+
+
+class TestLoudnessCache(unittest.TestCase):
+    def setUp(self) -> None:
+        self._root_directory = tempfile.TemporaryDirectory()
+        self.root = pathlib.Path(self._root_directory.name)
+        self.cache_folder = pathlib.Path(self.root, "loudness_cache")
+
+        self.podcast_file = pathlib.Path(self.root, "podcast.mp3")
+        shutil.copyfile(
+            pathlib.Path(test_utils.TEST_DATA_DIR, test_utils.MP3_TEST_FILE),
+            self.podcast_file,
+        )
+
+    def tearDown(self) -> None:
+        self._root_directory.cleanup()
+
+    def test_add_and_get(self) -> None:
+        cache = loudness_cache.LoudnessCache(self.cache_folder)
+        self.assertIsNone(cache.get(self.podcast_file))
+
+        cache.add(self.podcast_file, _MEASUREMENT)
+        self.assertEqual(_MEASUREMENT, cache.get(self.podcast_file))
+
+        # Other processes see the measurement, even after the file is moved.
+        moved_file = pathlib.Path(self.root, "moved.mp3")
+        self.podcast_file.rename(moved_file)
+        self.assertEqual(
+            _MEASUREMENT,
+            loudness_cache.LoudnessCache(self.cache_folder).get(moved_file),
+        )
+
+    def test_silent_measurement(self) -> None:
+        silent = conversions.LoudnessMeasurement(
+            float("-inf"), float("-inf"), 0.0, -70.0, 0.0
+        )
+        cache = loudness_cache.LoudnessCache(self.cache_folder)
+        cache.add(self.podcast_file, silent)
+        self.assertEqual(silent, cache.get(self.podcast_file))
+
+    def test_unreadable_entry_ignored(self) -> None:
+        cache = loudness_cache.LoudnessCache(self.cache_folder)
+        cache.add(self.podcast_file, _MEASUREMENT)
+        (entry,) = self.cache_folder.iterdir()
+        entry.write_text("not json")
+
+        self.assertIsNone(cache.get(self.podcast_file))
+
+    @mock.patch("conversions.measure_loudness")
+    def test_measure(self, mock_measure: mock.Mock) -> None:
+        mock_measure.return_value = _MEASUREMENT
+        cache = loudness_cache.LoudnessCache(self.cache_folder)
+
+        self.assertEqual(_MEASUREMENT, cache.measure(self.podcast_file))
+        self.assertEqual(_MEASUREMENT, cache.measure(self.podcast_file))
+        mock_measure.assert_called_once_with(self.podcast_file, None)
+
+    def test_prune(self) -> None:
+        cache = loudness_cache.LoudnessCache(self.cache_folder)
+        self.assertEqual(0, cache.prune())
+
+        files = []
+        for x in range(3):
+            path = pathlib.Path(self.root, "podcast_%d.mp3" % (x))
+            path.write_text(str(x))
+            cache.add(path, _MEASUREMENT)
+            files.append(path)
+        # Make the first file's measurement the oldest.
+        for x, path in enumerate(files):
+            entry = cache._entry_path(path)
+            os.utime(entry, (1330712292 + x, 1330712292 + x))
+
+        self.assertEqual(1, cache.prune(max_entries=2))
+        self.assertIsNone(cache.get(files[0]))
+        self.assertEqual(_MEASUREMENT, cache.get(files[1]))
+        self.assertEqual(_MEASUREMENT, cache.get(files[2]))
+
+
+if __name__ == "__main__":
+    unittest.main()
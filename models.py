@@ -1,16 +1,32 @@
 """SQLAlchemy models for podcast database persistence."""
 
+import contextlib
 import pathlib
+import sqlite3
+import threading
+from typing import Any, Dict, Iterator, Optional, Tuple
 
 from sqlalchemy import (
     ForeignKey,
+    Index,
     Integer,
+    Select,
     String,
     UniqueConstraint,
     create_engine,
+    event,
+    func,
+    select,
 )
 from sqlalchemy.engine import Engine
-from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
+from sqlalchemy.orm import (
+    DeclarativeBase,
+    Mapped,
+    Session,
+    mapped_column,
+    relationship,
+)
+from sqlalchemy.pool import QueuePool
 
 
 class Base(DeclarativeBase):
@@ -26,6 +42,10 @@ class ShowModel(Base):
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     folder_name: Mapped[str] = mapped_column(String, unique=True, nullable=False)
+    # None until the show's first episode is added.
+    next_index: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    # The show's podcast_show priority, so selection can be ordered in SQL.
+    priority: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
 
     episodes: Mapped[list["EpisodeModel"]] = relationship(
         "EpisodeModel", back_populates="show", cascade="all, delete-orphan"
@@ -48,19 +68,138 @@ class EpisodeModel(Base):
 
     show: Mapped["ShowModel"] = relationship("ShowModel", back_populates="episodes")
 
-    __table_args__ = (UniqueConstraint("show_id", "path", name="uq_show_episode_path"),)
+    __table_args__ = (
+        UniqueConstraint("show_id", "path", name="uq_show_episode_path"),
+        # Oldest episodes of a show first.
+        Index("ix_episodes_show_id_modification_time", "show_id", "modification_time"),
+        # A show's highest episode index.
+        Index("ix_episodes_show_id_episode_index", "show_id", "episode_index"),
+    )
+
+
+def select_oldest_episodes(show_id: int, limit: int) -> Select[Tuple[EpisodeModel]]:
+    """Select a show's oldest episodes, oldest first."""
+    return (
+        select(EpisodeModel)
+        .where(EpisodeModel.show_id == show_id)
+        .order_by(EpisodeModel.modification_time)
+        .limit(limit)
+    )
+
+
+def select_max_episode_index(show_id: int) -> Select[Tuple[int]]:
+    """Select a show's highest episode index, or None if it has no episodes."""
+    return select(func.max(EpisodeModel.episode_index)).where(
+        EpisodeModel.show_id == show_id
+    )
+
+
+def select_episodes_by_priority(priority: int) -> Select[Tuple[EpisodeModel]]:
+    """Select the episodes of shows with |priority|, oldest first."""
+    return (
+        select(EpisodeModel)
+        .join(ShowModel)
+        .where(ShowModel.priority == priority)
+        .order_by(EpisodeModel.modification_time)
+    )
+
+
+# Negative cache sizes are in KiB rather than pages.
+CACHE_SIZE_KIB = 64 * 1024
+MMAP_SIZE_BYTES = 256 * 1024 * 1024
+
+_engines: Dict[Tuple[pathlib.Path, bool], Engine] = {}
+_engines_lock = threading.Lock()
+
 
+def _set_sqlite_pragmas(dbapi_connection: Any, read_only: bool) -> None:
+    cursor = dbapi_connection.cursor()
+    try:
+        if read_only:
+            cursor.execute("PRAGMA query_only=ON")
+        else:
+            # With WAL, commits append to the log instead of syncing a rollback
+            # journal, and readers don't block the writer.
+            cursor.execute("PRAGMA journal_mode=WAL")
+        # NORMAL is still durable across application crashes in WAL mode.
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute("PRAGMA cache_size=-%d" % (CACHE_SIZE_KIB))
+        cursor.execute("PRAGMA mmap_size=%d" % (MMAP_SIZE_BYTES))
+        cursor.execute("PRAGMA temp_store=MEMORY")
+    finally:
+        cursor.close()
 
-def get_engine(db_path: pathlib.Path) -> Engine:
-    """Create a SQLAlchemy engine for the given database path.
+
+def _create_engine(db_path: pathlib.Path, read_only: bool) -> Engine:
+    if read_only:
+        uri = "%s?mode=ro" % (db_path.as_uri())
+        engine = create_engine(
+            "sqlite://",
+            creator=lambda: sqlite3.connect(uri, uri=True, check_same_thread=False),
+            # Without a path the URL looks like an in-memory database, which
+            # would otherwise get a single connection per thread.
+            poolclass=QueuePool,
+            echo=False,
+        )
+    else:
+        engine = create_engine(f"sqlite:///{db_path}", echo=False)
+
+    @event.listens_for(engine, "connect")
+    def on_connect(dbapi_connection: Any, connection_record: Any) -> None:
+        _set_sqlite_pragmas(dbapi_connection, read_only)
+
+    return engine
+
+
+def get_engine(db_path: pathlib.Path, read_only: bool = False) -> Engine:
+    """Get the SQLAlchemy engine for the given database path.
+
+    Engines are shared by the whole process, so each database only pays for
+    its connection setup once.
 
     Args:
         db_path: Path to the SQLite database file.
+        read_only: Whether to open the database read-only, for reporting.
 
     Returns:
         SQLAlchemy Engine instance.
     """
-    return create_engine(f"sqlite:///{db_path}", echo=False)
+    key = (db_path.absolute(), read_only)
+    with _engines_lock:
+        engine = _engines.get(key)
+        if engine is None:
+            engine = _create_engine(key[0], read_only)
+            _engines[key] = engine
+        return engine
+
+
+def dispose_engines() -> None:
+    """Close every engine's connections and forget the engines."""
+    with _engines_lock:
+        for engine in _engines.values():
+            engine.dispose()
+        _engines.clear()
+
+
+@contextlib.contextmanager
+def session_scope(engine: Engine) -> Iterator[Session]:
+    """Provide a session that commits on success and rolls back on error.
+
+    Args:
+        engine: SQLAlchemy Engine instance.
+
+    Yields:
+        Session to use for database operations.
+    """
+    session = Session(engine)
+    try:
+        yield session
+        session.commit()
+    except BaseException:
+        session.rollback()
+        raise
+    finally:
+        session.close()
 
 
 def init_db(engine: Engine) -> None:
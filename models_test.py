@@ -2,9 +2,10 @@
 
 import pathlib
 import tempfile
+import typing
 import unittest
 
-from sqlalchemy.exc import IntegrityError
+from sqlalchemy.exc import IntegrityError, OperationalError
 from sqlalchemy.orm import Session
 
 import models
@@ -199,6 +200,106 @@ class TestModels(unittest.TestCase):
             )
             self.assertIsNone(not_found)
 
+    def test_engine_pragmas(self) -> None:
+        with self.engine.connect() as connection:
+
+            def pragma(name: str) -> typing.Any:
+                return connection.exec_driver_sql("PRAGMA %s" % (name)).scalar()
+
+            self.assertEqual("wal", pragma("journal_mode"))
+            # NORMAL
+            self.assertEqual(1, pragma("synchronous"))
+            self.assertEqual(-models.CACHE_SIZE_KIB, pragma("cache_size"))
+            self.assertEqual(models.MMAP_SIZE_BYTES, pragma("mmap_size"))
+            # MEMORY
+            self.assertEqual(2, pragma("temp_store"))
+
+    def test_engine_is_shared(self) -> None:
+        self.assertIs(self.engine, models.get_engine(self.db_path))
+        self.assertIsNot(self.engine, models.get_engine(self.db_path, read_only=True))
+
+    def test_read_only_engine(self) -> None:
+        with models.session_scope(self.engine) as session:
+            session.add(models.ShowModel(folder_name="test_podcast"))
+
+        read_only_engine = models.get_engine(self.db_path, read_only=True)
+        try:
+            with Session(read_only_engine) as session:
+                shows = session.query(models.ShowModel).all()
+                self.assertEqual(["test_podcast"], [x.folder_name for x in shows])
+
+            with self.assertRaises(OperationalError):
+                with models.session_scope(read_only_engine) as session:
+                    session.add(models.ShowModel(folder_name="other_podcast"))
+        finally:
+            read_only_engine.dispose()
+
+    def test_session_scope_rolls_back_on_error(self) -> None:
+        with self.assertRaises(ValueError):
+            with models.session_scope(self.engine) as session:
+                session.add(models.ShowModel(folder_name="test_podcast"))
+                session.flush()
+                raise ValueError()
+
+        with models.session_scope(self.engine) as session:
+            self.assertEqual(0, session.query(models.ShowModel).count())
+
+    def _query_plan(self, statement: typing.Any) -> str:
+        compiled = statement.compile(
+            dialect=self.engine.dialect, compile_kwargs={"literal_binds": True}
+        )
+        with self.engine.connect() as connection:
+            rows = connection.exec_driver_sql(
+                "EXPLAIN QUERY PLAN %s" % (compiled)
+            ).all()
+        return "\n".join(str(x[-1]) for x in rows)
+
+    def test_selection_queries_use_indexes(self) -> None:
+        with models.session_scope(self.engine) as session:
+            for show_index in range(20):
+                show = models.ShowModel(
+                    folder_name="show_%d" % (show_index), priority=show_index % 3
+                )
+                session.add(show)
+                session.flush()
+                session.add_all(
+                    models.EpisodeModel(
+                        show_id=show.id,
+                        path="/show_%d/episode_%d.mp3" % (show_index, x),
+                        episode_index=x,
+                        duration=60,
+                        modification_time=x * 20 + show_index,
+                    )
+                    for x in range(100)
+                )
+        with self.engine.connect() as connection:
+            connection.exec_driver_sql("ANALYZE")
+
+        self.assertIn(
+            "USING INDEX ix_episodes_show_id_modification_time",
+            self._query_plan(models.select_oldest_episodes(1, 5)),
+        )
+        self.assertIn(
+            "USING COVERING INDEX ix_episodes_show_id_episode_index",
+            self._query_plan(models.select_max_episode_index(1)),
+        )
+        # Episodes across shows still need sorting, but are found per show.
+        self.assertRegex(
+            self._query_plan(models.select_episodes_by_priority(1)),
+            "SEARCH episodes USING INDEX ix_episodes_show_id_",
+        )
+
+        with Session(self.engine) as session:
+            oldest = session.scalars(models.select_oldest_episodes(1, 2)).all()
+            self.assertEqual([0, 1], [x.episode_index for x in oldest])
+            self.assertEqual(99, session.scalar(models.select_max_episode_index(1)))
+            by_priority = session.scalars(models.select_episodes_by_priority(0)).all()
+            self.assertEqual(7 * 100, len(by_priority))
+            self.assertEqual(
+                sorted(x.modification_time for x in by_priority),
+                [x.modification_time for x in by_priority],
+            )
+
 
 if __name__ == "__main__":
     unittest.main()
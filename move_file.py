@@ -1,8 +1,12 @@
 import argparse
+import contextlib
+import io
 import os
 import pathlib
 import shutil
 import sys
+import threading
+import traceback
 import typing
 
 import helper
@@ -31,6 +35,8 @@ def _update_file_and_move_over(
     title: str,
     album: str,
     speed: float,
+    loudness_cache_folder: typing.Optional[pathlib.Path],
+    threads: typing.Optional[int],
     dry_run: bool,
 ) -> None:
     if dry_run:
@@ -38,7 +44,13 @@ def _update_file_and_move_over(
         print("With album %s" % album)
     else:
         helper.prepare_audio_and_move(
-            file_source, file_destination, title, album, speed
+            file_source,
+            file_destination,
+            title,
+            album,
+            speed,
+            loudness_cache_folder,
+            threads,
         )
 
 
@@ -50,6 +62,8 @@ def main(args: typing.Optional[typing.List[str]]) -> None:
     parser.add_argument("--album", type=str, required=True)
     parser.add_argument("--title", type=str, required=True)
     parser.add_argument("--speed", type=float, default=1.0)
+    parser.add_argument("--loudness-cache", type=pathlib.Path, default=None)
+    parser.add_argument("--threads", type=int, default=None)
     parser.add_argument("--dry-run", action="store_true", default=False)
     parsed_args = parser.parse_args(args)
 
@@ -63,9 +77,72 @@ def main(args: typing.Optional[typing.List[str]]) -> None:
         parsed_args.title,
         parsed_args.album,
         parsed_args.speed,
+        parsed_args.loudness_cache,
+        parsed_args.threads,
         parsed_args.dry_run,
     )
 
 
+def warm_up() -> int:
+    """Do nothing, to start a worker process with this module imported."""
+    return os.getpid()
+
+
+def run_captured(
+    args: typing.List[str],
+    output: typing.Optional[typing.Callable[[str], None]] = None,
+) -> typing.List[str]:
+    """Run main with |args| and return the non-empty lines it output.
+
+    The output is captured at the file descriptor level too, so it includes
+    the output of any processes started along the way. Errors are reported in
+    the output, like they are when this is run as a script. Each line is also
+    passed to |output| as soon as it's written.
+    """
+    read_fd, write_fd = os.pipe()
+    lines: typing.List[str] = []
+
+    def read_lines() -> None:
+        with open(read_fd, "r", encoding="utf-8", errors="replace") as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    lines.append(line)
+                    if output is not None:
+                        output(line)
+
+    reader = threading.Thread(target=read_lines)
+    reader.start()
+    try:
+        # Written straight through, so it stays in order with child processes.
+        writer = io.TextIOWrapper(
+            io.FileIO(write_fd, "w", closefd=False),
+            encoding="utf-8",
+            write_through=True,
+        )
+        saved_fds = [os.dup(1), os.dup(2)]
+        os.dup2(write_fd, 1)
+        os.dup2(write_fd, 2)
+        try:
+            with contextlib.redirect_stdout(writer), contextlib.redirect_stderr(writer):
+                try:
+                    main(args)
+                except SystemExit:
+                    # argparse has already explained what was wrong.
+                    pass
+                except Exception:
+                    traceback.print_exc()
+        finally:
+            for fd, saved_fd in enumerate(saved_fds, 1):
+                os.dup2(saved_fd, fd)
+                os.close(saved_fd)
+    finally:
+        # The reader stops once every copy of the write end is closed.
+        os.close(write_fd)
+        reader.join()
+
+    return lines
+
+
 if __name__ == "__main__":
     main(sys.argv[1:])
@@ -2,7 +2,10 @@ import os
 import pathlib
 import shutil
 import tempfile
+import threading
+import typing
 import unittest
+from unittest import mock
 
 import audio_metadata
 import move_file
@@ -72,6 +75,55 @@ class TestMoveFile(unittest.TestCase):
         self.assertFalse(os.path.isfile(self.destination_podcast_path))
         self.assertFalse(os.path.isfile(self.archived_podcast_path))
 
+    def test_warm_up(self) -> None:
+        self.assertEqual(os.getpid(), move_file.warm_up())
+
+    def test_run_captured(self) -> None:
+        args = [
+            "--dry-run",
+            "--archive-destination",
+            str(self.archived_podcast_path),
+            "--file-path",
+            str(self.podcast_file),
+            "--file-destination",
+            str(self.destination_podcast_path),
+            "--title",
+            "new_title",
+            "--album",
+            "new_album",
+        ]
+        self.assertEqual(
+            [
+                "Dry run, would have archived %s" % (self.podcast_file),
+                "Dry run, would have moved %s to %s"
+                % (self.podcast_file, self.destination_podcast_path),
+                "With album new_album",
+            ],
+            move_file.run_captured(args),
+        )
+
+    def test_run_captured_streams_output(self) -> None:
+        first_line_seen = threading.Event()
+        streamed = []
+
+        def output(line: str) -> None:
+            streamed.append(line)
+            first_line_seen.set()
+
+        def main(args: typing.List[str]) -> None:
+            print("first")
+            # Only passes if the first line is handed over before main returns.
+            print("streamed" if first_line_seen.wait(10) else "not streamed")
+
+        with mock.patch("move_file.main", main):
+            lines = move_file.run_captured([], output)
+        self.assertEqual(["first", "streamed"], lines)
+        self.assertEqual(lines, streamed)
+
+    def test_run_captured_error(self) -> None:
+        output = move_file.run_captured(["--title", "new_title"])
+        self.assertTrue(any("required" in x for x in output), output)
+
     def test_prod_run_archive(self) -> None:
         args = [
             "--archive-destination",
@@ -1,10 +1,21 @@
+import concurrent.futures
 import datetime
+import heapq
+import itertools
 import pathlib
 import random
 import typing
 
+import atomic_file
+import batch_optimizer
+import database_format
+import database_journal
+import duration_cache
 import full_podcast_episode
+import podcast_episode
 import podcast_show
+import selection_session
+import sqlite_storage
 import time_helper
 import user_input
 
@@ -21,6 +32,93 @@ class PodcastEpisodePathError(Exception):
     pass
 
 
+# Compact the journal into a new full database once it holds this many events.
+MAX_JOURNAL_RECORDS = 1000
+
+
+class _ShowState(typing.NamedTuple):
+    next_index: typing.Optional[int]
+    # Each episode's index, duration and modification time by path.
+    episodes: typing.Dict[str, typing.Tuple[int, int, int]]
+
+    @classmethod
+    def from_record(cls, record: database_format.ShowRecord) -> "_ShowState":
+        return cls(
+            record.next_index,
+            dict(
+                (str(x.path), (x.index, x.duration, x.modification_time))
+                for x in record.episodes
+            ),
+        )
+
+    def events_since(
+        self, name: str, previous: "_ShowState"
+    ) -> typing.List[database_journal.Event_TypeAlias]:
+        events: typing.List[database_journal.Event_TypeAlias] = []
+        for path in previous.episodes.keys() - self.episodes.keys():
+            events.append({"show": name, "remove": path})
+        for path, episode in self.episodes.items():
+            if previous.episodes.get(path) != episode:
+                events.append({"show": name, "add": [path] + list(episode)})
+        if self.next_index != previous.next_index:
+            events.append({"show": name, "next_index": self.next_index})
+        return events
+
+
+class _SavedState(typing.NamedTuple):
+    """What was last loaded from or saved to a database file."""
+
+    path: pathlib.Path
+    # Checksum of the full database file that the journal applies on top of.
+    checksum: int
+    journal_records: int
+    shows: typing.Dict[str, _ShowState]
+
+
+def _continue_to_priority(
+    user_prompt: user_input.PromptYesOrNo_Alias,
+    priority: int,
+    episodes: typing.List[full_podcast_episode.FullPodcastEpisode],
+    duration: datetime.timedelta,
+) -> bool:
+    return user_prompt(
+        "\nFinished adding podcasts with priority %d\nCurrently %d episodes with length %s\nContinue to priority %d?"
+        % (priority - 1, len(episodes), duration, priority)
+    )
+
+
+class _CandidatePool(object):
+    """The oldest unpicked episode of each show, in the order of the shows."""
+
+    def __init__(
+        self,
+        podcast_shows: typing.Iterable[podcast_show.PodcastShow],
+        files_to_ignore: typing.AbstractSet[pathlib.Path],
+    ):
+        # Each show's remaining episodes, alongside its current candidate.
+        self._remaining: typing.List[
+            typing.Iterator[full_podcast_episode.FullPodcastEpisode]
+        ] = []
+        self.candidates: typing.List[full_podcast_episode.FullPodcastEpisode] = []
+        for show in podcast_shows:
+            remaining = show.oldest_episodes(files_to_ignore)
+            candidate = next(remaining, None)
+            if candidate is not None:
+                self._remaining.append(remaining)
+                self.candidates.append(candidate)
+
+    def take(self, index: int) -> full_podcast_episode.FullPodcastEpisode:
+        """Remove and return a candidate, replacing it with its show's next."""
+        picked = self.candidates[index]
+        candidate = next(self._remaining[index], None)
+        if candidate is None:
+            del self._remaining[index]
+            del self.candidates[index]
+        else:
+            self.candidates[index] = candidate
+        return picked
+
+
 class PodcastDatabase(object):
     def __init__(
         self,
@@ -29,6 +127,7 @@ class PodcastDatabase(object):
     ):
         self.podcast_shows = podcast_shows
         self.verbose = verbose
+        self._saved_state: typing.Optional[_SavedState] = None
 
         # Ensure there are no duplicates.
         duplicates = []
@@ -55,51 +154,155 @@ class PodcastDatabase(object):
             self._log("%s isn't a file, not loading a database" % (path))
             return 0
 
+        with open(path, "rb") as f:
+            data = f.read()
+        database_checksum = database_journal.checksum(data)
+        journal = database_journal.read(
+            database_journal.journal_path(path), database_checksum
+        )
+        try:
+            records = database_journal.apply(
+                database_format.decode(data), journal.events
+            )
+        except database_format.DatabaseFormatError as e:
+            raise DatabaseLoadingError("Failed to load %s: %s" % (path, e))
+        self._log(
+            "Loading %d podcasts from %s with %d journal events"
+            % (len(records), path, len(journal.events))
+        )
+
+        # Records can't be appended after a torn one, so compact on next commit.
+        journal_records = MAX_JOURNAL_RECORDS if journal.torn else len(journal.events)
+        self._saved_state = _SavedState(
+            path,
+            database_checksum,
+            journal_records,
+            dict((x.name, _ShowState.from_record(x)) for x in records),
+        )
+
+        return self._load_records(records, user_input_function)
+
+    def load_from_sqlite(
+        self,
+        storage: sqlite_storage.SqliteStorage,
+        user_input_function: typing.Callable[[str], str] = input,
+        import_path: typing.Optional[pathlib.Path] = None,
+    ) -> int:
+        """Load the shows in |storage|.
+
+        An empty |storage| is seeded from the database file at |import_path|,
+        so switching storage keeps each show's episodes and next index. They
+        are written to |storage| on its next save.
+        """
+        records = storage.load()
+        if not records and import_path is not None and import_path.is_file():
+            self._log("Importing podcasts from %s" % (import_path))
+            return self.load(import_path, user_input_function)
+
+        self._log("Loading %d podcasts from %s" % (len(records), storage.engine.url))
+        return self._load_records(records, user_input_function)
+
+    def _load_records(
+        self,
+        records: typing.List[database_format.ShowRecord],
+        user_input_function: typing.Callable[[str], str],
+    ) -> int:
+        podcast_shows_by_name = dict((x.podcast_name, x) for x in self.podcast_shows)
         loaded = 0
-        with open(path, "r", encoding="utf-8") as f:
-            num_podcasts = int(f.readline())
-            self._log("Loading %d podcasts from %s" % (num_podcasts, path))
-            for p in range(num_podcasts):
-                podcast_folder = f.readline().strip()
-                match_found = False
-                for possible_podcast in self.podcast_shows:
-                    if possible_podcast.podcast_folder.name == podcast_folder:
-                        possible_podcast.load(f)
-                        loaded += 1
-                        match_found = True
-                        break
-
-                if not match_found:
-                    remove_keyword = "REMOVE"
-                    no_match_found_message = (
-                        "No match found for %s. Please type %s if you want to remove this podcast:\n"
-                        % (podcast_folder, remove_keyword)
-                    )
-                    no_match_found_user_response = user_input_function(
-                        no_match_found_message
-                    )
-                    if no_match_found_user_response == remove_keyword:
-                        # Since this removed podcast is still in the database file, we load it to parse it from the file, but
-                        # then don't save this data anywhere since we no longer want it.
-                        # Not that PodcastShow requires absolute paths, so we create an absolute path to this podcast, which won't exist.
-                        full_path = pathlib.Path(podcast_folder).absolute()
-                        podcast_show.PodcastShow(
-                            full_path, podcast_show.PRIORITY_SKIP
-                        ).load(f)
-                    else:
-                        raise DatabaseLoadingError(
-                            "Failed to load %s." % (podcast_folder)
-                        )
-        return loaded
+        for record in records:
+            possible_podcast = podcast_shows_by_name.get(record.name)
+            if possible_podcast is not None:
+                possible_podcast.load_record(record)
+                loaded += 1
+                continue
 
-    def save(self, path: pathlib.Path) -> None:
-        with open(path, "w", encoding="utf-8") as f:
-            f.write(str(len(self.podcast_shows)) + "\n")
-            for pod in sorted(self.podcast_shows):
-                f.write(str(pod.podcast_folder.name) + "\n")
-                pod.save(f)
+            remove_keyword = "REMOVE"
+            no_match_found_message = (
+                "No match found for %s. Please type %s if you want to remove this podcast:\n"
+                % (record.name, remove_keyword)
+            )
+            no_match_found_user_response = user_input_function(no_match_found_message)
+            # A removed podcast is simply not loaded, so it won't be saved again.
+            if no_match_found_user_response != remove_keyword:
+                raise DatabaseLoadingError("Failed to load %s." % (record.name))
+        return loaded
 
-    def update_podcasts(self, allow_prompt: bool = True) -> None:
+    def save(
+        self,
+        path: pathlib.Path,
+        file_format: database_format.Format = database_format.DEFAULT_FORMAT,
+    ) -> None:
+        """Write a full snapshot of the database, replacing any journal."""
+        records = [pod.to_record() for pod in sorted(self.podcast_shows)]
+        data = database_format.encode(records, file_format)
+        atomic_file.write_bytes(path, data)
+        # A crash before the journal is removed is fine, as the journal no
+        # longer matches the database's checksum.
+        database_journal.remove(database_journal.journal_path(path))
+
+        self._saved_state = _SavedState(
+            path,
+            database_journal.checksum(data),
+            0,
+            dict((x.name, _ShowState.from_record(x)) for x in records),
+        )
+
+    def save_to_sqlite(self, storage: sqlite_storage.SqliteStorage) -> None:
+        storage.save(
+            [pod.to_record() for pod in sorted(self.podcast_shows)],
+            dict((pod.podcast_name, pod.priority) for pod in self.podcast_shows),
+        )
+
+    def commit(
+        self,
+        path: pathlib.Path,
+        file_format: database_format.Format = database_format.DEFAULT_FORMAT,
+    ) -> None:
+        """Persist changes since the last load or save of |path|.
+
+        The changed episodes are appended to the database's journal, unless
+        the set of shows changed or the journal has grown long enough that
+        the database should be compacted into a new full snapshot.
+        """
+        saved_state = self._saved_state
+        shows = dict(
+            (x.podcast_name, _ShowState.from_record(x.to_record()))
+            for x in self.podcast_shows
+        )
+        if (
+            saved_state is None
+            or saved_state.path != path
+            or saved_state.shows.keys() != shows.keys()
+        ):
+            self.save(path, file_format)
+            return
+
+        events = []
+        for name, show in shows.items():
+            events.extend(show.events_since(name, saved_state.shows[name]))
+        if not events:
+            return
+
+        journal_records = saved_state.journal_records + len(events)
+        if journal_records >= MAX_JOURNAL_RECORDS:
+            self.save(path, file_format)
+            return
+
+        journal_path = database_journal.journal_path(path)
+        if saved_state.journal_records == 0:
+            database_journal.start(journal_path, saved_state.checksum, events)
+        else:
+            database_journal.append(journal_path, events)
+        self._saved_state = saved_state._replace(
+            journal_records=journal_records, shows=shows
+        )
+
+    def update_podcasts(
+        self,
+        allow_prompt: bool = True,
+        cache: typing.Optional[duration_cache.DurationCache] = None,
+        max_workers: typing.Optional[int] = None,
+    ) -> None:
         # Drop all missing podcast shows.
         self.podcast_shows = [
             podcast_show
@@ -107,11 +310,49 @@ class PodcastDatabase(object):
             if podcast_show.podcast_folder.is_dir()
         ]
 
+        podcast_shows_to_scan = []
         for pod in self.podcast_shows:
             if pod.priority == podcast_show.PRIORITY_SKIP:
                 print("Skipping %s" % (pod))
                 continue
-            pod.scan_for_updates(allow_prompt=allow_prompt)
+            podcast_shows_to_scan.append(pod)
+
+        # Preprocessing can prompt the user, so it runs one show at a time.
+        for pod in podcast_shows_to_scan:
+            pod.run_preprocess()
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+            new_files_per_show = list(
+                executor.map(lambda x: x.find_new_files(), podcast_shows_to_scan)
+            )
+            durations = {
+                x.path: executor.submit(
+                    podcast_episode.probe_duration, x.path, cache, x.file_stat
+                )
+                for new_files in new_files_per_show
+                for x in new_files
+            }
+
+            # Add the episodes one at a time in each show's modification time
+            # order, so indices match a sequential scan and prompts don't overlap.
+            for pod, new_files in zip(podcast_shows_to_scan, new_files_per_show):
+                for x in new_files:
+                    duration = durations[x.path].result()
+                    if duration is None:
+                        # The headers couldn't be probed, so decode the file
+                        # here, as pyglet can't be used from several threads.
+                        duration = podcast_episode.get_duration(
+                            x.path,
+                            cache,
+                            podcast_episode.DurationBackend.PYGLET,
+                            x.file_stat,
+                        )
+                    pod.add_episode(
+                        x.path,
+                        allow_prompt=allow_prompt,
+                        duration=duration,
+                        file_stat=x.file_stat,
+                    )
 
     def _get_all_podcast_shows_sorted_by_priority(
         self,
@@ -134,16 +375,18 @@ class PodcastDatabase(object):
     ) -> None:
         date = datetime.datetime.now() if date is None else date
         podcast_shows = self._get_all_podcast_shows_sorted_by_priority()
-        num_remaining_episodes = sum(len(x.remaining_episodes()) for x in podcast_shows)
-        remaining_duration = sum(x.remaining_time() for x in podcast_shows)
+        num_remaining_episodes = sum(x.episode_count for x in podcast_shows)
+        remaining_listening_time = sum(
+            x.remaining_listening_time() for x in podcast_shows
+        )
 
         with open(path, "a", encoding="utf-8") as f:
             f.write(
-                "As of %s, the podcast episode backlog is %d episodes with total duration %s\n"
+                "As of %s, the podcast episode backlog is %d episodes with total listening time %s\n"
                 % (
                     date.strftime("%Y-%m-%d %H:%M:%S"),
                     num_remaining_episodes,
-                    time_helper.seconds_to_string(remaining_duration),
+                    time_helper.seconds_to_string(remaining_listening_time),
                 )
             )
 
@@ -155,116 +398,164 @@ class PodcastDatabase(object):
 
         with open(path, "w", encoding="utf-8") as f:
             for x in podcast_shows:
-                remaining_episodes = x.remaining_episodes()
-                if not remaining_episodes:
+                if not x.episode_count:
                     continue
-                total_duration = x.remaining_time()
-                average_duration = total_duration / len(remaining_episodes)
+                total_listening_time = x.remaining_listening_time()
+                average_listening_time = total_listening_time / x.episode_count
                 f.write(
-                    "%s: total duration of %s, %d episodes, %s long on average\n"
+                    "%s: total listening time of %s, %d episodes, %s long on average\n"
                     % (
                         x.podcast_folder.name,
-                        time_helper.seconds_to_string(total_duration),
-                        len(remaining_episodes),
-                        time_helper.seconds_to_string(average_duration),
+                        time_helper.seconds_to_string(total_listening_time),
+                        x.episode_count,
+                        time_helper.seconds_to_string(average_listening_time),
                     )
                 )
 
-    def _get_first_episode_for_each_podcast(
-        self,
-        files_to_ignore: typing.Optional[typing.List[pathlib.Path]] = None,
-    ) -> typing.List[full_podcast_episode.FullPodcastEpisode]:
-        first_episodes = [x.first_episode(files_to_ignore) for x in self.podcast_shows]
-        return [x for x in first_episodes if x]
-
-    # TODO: Can I merge this with above by defaulting to all priorities or something like that?
-    def _get_first_episode_for_each_podcast_of_priority(
-        self,
-        priority: int,
-        files_to_ignore: typing.Optional[typing.List[pathlib.Path]] = None,
-    ) -> typing.List[full_podcast_episode.FullPodcastEpisode]:
-        first_episodes = [
-            x.first_episode(files_to_ignore)
-            for x in self.podcast_shows
-            if x.priority == priority
-        ]
-        return [x for x in first_episodes if x]
+    def _candidate_pool(
+        self, priority: int, files_to_ignore: typing.AbstractSet[pathlib.Path]
+    ) -> _CandidatePool:
+        return _CandidatePool(
+            [x for x in self.podcast_shows if x.priority == priority], files_to_ignore
+        )
 
     def get_podcast_episodes_by_priority(
         self,
         duration_limit: datetime.timedelta,
         user_prompt: user_input.PromptYesOrNo_Alias = user_input.prompt_yes_or_no,
         files_to_ignore: typing.Optional[typing.List[pathlib.Path]] = None,
+        session: typing.Optional[selection_session.SelectionSession] = None,
+        rng: typing.Optional[random.Random] = None,
     ) -> typing.List[full_podcast_episode.FullPodcastEpisode]:
-        random.seed(None)
+        """Pick episodes at random from the oldest episode of each show.
+
+        Episodes are picked until their listening time, which accounts for
+        each show's speed, reaches |duration_limit|. Shows of the current
+        priority are picked from until they run out, then the next priority is
+        used if |user_prompt| agrees. Passing a seeded |rng| makes the picks
+        reproducible.
+        """
+        rng = rng or random.Random()
         current_duration = datetime.timedelta()
         weekly_episodes: typing.List[full_podcast_episode.FullPodcastEpisode] = []
         current_priority = min(podcast_show.PRIORITY_RANGE)
-        files_to_ignore = files_to_ignore or []
+        session = selection_session.SelectionSession.resume(session, files_to_ignore)
+        # Only the picked show's candidate changes after each pick.
+        pool = self._candidate_pool(current_priority, session.chosen_paths)
 
         while current_duration < duration_limit:
-            next_podcasts = self._get_first_episode_for_each_podcast_of_priority(
-                current_priority,
-                files_to_ignore=[x.path for x in weekly_episodes] + files_to_ignore,
-            )
-            if next_podcasts:
-                picked_podcast = random.choice(next_podcasts)
+            if pool.candidates:
+                # Draws the same way random.choice(pool.candidates) would.
+                picked_podcast = pool.take(rng.randrange(len(pool.candidates)))
                 weekly_episodes.append(picked_podcast)
-                current_duration += picked_podcast.duration
+                session.add(picked_podcast)
+                current_duration += picked_podcast.listening_time
             else:
                 current_priority += 1
                 if current_priority not in podcast_show.PRIORITY_RANGE:
                     # No more priorities to examine, we are done.
                     break
-                else:
-                    # If there are no more podcasts for this priority, ask if we are done or should move to the next priority.
-                    result = user_prompt(
-                        "\nFinished adding podcasts with priority %d\nCurrently %d episodes with length %s\nContinue to priority %d?"
-                        % (
-                            current_priority - 1,
-                            len(weekly_episodes),
-                            current_duration,
-                            current_priority,
-                        )
-                    )
-                    if not result:
-                        break
+
+                # If there are no more podcasts for this priority, ask if we are done or should move to the next priority.
+                if not _continue_to_priority(
+                    user_prompt, current_priority, weekly_episodes, current_duration
+                ):
+                    break
+                pool = self._candidate_pool(current_priority, session.chosen_paths)
 
         return weekly_episodes
 
-    def get_oldest_files(
+    def fill_podcast_episodes_by_priority(
         self,
-        num_files_to_get: int,
+        duration_limit: datetime.timedelta,
+        user_prompt: user_input.PromptYesOrNo_Alias = user_input.prompt_yes_or_no,
         files_to_ignore: typing.Optional[typing.List[pathlib.Path]] = None,
+        session: typing.Optional[selection_session.SelectionSession] = None,
+        time_limit: float = batch_optimizer.DEFAULT_TIME_LIMIT_SECONDS,
     ) -> typing.List[full_podcast_episode.FullPodcastEpisode]:
-        oldest_episodes: typing.List[full_podcast_episode.FullPodcastEpisode] = []
-        files_to_ignore = [] if files_to_ignore is None else files_to_ignore
-        for _ in range(num_files_to_get):
-            oldest_episodes_left = self._get_first_episode_for_each_podcast(
-                files_to_ignore=files_to_ignore + [x.path for x in oldest_episodes]
-            )
-            if not oldest_episodes_left:
-                print(
-                    "Only found %d old episodes, when %d were requested."
-                    % (len(oldest_episodes), num_files_to_get)
+        """Pick episodes whose listening time fills |duration_limit| tightly.
+
+        Like get_podcast_episodes_by_priority, every episode of a priority is
+        used up before moving on to the next, and each show's episodes are
+        picked oldest first. The priority that doesn't fit entirely is filled
+        by batch_optimizer instead of at random, so the batch doesn't overshoot.
+        """
+        session = selection_session.SelectionSession.resume(session, files_to_ignore)
+        remaining = duration_limit
+        picked: typing.List[full_podcast_episode.FullPodcastEpisode] = []
+        for priority in podcast_show.PRIORITY_RANGE:
+            if remaining <= datetime.timedelta():
+                break
+            if priority != min(podcast_show.PRIORITY_RANGE) and not (
+                _continue_to_priority(
+                    user_prompt,
+                    priority,
+                    picked,
+                    sum((x.listening_time for x in picked), datetime.timedelta()),
                 )
+            ):
                 break
 
-            current_oldest = oldest_episodes_left[0]
-            for episode in oldest_episodes_left[1:]:
-                if current_oldest.modification_time > episode.modification_time:
-                    current_oldest = episode
+            shows = [
+                list(x.oldest_episodes(session.chosen_paths))
+                for x in self.podcast_shows
+                if x.priority == priority
+            ]
+            episodes = [x for show in shows for x in show]
+            listening_time = sum(
+                (x.listening_time for x in episodes), datetime.timedelta()
+            )
+            if listening_time > remaining:
+                episodes = batch_optimizer.fill_duration(shows, remaining, time_limit)
+                remaining = datetime.timedelta()
+            else:
+                episodes.sort(key=lambda x: x.modification_time)
+                remaining -= listening_time
+
+            for episode in episodes:
+                picked.append(episode)
+                session.add(episode)
 
-            oldest_episodes.append(current_oldest)
+        return picked
+
+    def get_oldest_files(
+        self,
+        num_files_to_get: int,
+        files_to_ignore: typing.Optional[typing.List[pathlib.Path]] = None,
+        session: typing.Optional[selection_session.SelectionSession] = None,
+    ) -> typing.List[full_podcast_episode.FullPodcastEpisode]:
+        session = selection_session.SelectionSession.resume(session, files_to_ignore)
+        # Each show's episodes come out oldest first, so merging them gives the
+        # oldest episodes overall. Ties go to the earlier show, like before.
+        oldest_episodes = list(
+            itertools.islice(
+                heapq.merge(
+                    *[
+                        x.oldest_episodes(session.chosen_paths)
+                        for x in self.podcast_shows
+                    ],
+                    key=lambda x: x.modification_time,
+                ),
+                num_files_to_get,
+            )
+        )
+        if len(oldest_episodes) < num_files_to_get:
+            print(
+                "Only found %d old episodes, when %d were requested."
+                % (len(oldest_episodes), num_files_to_get)
+            )
 
+        for episode in oldest_episodes:
+            session.add(episode)
         return oldest_episodes
 
     def get_specified_files(
         self,
         specified_files: typing.Dict[pathlib.Path, typing.List[pathlib.Path]],
         files_to_ignore: typing.Optional[typing.List[pathlib.Path]] = None,
+        session: typing.Optional[selection_session.SelectionSession] = None,
     ) -> typing.List[full_podcast_episode.FullPodcastEpisode]:
-        files_to_ignore = [] if files_to_ignore is None else files_to_ignore
+        session = selection_session.SelectionSession.resume(session, files_to_ignore)
 
         files_to_get: typing.List[full_podcast_episode.FullPodcastEpisode] = []
 
@@ -286,7 +577,8 @@ class PodcastDatabase(object):
                         % (episode_path, show_name.name)
                     )
 
-                if matching_episode.path not in files_to_ignore:
+                if matching_episode.path not in session:
                     files_to_get.append(matching_episode)
+                    session.add(matching_episode)
 
         return files_to_get
@@ -1,17 +1,30 @@
 import datetime
 import os
 import pathlib
+import random
 import shutil
 import tempfile
+import threading
 import typing
 import unittest
+from unittest import mock
 
+import database_format
+import database_journal
+import duration_cache
 import full_podcast_episode
 import podcast_database
 import podcast_episode
 import podcast_show
+import selection_session
+import sqlite_storage
 import test_utils
 
+# How long the test file takes to listen to at the default speed.
+TEST_FILE_LISTENING_SECONDS = round(
+    test_utils.TEST_FILE_LENGTH_IN_SECONDS / podcast_show.DEFAULT_SPEED
+)
+
 
 def file_contents(file: pathlib.Path) -> str:
     with open(file, "r", encoding="utf-8") as f:
@@ -55,7 +68,7 @@ class TestPodcastDatabase(unittest.TestCase):
 
         database_folder = tempfile.mkdtemp()
         database_file = pathlib.Path(database_folder, "database.txt")
-        database.save(database_file)
+        database.save(database_file, database_format.Format.TEXT)
         self.assertEqual("0\n", file_contents(database_file))
 
         database.load(database_file)
@@ -77,7 +90,7 @@ class TestPodcastDatabase(unittest.TestCase):
 
         database_folder = tempfile.mkdtemp()
         database_file = pathlib.Path(database_folder, "database.txt")
-        database.save(database_file)
+        database.save(database_file, database_format.Format.TEXT)
 
         self.assertEqual(
             "1\nknown_folder\nknown_folder\n1\n0\n", file_contents(database_file)
@@ -100,7 +113,7 @@ class TestPodcastDatabase(unittest.TestCase):
         database = podcast_database.PodcastDatabase(podcast_shows, False)
         database.update_podcasts()
 
-        database.save(database_file)
+        database.save(database_file, database_format.Format.TEXT)
         contents = file_contents(database_file)
         want = "1\nknown_folder\nknown_folder\n4\n3\n"
         for index, episode in enumerate(episodes):
@@ -119,7 +132,7 @@ class TestPodcastDatabase(unittest.TestCase):
         shutil.rmtree(known_folder)
         database.update_podcasts()
 
-        database.save(database_file)
+        database.save(database_file, database_format.Format.TEXT)
         self.assertEqual("0\n", file_contents(database_file))
 
     def test_save_and_load_podcast_removed(self) -> None:
@@ -139,7 +152,7 @@ class TestPodcastDatabase(unittest.TestCase):
 
         database_folder = tempfile.mkdtemp()
         database_file = pathlib.Path(database_folder, "database.txt")
-        database.save(database_file)
+        database.save(database_file, database_format.Format.TEXT)
 
         self.assertEqual(
             "1\nknown_folder\nknown_folder\n1\n0\n", file_contents(database_file)
@@ -157,9 +170,296 @@ class TestPodcastDatabase(unittest.TestCase):
         self.assertEqual(0, podcasts_loaded)
 
         # Ensure we now save an empty database.
-        database.save(database_file)
+        database.save(database_file, database_format.Format.TEXT)
         self.assertEqual("0\n", file_contents(database_file))
 
+    def test_save_and_load_binary(self) -> None:
+        podcast_shows = [
+            self._create_podcast_show(
+                pathlib.Path(self.root, "show_%d" % (x)),
+                podcast_show.P1,
+                ["podcast_1.mp3", "podcast_élè.mp3"],
+                666,
+            )
+            for x in range(2)
+        ]
+        database = podcast_database.PodcastDatabase(podcast_shows, False)
+        database.update_podcasts(allow_prompt=False)
+
+        database_file = pathlib.Path(self.root, "database.db")
+        database.save(database_file)
+        with open(database_file, "rb") as f:
+            self.assertTrue(f.read().startswith(database_format.MAGIC))
+
+        text_file = pathlib.Path(self.root, "database.txt")
+        database.save(text_file, database_format.Format.TEXT)
+
+        for path in [database_file, text_file]:
+            shows = [
+                podcast_show.PodcastShow(x.podcast_folder, podcast_show.P1)
+                for x in podcast_shows
+            ]
+            self.assertEqual(
+                2, podcast_database.PodcastDatabase(shows, False).load(path)
+            )
+            for loaded, original in zip(shows, podcast_shows):
+                self.assertEqual(original.next_index, loaded.next_index)
+                self.assertEqual(
+                    [
+                        (x.path, x.index, x.duration, x.modification_time)
+                        for x in original.episodes
+                    ],
+                    [
+                        (x.path, x.index, x.duration, x.modification_time)
+                        for x in loaded.episodes
+                    ],
+                )
+
+    def test_commit_appends_to_journal(self) -> None:
+        podcast_shows = [
+            self._create_podcast_show(
+                pathlib.Path(self.root, "show_%d" % (x)),
+                podcast_show.P1,
+                ["podcast_1.mp3"],
+                666,
+            )
+            for x in range(2)
+        ]
+        database = podcast_database.PodcastDatabase(podcast_shows, False)
+        database.update_podcasts(allow_prompt=False)
+
+        database_file = pathlib.Path(self.root, "database.db")
+        journal_file = database_journal.journal_path(database_file)
+        database.commit(database_file)
+        with open(database_file, "rb") as f:
+            snapshot = f.read()
+        self.assertFalse(journal_file.exists())
+
+        # Adding and removing episodes only appends to the journal.
+        new_episode = pathlib.Path(podcast_shows[0].podcast_folder, "podcast_2.mp3")
+        shutil.copyfile(
+            pathlib.Path(test_utils.TEST_DATA_DIR, test_utils.MP3_TEST_FILE),
+            new_episode,
+        )
+        os.remove(pathlib.Path(podcast_shows[1].podcast_folder, "podcast_1.mp3"))
+        database.update_podcasts(allow_prompt=False)
+        database.commit(database_file)
+
+        with open(database_file, "rb") as f:
+            self.assertEqual(snapshot, f.read())
+        self.assertTrue(journal_file.exists())
+
+        def load() -> typing.List[podcast_show.PodcastShow]:
+            shows = [
+                podcast_show.PodcastShow(x.podcast_folder, podcast_show.P1)
+                for x in podcast_shows
+            ]
+            database = podcast_database.PodcastDatabase(shows, False)
+            self.assertEqual(2, database.load(database_file))
+            return shows
+
+        shows = load()
+        self.assertEqual(
+            [
+                pathlib.Path(podcast_shows[0].podcast_folder, "podcast_1.mp3"),
+                new_episode,
+            ],
+            [x.path for x in shows[0].episodes],
+        )
+        self.assertEqual(3, shows[0].next_index)
+        self.assertEqual([], shows[1].episodes)
+
+        # Removing a show rewrites the database and drops the journal.
+        database = podcast_database.PodcastDatabase(shows[:1], False)
+        database.load(database_file, lambda x: "REMOVE")
+        database.commit(database_file)
+        self.assertFalse(journal_file.exists())
+        self.assertEqual(1, len(database_format.read(database_file)))
+
+    def test_save_and_load_sqlite(self) -> None:
+        podcast_shows = [
+            self._create_podcast_show(
+                pathlib.Path(self.root, "show_%d" % (x)),
+                podcast_show.P1,
+                ["podcast_1.mp3", "podcast_2.mp3"],
+                666,
+            )
+            for x in range(2)
+        ]
+        database = podcast_database.PodcastDatabase(podcast_shows, False)
+        database.update_podcasts(allow_prompt=False)
+
+        storage = sqlite_storage.SqliteStorage(pathlib.Path(self.root, "db.sqlite"))
+        try:
+            database.save_to_sqlite(storage)
+
+            shows = [
+                podcast_show.PodcastShow(x.podcast_folder, podcast_show.P1)
+                for x in podcast_shows
+            ]
+            database = podcast_database.PodcastDatabase(shows[:1], False)
+            self.assertEqual(1, database.load_from_sqlite(storage, lambda x: "REMOVE"))
+            self.assertEqual(3, shows[0].next_index)
+            self.assertEqual(
+                [x.path for x in podcast_shows[0].episodes],
+                [x.path for x in shows[0].episodes],
+            )
+
+            # The removed show is deleted on the next save.
+            database.save_to_sqlite(storage)
+            self.assertEqual(["show_0"], [x.name for x in storage.load()])
+        finally:
+            storage.engine.dispose()
+
+    def test_load_from_sqlite_imports_database_file(self) -> None:
+        podcast_shows = [
+            self._create_podcast_show(
+                pathlib.Path(self.root, "show_%d" % (x)),
+                podcast_show.P1,
+                ["podcast_1.mp3", "podcast_2.mp3"],
+                666,
+            )
+            for x in range(2)
+        ]
+        database = podcast_database.PodcastDatabase(podcast_shows, False)
+        database.update_podcasts(allow_prompt=False)
+        database_file = pathlib.Path(self.root, "database.db")
+        database.save(database_file)
+
+        def new_shows() -> typing.List[podcast_show.PodcastShow]:
+            return [
+                podcast_show.PodcastShow(x.podcast_folder, podcast_show.P1)
+                for x in podcast_shows
+            ]
+
+        def assert_loaded(shows: typing.List[podcast_show.PodcastShow]) -> None:
+            for show, want in zip(shows, podcast_shows):
+                self.assertEqual(3, show.next_index)
+                self.assertEqual(
+                    [(x.path, x.index, x.duration) for x in want.episodes],
+                    [(x.path, x.index, x.duration) for x in show.episodes],
+                )
+
+        storage = sqlite_storage.SqliteStorage(pathlib.Path(self.root, "db.sqlite"))
+        try:
+            shows = new_shows()
+            database = podcast_database.PodcastDatabase(shows, False)
+            self.assertEqual(
+                2, database.load_from_sqlite(storage, import_path=database_file)
+            )
+            assert_loaded(shows)
+
+            # The episodes are known, so nothing needs probing again.
+            with mock.patch(
+                "podcast_episode.probe_duration",
+                side_effect=AssertionError("Shouldn't probe known episodes"),
+            ):
+                database.update_podcasts(allow_prompt=False)
+            database.save_to_sqlite(storage)
+
+            # Once the imported shows are saved, they're loaded from SQLite.
+            os.remove(database_file)
+            shows = new_shows()
+            database = podcast_database.PodcastDatabase(shows, False)
+            self.assertEqual(
+                2, database.load_from_sqlite(storage, import_path=database_file)
+            )
+            assert_loaded(shows)
+        finally:
+            storage.engine.dispose()
+
+    def test_save_leaves_no_temporary_files(self) -> None:
+        database = podcast_database.PodcastDatabase([], False)
+        database_file = pathlib.Path(self.root, "database.db")
+        database.save(database_file)
+        database.save(database_file)
+
+        self.assertEqual([database_file], list(self.root.iterdir()))
+
+    def test_update_podcasts_indices_follow_modification_time(self) -> None:
+        # Episode names are in the opposite order of their modification times.
+        episodes = ["podcast_%d.mp3" % (x) for x in range(8, 0, -1)]
+        podcast_shows = [
+            self._create_podcast_show(
+                pathlib.Path(self.root, "show_%d" % (x)),
+                podcast_show.P1,
+                episodes,
+                666 + x,
+            )
+            for x in range(4)
+        ]
+
+        database = podcast_database.PodcastDatabase(podcast_shows, False)
+        database.update_podcasts(allow_prompt=False, max_workers=8)
+
+        for show in podcast_shows:
+            self.assertEqual(len(episodes) + 1, show.next_index)
+            indices = {x.path.name: x.index for x in show.episodes}
+            self.assertEqual(
+                dict((name, index + 1) for index, name in enumerate(episodes)),
+                indices,
+            )
+            self.assertTrue(
+                all(
+                    x.duration == test_utils.TEST_FILE_LENGTH_IN_SECONDS
+                    for x in show.episodes
+                )
+            )
+
+    def test_update_podcasts_fills_empty_duration_cache(self) -> None:
+        show = self._create_podcast_show(
+            pathlib.Path(self.root, "show"),
+            podcast_show.P1,
+            ["podcast_1.mp3", "podcast_2.mp3"],
+            666,
+        )
+        cache = duration_cache.DurationCache()
+
+        database = podcast_database.PodcastDatabase([show], False)
+        database.update_podcasts(allow_prompt=False, cache=cache)
+
+        # Both episodes have the same contents, but not the same modification time.
+        self.assertEqual(2, len(cache))
+        for episode in show.episodes:
+            self.assertEqual(
+                test_utils.TEST_FILE_LENGTH_IN_SECONDS, cache.get(episode.path)
+            )
+
+    @mock.patch("duration_probe.get_duration", return_value=None)
+    def test_update_podcasts_decodes_on_calling_thread(
+        self, mock_probe: mock.Mock
+    ) -> None:
+        podcast_shows = [
+            self._create_podcast_show(
+                pathlib.Path(self.root, "show_%d" % (x)),
+                podcast_show.P1,
+                ["podcast_1.mp3", "podcast_2.mp3"],
+                666 + x,
+            )
+            for x in range(2)
+        ]
+
+        decoding_threads = []
+
+        def load(path: str) -> typing.Any:
+            decoding_threads.append(threading.get_ident())
+            return mock.Mock(duration=test_utils.TEST_FILE_LENGTH_IN_SECONDS)
+
+        database = podcast_database.PodcastDatabase(podcast_shows, False)
+        with mock.patch("podcast_episode.pyglet") as mock_pyglet:
+            mock_pyglet.media.load.side_effect = load
+            database.update_podcasts(allow_prompt=False, max_workers=8)
+
+        self.assertEqual(4, mock_probe.call_count)
+        self.assertEqual([threading.get_ident()] * 4, decoding_threads)
+        self.assertTrue(
+            all(
+                x.duration == test_utils.TEST_FILE_LENGTH_IN_SECONDS
+                for show in podcast_shows
+                for x in show.episodes
+            )
+        )
+
     def test_get_podcast_episodes_by_priority(self) -> None:
         known_folder = pathlib.Path(self.root, "known_folder")
         known_folder.mkdir()
@@ -199,13 +499,13 @@ class TestPodcastDatabase(unittest.TestCase):
         database.update_podcasts(allow_prompt=False)
 
         results = database.get_podcast_episodes_by_priority(
-            datetime.timedelta(seconds=test_utils.TEST_FILE_LENGTH_IN_SECONDS - 1),
+            datetime.timedelta(seconds=TEST_FILE_LISTENING_SECONDS - 1),
             user_prompt=lambda x: True,
         )
         self.assertEqual(expected_selected_episodes[0:1], results)
 
         results = database.get_podcast_episodes_by_priority(
-            datetime.timedelta(seconds=test_utils.TEST_FILE_LENGTH_IN_SECONDS * 2 - 1),
+            datetime.timedelta(seconds=TEST_FILE_LISTENING_SECONDS * 2 - 1),
             user_prompt=lambda x: True,
         )
         self.assertEqual(
@@ -363,6 +663,183 @@ class TestPodcastDatabase(unittest.TestCase):
             for q in range(i):
                 self.assertEqual(expected_episodes_by_age[q], results[q].path)
 
+    def test_get_oldest_files_ties(self) -> None:
+        podcast_shows = []
+        for show_index, times in enumerate([[30, 10, 10], [10, 20, 5], [20, 10]]):
+            show = podcast_show.PodcastShow(
+                pathlib.Path(self.root, "show_%d" % (show_index)), podcast_show.P1
+            )
+            show.episodes = [
+                podcast_episode.PodcastEpisode(
+                    pathlib.Path(show.podcast_folder, "podcast_%d.mp3" % (i)),
+                    i + 1,
+                    60,
+                    time,
+                )
+                for i, time in enumerate(times)
+            ]
+            podcast_shows.append(show)
+        database = podcast_database.PodcastDatabase(podcast_shows, False)
+
+        # Equal times go to the earlier show, then the earlier added episode.
+        want = [
+            ("show_1", "podcast_2.mp3"),
+            ("show_0", "podcast_1.mp3"),
+            ("show_0", "podcast_2.mp3"),
+            ("show_1", "podcast_0.mp3"),
+            ("show_2", "podcast_1.mp3"),
+            ("show_1", "podcast_1.mp3"),
+            ("show_2", "podcast_0.mp3"),
+            ("show_0", "podcast_0.mp3"),
+        ]
+        self.assertEqual(
+            want,
+            [(x.podcast_show_name, x.path.name) for x in database.get_oldest_files(10)],
+        )
+
+        ignored = [pathlib.Path(self.root, "show_0", "podcast_1.mp3")]
+        self.assertEqual(
+            [x for x in want if x != ("show_0", "podcast_1.mp3")][:3],
+            [
+                (x.podcast_show_name, x.path.name)
+                for x in database.get_oldest_files(3, files_to_ignore=ignored)
+            ],
+        )
+
+    def test_get_podcast_episodes_by_priority_reproducible(self) -> None:
+        podcast_shows = []
+        for show_index, priority in enumerate(
+            [podcast_show.P0] * 3 + [podcast_show.P1]
+        ):
+            show = podcast_show.PodcastShow(
+                pathlib.Path(self.root, "show_%d" % (show_index)), priority
+            )
+            show.episodes = [
+                podcast_episode.PodcastEpisode(
+                    pathlib.Path(show.podcast_folder, "podcast_%d.mp3" % (i)),
+                    i + 1,
+                    60,
+                    10 * i + show_index,
+                )
+                for i in range(5 + show_index)
+            ]
+            podcast_shows.append(show)
+        database = podcast_database.PodcastDatabase(podcast_shows, False)
+
+        # Pick by recomputing every show's first episode before each pick.
+        want_rng = random.Random(1234)
+        want: typing.List[full_podcast_episode.FullPodcastEpisode] = []
+        for priority in [podcast_show.P0, podcast_show.P1]:
+            while True:
+                candidates = [
+                    x.first_episode([y.path for y in want])
+                    for x in podcast_shows
+                    if x.priority == priority
+                ]
+                candidates = [x for x in candidates if x]
+                if not candidates:
+                    break
+                want.append(want_rng.choice(candidates))  # type:ignore
+
+        for _ in range(2):
+            results = database.get_podcast_episodes_by_priority(
+                datetime.timedelta(hours=10),
+                user_prompt=lambda x: True,
+                rng=random.Random(1234),
+            )
+            self.assertEqual(want, results)
+
+    def test_fill_podcast_episodes_by_priority(self) -> None:
+        podcast_shows = []
+        for show_index, (priority, durations) in enumerate(
+            [
+                (podcast_show.P0, [600, 1200]),
+                (podcast_show.P1, [3000, 600]),
+                (podcast_show.P1, [2400]),
+            ]
+        ):
+            show = podcast_show.PodcastShow(
+                pathlib.Path(self.root, "show_%d" % (show_index)), priority, speed=1.0
+            )
+            show.episodes = [
+                podcast_episode.PodcastEpisode(
+                    pathlib.Path(show.podcast_folder, "podcast_%d.mp3" % (i)),
+                    i + 1,
+                    duration,
+                    100 * i + show_index,
+                )
+                for i, duration in enumerate(durations)
+            ]
+            podcast_shows.append(show)
+        database = podcast_database.PodcastDatabase(podcast_shows, False)
+
+        prompts = []
+
+        def user_prompt(prompt: str) -> bool:
+            prompts.append(prompt)
+            return True
+
+        # All of P0 fits, leaving 70 minutes to fill from P1 without going over.
+        results = database.fill_podcast_episodes_by_priority(
+            datetime.timedelta(minutes=100), user_prompt
+        )
+        self.assertEqual(
+            [
+                ("show_0", "podcast_0.mp3"),
+                ("show_0", "podcast_1.mp3"),
+                ("show_1", "podcast_0.mp3"),
+                ("show_1", "podcast_1.mp3"),
+            ],
+            [(x.podcast_show_name, x.path.name) for x in results],
+        )
+        self.assertEqual(1, len(prompts))
+
+        results = database.fill_podcast_episodes_by_priority(
+            datetime.timedelta(minutes=10), lambda _: False
+        )
+        self.assertEqual(
+            [("show_0", "podcast_0.mp3")],
+            [(x.podcast_show_name, x.path.name) for x in results],
+        )
+
+    def test_selection_session_shared_between_stages(self) -> None:
+        show = podcast_show.PodcastShow(
+            pathlib.Path(self.root, "show"), podcast_show.P0, speed=1.0
+        )
+        show.episodes = [
+            podcast_episode.PodcastEpisode(
+                pathlib.Path(show.podcast_folder, "podcast_%d.mp3" % (i)),
+                i + 1,
+                60,
+                i,
+            )
+            for i in range(4)
+        ]
+        database = podcast_database.PodcastDatabase([show], False)
+
+        session = selection_session.SelectionSession()
+        oldest = database.get_oldest_files(1, session=session)
+        specified = database.get_specified_files(
+            {
+                show.podcast_folder: [
+                    pathlib.Path("podcast_0.mp3"),
+                    pathlib.Path("podcast_2.mp3"),
+                ]
+            },
+            session=session,
+        )
+        by_priority = database.get_podcast_episodes_by_priority(
+            datetime.timedelta(hours=1), lambda _: False, session=session
+        )
+
+        self.assertEqual(["podcast_0.mp3"], [x.path.name for x in oldest])
+        self.assertEqual(["podcast_2.mp3"], [x.path.name for x in specified])
+        self.assertEqual(
+            ["podcast_1.mp3", "podcast_3.mp3"], [x.path.name for x in by_priority]
+        )
+        self.assertEqual(oldest + specified + by_priority, session.episodes)
+        self.assertEqual(datetime.timedelta(minutes=4), session.listening_time)
+
     def test_repeated_path(self) -> None:
         known_folder = pathlib.Path(self.root, "repeated_folder")
         podcast_shows = [
@@ -412,14 +889,18 @@ class TestPodcastDatabase(unittest.TestCase):
 
         history = pathlib.Path(self.root, "history")
         database.update_remaining_time(history, date=datetime.datetime(2020, 1, 1))
-        want = f"As of 2020-01-01 00:00:00, the podcast episode backlog is 6 episodes with total duration {test_utils.TEST_FILE_LENGTH_IN_SECONDS*6}s\n"
+        # Each show's listening time is worked out from its total duration.
+        show_listening_seconds = round(
+            test_utils.TEST_FILE_LENGTH_IN_SECONDS * 3 / podcast_show.DEFAULT_SPEED
+        )
+        want = f"As of 2020-01-01 00:00:00, the podcast episode backlog is 6 episodes with total listening time {show_listening_seconds*2}s\n"
         self.assertEqual(want, file_contents(history))
 
         stats = pathlib.Path(self.root, "stats")
         database.log_stats(stats)
         want = (
-            f"known_folder: total duration of {test_utils.TEST_FILE_LENGTH_IN_SECONDS*3}s, 3 episodes, {test_utils.TEST_FILE_LENGTH_IN_SECONDS}s long on average\n"
-            f"known_folder_2: total duration of {test_utils.TEST_FILE_LENGTH_IN_SECONDS*3}s, 3 episodes, {test_utils.TEST_FILE_LENGTH_IN_SECONDS}s long on average\n"
+            f"known_folder: total listening time of {show_listening_seconds}s, 3 episodes, {show_listening_seconds // 3}s long on average\n"
+            f"known_folder_2: total listening time of {show_listening_seconds}s, 3 episodes, {show_listening_seconds // 3}s long on average\n"
         )
         self.assertEqual(want, file_contents(stats))
 
@@ -1,9 +1,13 @@
+import enum
+import os
 import pathlib
 import stat
 import typing
 
 import pyglet
 
+import duration_cache
+import duration_probe
 import models
 import time_helper
 
@@ -14,6 +18,11 @@ class PodcastEpisodeLoadingError(Exception):
 
 # TODO: This is only called in PodcastShow, so maybe it should live there. It doesn't seem to really be episode specific.
 def is_podcast_file(file: pathlib.Path) -> bool:
+    return is_podcast_file_type(file) and file.is_file()
+
+
+def is_podcast_file_type(file: pathlib.Path) -> bool:
+    """Whether |file|'s extension is a podcast's, without touching the disk."""
     ext = file.suffix.lower()
     # Ignore file with extensions we don't care about.
     if ext in (".db", ".jpg", ".jpeg", ".partial", ".png"):
@@ -26,14 +35,87 @@ def is_podcast_file(file: pathlib.Path) -> bool:
             % (ext, file)
         )
 
-    return file.is_file()
+    return True
 
 
 def modified_time(file: pathlib.Path) -> int:
     return int(file.stat()[stat.ST_MTIME])
 
 
+class DurationBackend(enum.Enum):
+    # Decode the file with pyglet to find its duration.
+    PYGLET = 1
+    # Read the duration from the file headers, falling back to pyglet for files
+    # the headers can't be understood for.
+    HEADER_PROBE = 2
+
+
+DEFAULT_DURATION_BACKEND = DurationBackend.HEADER_PROBE
+
+
+def _load_duration(path: pathlib.Path, backend: DurationBackend) -> int:
+    if backend == DurationBackend.HEADER_PROBE:
+        probed_duration = duration_probe.get_duration(path)
+        if probed_duration is not None:
+            return int(probed_duration)
+
+    try:
+        source = pyglet.media.load(str(path))
+    except EOFError as e:
+        print("Encountered an EOFError trying to load %s" % (path))
+        raise e
+    if source.duration is None:
+        raise Exception("File with unknown duration, %s", path)
+    return int(source.duration)
+
+
+def probe_duration(
+    path: pathlib.Path,
+    cache: typing.Optional[duration_cache.DurationCache] = None,
+    file_stat: typing.Optional[os.stat_result] = None,
+) -> typing.Optional[int]:
+    """Find |path|'s duration from the cache or the file headers.
+
+    Unlike get_duration, this never decodes the file with pyglet, which isn't
+    thread safe, so it can be called from any thread. Returns None if the
+    file has to be decoded to find its duration.
+    """
+    if cache is None:
+        probed_duration = duration_probe.get_duration(path)
+        return None if probed_duration is None else int(probed_duration)
+
+    key = duration_cache.file_key(path, file_stat)
+    duration = cache.get_key(key)
+    if duration is None:
+        probed_duration = duration_probe.get_duration(path)
+        if probed_duration is None:
+            return None
+        duration = int(probed_duration)
+        cache.add_key(key, duration)
+    return duration
+
+
+def get_duration(
+    path: pathlib.Path,
+    cache: typing.Optional[duration_cache.DurationCache] = None,
+    backend: DurationBackend = DEFAULT_DURATION_BACKEND,
+    file_stat: typing.Optional[os.stat_result] = None,
+) -> int:
+    if cache is None:
+        return _load_duration(path, backend)
+
+    key = duration_cache.file_key(path, file_stat)
+    duration = cache.get_key(key)
+    if duration is None:
+        duration = _load_duration(path, backend)
+        cache.add_key(key, duration)
+    return duration
+
+
 class PodcastEpisode(object):
+    # There's one of these per episode in the library, so skip the __dict__.
+    __slots__ = ("path", "index", "duration", "modification_time")
+
     def __init__(
         self, path: pathlib.Path, index: int, duration: int, modification_time: int
     ) -> None:
@@ -46,16 +128,17 @@ class PodcastEpisode(object):
         return "%s:(%s)" % (self.path, time_helper.seconds_to_string(self.duration))
 
     @classmethod
-    def new(cls, path: pathlib.Path, index: int) -> "PodcastEpisode":
-        try:
-            source = pyglet.media.load(str(path))
-        except EOFError as e:
-            print("Encountered an EOFError trying to load %s" % (path))
-            raise e
-        if source.duration is None:
-            raise Exception("File with unknown duration, %s", path)
-        duration = int(source.duration)
-        modification_time = modified_time(path)
+    def new(
+        cls,
+        path: pathlib.Path,
+        index: int,
+        cache: typing.Optional[duration_cache.DurationCache] = None,
+        backend: DurationBackend = DEFAULT_DURATION_BACKEND,
+        file_stat: typing.Optional[os.stat_result] = None,
+    ) -> "PodcastEpisode":
+        file_stat = path.stat() if file_stat is None else file_stat
+        duration = get_duration(path, cache, backend, file_stat)
+        modification_time = int(file_stat[stat.ST_MTIME])
 
         return PodcastEpisode(path, index, duration, modification_time)
 
@@ -5,6 +5,7 @@ import shutil
 import tempfile
 import unittest
 
+import duration_cache
 import models
 import podcast_episode
 import test_utils
@@ -43,6 +44,41 @@ class TestPodcastEpisode(unittest.TestCase):
         )
         self.assertEqual(want, saved_data.getvalue())
 
+    def test_podcast_episode_new_uses_duration_cache(self) -> None:
+        podcast_folder = tempfile.mkdtemp()
+        podcast_file = pathlib.Path(podcast_folder, "file.mp3")
+        # The file isn't real audio, so this only works if the duration is
+        # taken from the cache instead of decoding the file.
+        touch(podcast_file)
+
+        cache = duration_cache.DurationCache()
+        cache.add(podcast_file, 1234)
+
+        episode = podcast_episode.PodcastEpisode.new(podcast_file, 3, cache=cache)
+
+        self.assertEqual(podcast_file, episode.path)
+        self.assertEqual(3, episode.index)
+        self.assertEqual(1234, episode.duration)
+        self.assertEqual(
+            podcast_episode.modified_time(podcast_file), episode.modification_time
+        )
+
+    def test_podcast_episode_new_fills_empty_duration_cache(self) -> None:
+        podcast_folder = tempfile.mkdtemp()
+        podcast_file = pathlib.Path(podcast_folder, "file.mp3")
+        shutil.copyfile(
+            os.path.join(test_utils.TEST_DATA_DIR, test_utils.MP3_TEST_FILE),
+            podcast_file,
+        )
+
+        cache = duration_cache.DurationCache()
+        podcast_episode.PodcastEpisode.new(podcast_file, 3, cache=cache)
+
+        self.assertEqual(1, len(cache))
+        self.assertEqual(
+            test_utils.TEST_FILE_LENGTH_IN_SECONDS, cache.get(podcast_file)
+        )
+
     def test_podcast_episode_load_and_save(self) -> None:
         data = io.StringIO("c:\\podcast\\podcast.mp3\n66\n15\n100\n")
         episode = podcast_episode.PodcastEpisode.load(data)
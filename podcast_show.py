@@ -1,14 +1,20 @@
-import datetime
+import bisect
+import os
 import pathlib
+import stat
 import typing
 
 from sqlalchemy.orm import Session
 
 import archive
+import database_format
+import duration_cache
 import full_podcast_episode
 import models
 import podcast_episode
 import podcast_preprocessing_base
+import scan_snapshot
+import selection_session
 import user_input
 
 PRIORITY_RANGE = range(3)
@@ -18,6 +24,22 @@ PRIORITY_SKIP = -1
 DEFAULT_SPEED = 1.55
 
 
+def _modification_time(episode: podcast_episode.PodcastEpisode) -> int:
+    return episode.modification_time
+
+
+class _CachedFullEpisode(typing.NamedTuple):
+    episode: podcast_episode.PodcastEpisode
+    speed: float
+    archive: archive.Archive
+    full_episode: full_podcast_episode.FullPodcastEpisode
+
+
+class NewFile(typing.NamedTuple):
+    path: pathlib.Path
+    file_stat: os.stat_result
+
+
 class PodcastShow(object):
     def __init__(
         self,
@@ -35,9 +57,37 @@ class PodcastShow(object):
         self.priority = priority
         self.archive = archive
         self.speed = speed
+        # Each episode's FullPodcastEpisode by path, made on first use.
+        self._full_episodes: typing.Dict[pathlib.Path, _CachedFullEpisode] = {}
         self.preprocess = preprocess
-        self.episodes: typing.List[podcast_episode.PodcastEpisode] = []
+        # Kept sorted by modification time, with ties in the order added.
+        self._episodes: typing.List[podcast_episode.PodcastEpisode] = []
+        # The episodes by file name, and the sum of their durations, kept up to
+        # date as they change.
+        self._episodes_by_name: typing.Dict[str, podcast_episode.PodcastEpisode] = {}
+        self._total_duration = 0
         self.next_index: typing.Optional[int] = None
+        self.scan_snapshot: typing.Optional[scan_snapshot.ShowSnapshot] = None
+
+    @property
+    def episodes(self) -> typing.List[podcast_episode.PodcastEpisode]:
+        """The episodes, oldest first. Don't modify this list directly."""
+        return self._episodes
+
+    @episodes.setter
+    def episodes(self, episodes: typing.List[podcast_episode.PodcastEpisode]) -> None:
+        self._episodes = sorted(episodes, key=_modification_time)
+        self._episodes_by_name = dict((x.path.name, x) for x in self._episodes)
+        self._total_duration = sum(x.duration for x in self._episodes)
+        self._full_episodes = {}
+
+    @property
+    def episode_count(self) -> int:
+        return len(self._episodes)
+
+    @property
+    def oldest_modification_time(self) -> typing.Optional[int]:
+        return self._episodes[0].modification_time if self._episodes else None
 
     def __str__(self) -> str:
         return str(self.podcast_folder)
@@ -90,6 +140,7 @@ class PodcastShow(object):
         self.episodes = [
             podcast_episode.PodcastEpisode.load(f) for x in range(num_episodes)
         ]
+        self.scan_snapshot = None
 
         return self
 
@@ -100,6 +151,16 @@ class PodcastShow(object):
         for episode in self.episodes:
             episode.save(f)
 
+    def load_record(self, record: database_format.ShowRecord) -> None:
+        self.next_index = record.next_index
+        self.episodes = record.episodes
+        self.scan_snapshot = None
+
+    def to_record(self) -> database_format.ShowRecord:
+        return database_format.ShowRecord(
+            self.podcast_folder.name, self.next_index, self.episodes
+        )
+
     def save_to_db(self, session: Session) -> None:
         """Save this show and all its episodes to the database.
 
@@ -123,7 +184,11 @@ class PodcastShow(object):
                 f"Show '{self.podcast_folder.name}' already exists in database"
             )
 
-        show_model = models.ShowModel(folder_name=self.podcast_folder.name)
+        show_model = models.ShowModel(
+            folder_name=self.podcast_folder.name,
+            next_index=self.next_index,
+            priority=self.priority,
+        )
         session.add(show_model)
         session.flush()  # Get the ID assigned
 
@@ -152,15 +217,36 @@ class PodcastShow(object):
             podcast_episode.PodcastEpisode.from_model(ep) for ep in show_model.episodes
         ]
 
-        # Compute next_index from loaded episodes
-        if self.episodes:
+        # Compute next_index from loaded episodes if it wasn't saved.
+        if show_model.next_index is not None:
+            self.next_index = show_model.next_index
+        elif self.episodes:
             self.next_index = max(ep.index for ep in self.episodes) + 1
         else:
             self.next_index = None
+        self.scan_snapshot = None
 
         return True
 
-    def scan_for_updates(self, allow_prompt: bool = True) -> typing.List[pathlib.Path]:
+    def scan_for_updates(
+        self,
+        allow_prompt: bool = True,
+        cache: typing.Optional[duration_cache.DurationCache] = None,
+    ) -> typing.List[pathlib.Path]:
+        self.run_preprocess()
+
+        new_files = self.find_new_files()
+        for new_file in new_files:
+            self.add_episode(
+                new_file.path,
+                allow_prompt=allow_prompt,
+                cache=cache,
+                file_stat=new_file.file_stat,
+            )
+
+        return [x.path for x in new_files]
+
+    def run_preprocess(self) -> None:
         print("Scanning for Updates for %s" % (self.podcast_folder))
         if self.preprocess:
             print("Executing preprocess for %s" % (self.podcast_folder))
@@ -170,45 +256,86 @@ class PodcastShow(object):
                 podcast_preprocessing_base.prompt_for_delete,
             )
 
-        files_present = frozenset(f.absolute() for f in self.podcast_folder.iterdir())
-        # Remove the files that are no longer present.
-        self.episodes = [
-            episode for episode in self.episodes if episode.path in files_present
-        ]
-
-        known_files = frozenset(episode.path for episode in self.episodes)
-
-        new_episodes = []
-        for f in files_present.difference(known_files):
-            full_path = self.podcast_folder.joinpath(f).absolute()
-            if not podcast_episode.is_podcast_file(full_path):
-                continue
-
-            if "(2)" in str(f):
-                raise Exception("Doubled file? %s" % (full_path))
-            new_episodes.append(
-                (
-                    full_path,
-                    podcast_episode.modified_time(full_path),
-                )
-            )
+    def find_new_files(self) -> typing.List[NewFile]:
+        """Drop episodes that are no longer present and return the new files.
 
-        new_episodes.sort(key=lambda x: x[1])
+        The new files are sorted by modification time, which is the order
+        they should be added in to get their indices.
 
-        for path, _time in new_episodes:
-            self.add_episode(path, allow_prompt=allow_prompt)
+        If the show has a scan snapshot, a folder whose modification time
+        hasn't changed is skipped and only entries not in the snapshot are
+        looked at. Each entry that is looked at is stat'd once, and that stat
+        is handed on to create the episode.
+        """
+        directory_mtime_ns = self.podcast_folder.stat().st_mtime_ns
+        previous_entries: scan_snapshot.Entries_TypeAlias = {}
+        if self.scan_snapshot is not None:
+            # Adding or removing a file changes the folder's modification time,
+            # so an unchanged folder has nothing new to look at.
+            if self.scan_snapshot.is_current(directory_mtime_ns):
+                return []
+            previous_entries = self.scan_snapshot.entries
+
+        entries: scan_snapshot.Entries_TypeAlias = {}
+        new_files = []
+        with os.scandir(self.podcast_folder) as it:
+            for dir_entry in it:
+                entry = previous_entries.get(dir_entry.name)
+                if entry is not None:
+                    entries[dir_entry.name] = entry
+                    continue
+
+                file_stat = dir_entry.stat()
+                entries[dir_entry.name] = (file_stat.st_size, file_stat.st_mtime_ns)
+                if dir_entry.name in self._episodes_by_name:
+                    continue
+
+                full_path = self.podcast_folder / dir_entry.name
+                if not podcast_episode.is_podcast_file_type(full_path):
+                    continue
+                if not stat.S_ISREG(file_stat.st_mode):
+                    continue
+
+                if "(2)" in dir_entry.path:
+                    raise Exception("Doubled file? %s" % (full_path))
+                new_files.append(NewFile(full_path, file_stat))
+        self.scan_snapshot = scan_snapshot.ShowSnapshot.new(directory_mtime_ns, entries)
+
+        # Remove the files that are no longer present, which keeps the order.
+        remaining_episodes = []
+        for episode in self._episodes:
+            if episode.path.name in entries:
+                remaining_episodes.append(episode)
+            else:
+                self._total_duration -= episode.duration
+                self._episodes_by_name.pop(episode.path.name, None)
+                self._full_episodes.pop(episode.path, None)
+        self._episodes = remaining_episodes
+
+        # Break ties on the name so the order doesn't depend on listing order.
+        # All the files share a folder, so this orders them like their paths.
+        new_files.sort(
+            key=lambda x: (int(x.file_stat.st_mtime), os.path.normcase(x.path.name))
+        )
 
-        return [x[0] for x in new_episodes]
+        return new_files
 
     def get_episode(
         self, path: pathlib.Path
     ) -> typing.Optional[full_podcast_episode.FullPodcastEpisode]:
-        for episode in self.episodes:
-            if episode.path == path:
-                return self._episode_as_full_podcast_episode(episode)
-        return None
+        episode = self._episodes_by_name.get(path.name)
+        if episode is None or episode.path != path:
+            return None
+        return self._episode_as_full_podcast_episode(episode)
 
-    def add_episode(self, path: pathlib.Path, allow_prompt: bool = True) -> None:
+    def add_episode(
+        self,
+        path: pathlib.Path,
+        allow_prompt: bool = True,
+        cache: typing.Optional[duration_cache.DurationCache] = None,
+        duration: typing.Optional[int] = None,
+        file_stat: typing.Optional[os.stat_result] = None,
+    ) -> None:
         if self.next_index is None:
             if allow_prompt and not user_input.prompt_yes_or_no(
                 "Initialize next_index to 1 for %s" % (self.podcast_folder)
@@ -217,58 +344,94 @@ class PodcastShow(object):
             else:
                 self.next_index = 1
 
-        self.episodes.append(podcast_episode.PodcastEpisode.new(path, self.next_index))
+        if duration is None:
+            episode = podcast_episode.PodcastEpisode.new(
+                path, self.next_index, cache=cache, file_stat=file_stat
+            )
+        else:
+            if file_stat is None:
+                file_stat = path.stat()
+            episode = podcast_episode.PodcastEpisode(
+                path, self.next_index, duration, int(file_stat.st_mtime)
+            )
+        bisect.insort_right(self._episodes, episode, key=_modification_time)
+        self._episodes_by_name[path.name] = episode
+        self._total_duration += episode.duration
         self.next_index += 1
 
     def _episodes_without_ignores(
-        self, files_to_ignore: typing.Optional[typing.List[pathlib.Path]] = None
+        self, files_to_ignore: typing.Optional[typing.Iterable[pathlib.Path]] = None
     ) -> list[podcast_episode.PodcastEpisode]:
         if not files_to_ignore:
-            return self.episodes
-        return [x for x in self.episodes if x.path not in files_to_ignore]
+            return self._episodes
+        ignored = selection_session.as_path_set(files_to_ignore)
+        return [x for x in self._episodes if x.path not in ignored]
 
     def _episode_as_full_podcast_episode(
         self, episode: podcast_episode.PodcastEpisode
     ) -> full_podcast_episode.FullPodcastEpisode:
-        return full_podcast_episode.FullPodcastEpisode(
+        # A cached episode is only reused if it was made from this episode with
+        # the show's current settings.
+        cached = self._full_episodes.get(episode.path)
+        if (
+            cached is not None
+            and cached.episode is episode
+            and cached.speed == self.speed
+            and cached.archive == self.archive
+        ):
+            return cached.full_episode
+
+        full_episode = full_podcast_episode.FullPodcastEpisode.from_seconds(
             episode.index,
             episode.path,
             self.podcast_name,
             speed=self.speed,
             archive=self.archive,
-            modification_time=datetime.datetime.fromtimestamp(
-                episode.modification_time
-            ),
-            duration=datetime.timedelta(seconds=episode.duration),
+            modification_timestamp=episode.modification_time,
+            duration_seconds=episode.duration,
+        )
+        self._full_episodes[episode.path] = _CachedFullEpisode(
+            episode, self.speed, self.archive, full_episode
         )
+        return full_episode
 
     def first_episode(
         self,
-        files_to_ignore: typing.Optional[typing.List[pathlib.Path]] = None,
+        files_to_ignore: typing.Optional[typing.Iterable[pathlib.Path]] = None,
     ) -> typing.Optional[full_podcast_episode.FullPodcastEpisode]:
-        possible_episodes = self._episodes_without_ignores(files_to_ignore)
-        if not possible_episodes:
-            return None
-
-        first_podcast = possible_episodes[0]
-        for episode in possible_episodes[1:]:
-            if first_podcast.modification_time > episode.modification_time:
-                first_podcast = episode
+        # The episodes are sorted, so this only walks past ignored episodes.
+        return next(
+            self.oldest_episodes(selection_session.as_path_set(files_to_ignore)), None
+        )
 
-        return self._episode_as_full_podcast_episode(first_podcast)
+    def oldest_episodes(
+        self, files_to_ignore: typing.AbstractSet[pathlib.Path] = frozenset()
+    ) -> typing.Iterator[full_podcast_episode.FullPodcastEpisode]:
+        """Yield the episodes oldest first, with ties in the order they were added."""
+        for episode in self._episodes:
+            if episode.path not in files_to_ignore:
+                yield self._episode_as_full_podcast_episode(episode)
 
     def remaining_episodes(
         self,
-        files_to_ignore: typing.Optional[typing.List[pathlib.Path]] = None,
+        files_to_ignore: typing.Optional[typing.Iterable[pathlib.Path]] = None,
     ) -> typing.List[full_podcast_episode.FullPodcastEpisode]:
         return [
             self._episode_as_full_podcast_episode(x)
             for x in self._episodes_without_ignores(files_to_ignore)
         ]
 
+    def remaining_listening_time(
+        self, files_to_ignore: typing.Optional[typing.Iterable[pathlib.Path]] = None
+    ) -> int:
+        """The seconds it takes to play the remaining episodes at this speed."""
+        return round(self.remaining_time(files_to_ignore) / self.speed)
+
     def remaining_time(
-        self, files_to_ignore: typing.Optional[typing.List[pathlib.Path]] = None
+        self, files_to_ignore: typing.Optional[typing.Iterable[pathlib.Path]] = None
     ) -> int:
+        if not files_to_ignore:
+            return self._total_duration
         duration = 0
         for episode in self._episodes_without_ignores(files_to_ignore):
             duration += episode.duration
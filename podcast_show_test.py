@@ -152,6 +152,75 @@ class TestPodcast(unittest.TestCase):
         p.load(io.StringIO(saved.getvalue()))
         self.assertEqual(0, len(p.remaining_episodes()))
 
+    def test_scan_skips_unchanged_folder(self) -> None:
+        podcast_folder = pathlib.Path(self.root, "podcast")
+        os.mkdir(podcast_folder)
+        first_file = pathlib.Path(podcast_folder, "podcast_1.mp3")
+        shutil.copyfile(
+            pathlib.Path(test_utils.TEST_DATA_DIR, test_utils.MP3_TEST_FILE),
+            first_file,
+        )
+        folder_time = 1330712222
+        os.utime(podcast_folder, (folder_time, folder_time))
+
+        p = podcast_show.PodcastShow(podcast_folder, podcast_show.P0)
+        self.assertEqual([first_file], p.scan_for_updates(allow_prompt=False))
+        assert p.scan_snapshot is not None
+        self.assertEqual(
+            folder_time * 1000 * 1000 * 1000, p.scan_snapshot.directory_mtime_ns
+        )
+        self.assertEqual(["podcast_1.mp3"], list(p.scan_snapshot.entries))
+
+        # A file added without the folder's time changing isn't looked for.
+        second_file = pathlib.Path(podcast_folder, "podcast_2.mp3")
+        shutil.copyfile(first_file, second_file)
+        os.utime(podcast_folder, (folder_time, folder_time))
+        self.assertEqual([], p.scan_for_updates(allow_prompt=False))
+
+        # Once the folder changes only the new entries are looked at.
+        os.remove(first_file)
+        os.utime(podcast_folder, (folder_time + 10, folder_time + 10))
+        self.assertEqual([second_file], p.scan_for_updates(allow_prompt=False))
+        self.assertEqual([second_file], [x.path for x in p.remaining_episodes()])
+        self.assertEqual(["podcast_2.mp3"], list(p.scan_snapshot.entries))
+
+    def test_find_new_files_returns_stats(self) -> None:
+        podcast_folder = pathlib.Path(self.root, "podcast")
+        os.mkdir(podcast_folder)
+        podcast_file = pathlib.Path(podcast_folder, "podcast_1.mp3")
+        shutil.copyfile(
+            pathlib.Path(test_utils.TEST_DATA_DIR, test_utils.MP3_TEST_FILE),
+            podcast_file,
+        )
+        now = 1330712222
+        os.utime(podcast_file, (now, now))
+        # Folders are never episodes, whatever they're named.
+        os.mkdir(pathlib.Path(podcast_folder, "not_a_podcast.mp3"))
+
+        p = podcast_show.PodcastShow(podcast_folder, podcast_show.P0)
+        new_files = p.find_new_files()
+        self.assertEqual([podcast_file], [x.path for x in new_files])
+        self.assertEqual(now, new_files[0].file_stat.st_mtime)
+        self.assertEqual(podcast_file.stat().st_size, new_files[0].file_stat.st_size)
+
+    def test_scan_recently_modified_folder_is_rescanned(self) -> None:
+        podcast_folder = pathlib.Path(self.root, "podcast")
+        os.mkdir(podcast_folder)
+
+        p = podcast_show.PodcastShow(podcast_folder, podcast_show.P0)
+        self.assertEqual([], p.scan_for_updates(allow_prompt=False))
+        assert p.scan_snapshot is not None
+        self.assertIsNone(p.scan_snapshot.directory_mtime_ns)
+
+        # The folder could still change within its current timestamp, so a
+        # file added now must be found even if the time doesn't move.
+        podcast_file = pathlib.Path(podcast_folder, "podcast_1.mp3")
+        shutil.copyfile(
+            pathlib.Path(test_utils.TEST_DATA_DIR, test_utils.MP3_TEST_FILE),
+            podcast_file,
+        )
+        self.assertEqual([podcast_file], p.scan_for_updates(allow_prompt=False))
+
     def test_preprocess(self) -> None:
         podcast_folder = pathlib.Path(self.root, "my_podcast")
         os.mkdir(podcast_folder)
@@ -207,6 +276,138 @@ class TestPodcast(unittest.TestCase):
         )
         self.assertEqual(expected_value, p.get_episode(full_path))
 
+    def test_episodes_kept_in_modification_order(self) -> None:
+        podcast_folder = pathlib.Path(self.root, "podcast")
+        os.mkdir(podcast_folder)
+
+        p = podcast_show.PodcastShow(podcast_folder, podcast_show.P0)
+        p.next_index = 1
+        p.episodes = [
+            podcast_episode.PodcastEpisode(
+                pathlib.Path(podcast_folder, "c.mp3"), 1, 60, 300
+            ),
+            podcast_episode.PodcastEpisode(
+                pathlib.Path(podcast_folder, "a.mp3"), 2, 60, 100
+            ),
+            podcast_episode.PodcastEpisode(
+                pathlib.Path(podcast_folder, "b.mp3"), 3, 60, 300
+            ),
+        ]
+        p.next_index = 4
+        for name, modification_time in [("d.mp3", 200), ("e.mp3", 300)]:
+            full_path = pathlib.Path(podcast_folder, name)
+            full_path.touch()
+            os.utime(full_path, (modification_time, modification_time))
+            p.add_episode(full_path, allow_prompt=False, duration=60)
+
+        # Ties stay in the order the episodes were added.
+        self.assertEqual(
+            ["a.mp3", "d.mp3", "c.mp3", "b.mp3", "e.mp3"],
+            [x.path.name for x in p.episodes],
+        )
+
+        ignored = [pathlib.Path(podcast_folder, x) for x in ["a.mp3", "c.mp3"]]
+        first_episode = p.first_episode(files_to_ignore=ignored)
+        self.assertIsNotNone(first_episode)
+        self.assertEqual("d.mp3", first_episode.path.name)  # type:ignore
+        self.assertEqual(
+            ["d.mp3", "b.mp3", "e.mp3"],
+            [x.path.name for x in p.oldest_episodes(frozenset(ignored))],
+        )
+
+    def test_aggregates(self) -> None:
+        podcast_folder = pathlib.Path(self.root, "podcast")
+        os.mkdir(podcast_folder)
+
+        p = podcast_show.PodcastShow(podcast_folder, podcast_show.P0, speed=2.0)
+        self.assertEqual(0, p.episode_count)
+        self.assertEqual(0, p.remaining_time())
+        self.assertIsNone(p.oldest_modification_time)
+
+        p.next_index = 1
+        for name, modification_time, duration in [
+            ("b.mp3", 200, 60),
+            ("a.mp3", 100, 30),
+            ("c.mp3", 300, 90),
+        ]:
+            full_path = pathlib.Path(podcast_folder, name)
+            full_path.touch()
+            os.utime(full_path, (modification_time, modification_time))
+            p.add_episode(full_path, allow_prompt=False, duration=duration)
+
+        self.assertEqual(3, p.episode_count)
+        self.assertEqual(180, p.remaining_time())
+        self.assertEqual(90, p.remaining_listening_time())
+        self.assertEqual(100, p.oldest_modification_time)
+        self.assertEqual(
+            150,
+            p.remaining_time(files_to_ignore=[pathlib.Path(podcast_folder, "a.mp3")]),
+        )
+
+        os.remove(pathlib.Path(podcast_folder, "a.mp3"))
+        self.assertEqual([], p.find_new_files())
+        self.assertEqual(2, p.episode_count)
+        self.assertEqual(150, p.remaining_time())
+        self.assertEqual(200, p.oldest_modification_time)
+
+        p.episodes = p.episodes[1:]
+        self.assertEqual(1, p.episode_count)
+        self.assertEqual(90, p.remaining_time())
+
+    def test_full_episodes_are_reused(self) -> None:
+        podcast_folder = pathlib.Path(self.root, "podcast")
+        p = podcast_show.PodcastShow(podcast_folder, podcast_show.P0)
+        episode_path = pathlib.Path(podcast_folder, "podcast_1.mp3")
+        p.episodes = [podcast_episode.PodcastEpisode(episode_path, 1, 60, 666)]
+
+        full_episode = p.get_episode(episode_path)
+        self.assertIs(full_episode, p.first_episode())
+        self.assertIs(full_episode, p.remaining_episodes()[0])
+
+        # Changing a setting makes new episodes with that setting.
+        p.speed = 2.0
+        sped_up = p.get_episode(episode_path)
+        self.assertIsNot(full_episode, sped_up)
+        assert sped_up is not None
+        self.assertEqual(2.0, sped_up.speed)
+        self.assertEqual(
+            datetime.datetime.fromtimestamp(666), sped_up.modification_time
+        )
+        self.assertEqual(datetime.timedelta(seconds=60), sped_up.duration)
+
+        p.archive = archive.Archive.YES
+        self.assertEqual(archive.Archive.YES, p.first_episode().archive)  # type:ignore
+
+        # As does replacing the episode.
+        p.episodes = [podcast_episode.PodcastEpisode(episode_path, 1, 90, 666)]
+        self.assertEqual(
+            datetime.timedelta(seconds=90), p.first_episode().duration  # type:ignore
+        )
+
+    def test_get_episode_follows_changes(self) -> None:
+        podcast_folder = pathlib.Path(self.root, "podcast")
+        os.mkdir(podcast_folder)
+        first_path = pathlib.Path(podcast_folder, "podcast_1.mp3")
+        second_path = pathlib.Path(podcast_folder, "podcast_2.mp3")
+
+        p = podcast_show.PodcastShow(podcast_folder, podcast_show.P0)
+        p.next_index = 2
+        p.episodes = [podcast_episode.PodcastEpisode(first_path, 1, 60, 666)]
+        second_path.touch()
+        p.add_episode(second_path, allow_prompt=False, duration=60)
+
+        self.assertEqual(1, p.get_episode(first_path).index)  # type:ignore
+        self.assertEqual(2, p.get_episode(second_path).index)  # type:ignore
+        # Only the name is indexed, but the rest of the path must match too.
+        self.assertIsNone(
+            p.get_episode(pathlib.Path(self.root, "other", "podcast_1.mp3"))
+        )
+
+        # The first episode's file is missing, so a scan drops it.
+        self.assertEqual([], p.find_new_files())
+        self.assertIsNone(p.get_episode(first_path))
+        self.assertIsNotNone(p.get_episode(second_path))
+
     def test_get_episode_not_present(self) -> None:
         podcast_folder = pathlib.Path(self.root, "podcast")
         os.mkdir(podcast_folder)
@@ -1,11 +1,16 @@
 # -*- coding: utf-8 -*-
 
 import concurrent.futures
+import contextlib
 import dataclasses
 import datetime
+import functools
+import multiprocessing
+import multiprocessing.managers
 import os
 import pathlib
 import queue
+import random
 import subprocess
 import sys
 import typing
@@ -15,10 +20,18 @@ import archive
 import audio_metadata
 import backup
 import command_args
+import conversion_orchestrator
+import conversion_scheduler
+import duration_cache
 import full_podcast_episode
+import loudness_cache
+import move_file
 import podcast_database
 import podcast_show
+import scan_snapshot
+import selection_session
 import settings
+import sqlite_storage
 import user_input
 
 ROOT_DIR = os.path.dirname(__file__)
@@ -71,7 +84,14 @@ def _generate_title(file: pathlib.Path, title_prefix: str) -> str:
     return title_prefix + os.path.basename(file)
 
 
-def _work(q: queue.Queue[str], args: typing.List[str]) -> None:
+@dataclasses.dataclass
+class WorkOutput:
+    work_unit_index: int
+    # None once the work unit is finished.
+    line: typing.Optional[str]
+
+
+def _work(q: queue.Queue[WorkOutput], index: int, args: typing.List[str]) -> None:
     script = os.path.join(ROOT_DIR, "move_file.py")
     args = [sys.executable, script] + args
     work_env = dict(os.environ)
@@ -91,22 +111,151 @@ def _work(q: queue.Queue[str], args: typing.List[str]) -> None:
         for stdout_line in iter(process.stdout.readline, ""):
             stdout_line = stdout_line.strip()
             if stdout_line:
-                q.put(stdout_line)
+                q.put(WorkOutput(index, stdout_line))
+
+
+class _ProcessPool(typing.NamedTuple):
+    executor: concurrent.futures.ProcessPoolExecutor
+    # Makes the queues that workers stream their output through.
+    manager: multiprocessing.managers.SyncManager
+
+
+def _work_in_process_pool(
+    process_pool: _ProcessPool,
+    q: queue.Queue[WorkOutput],
+    index: int,
+    args: typing.List[str],
+) -> None:
+    lines: queue.Queue[typing.Optional[str]] = process_pool.manager.Queue()
+    future = process_pool.executor.submit(move_file.run_captured, args, lines.put)
+    # Put from this process, so the end is marked even if the worker dies.
+    future.add_done_callback(lambda _: lines.put(None))
+    for line in iter(lines.get, None):
+        q.put(WorkOutput(index, line))
+    future.result()
+
+
+def _put_finished(
+    q: queue.Queue[WorkOutput], index: int, _: concurrent.futures.Future[None]
+) -> None:
+    q.put(WorkOutput(index, None))
+
+
+@contextlib.contextmanager
+def _start_process_pool(
+    worker_pool: bool, max_workers: int
+) -> typing.Iterator[typing.Optional[_ProcessPool]]:
+    if not worker_pool:
+        yield None
+        return
+
+    with (
+        multiprocessing.Manager() as manager,
+        concurrent.futures.ProcessPoolExecutor(max_workers=max_workers) as executor,
+    ):
+        # Workers are otherwise only started as files are submitted, so start
+        # them all before the conversions begin.
+        concurrent.futures.wait(
+            [executor.submit(move_file.warm_up) for _ in range(max_workers)]
+        )
+        yield _ProcessPool(executor, manager)
 
 
 @dataclasses.dataclass
 class ProcessWorkUnit:
     file_destination: pathlib.Path
-    shared_queue: queue.Queue[str]
     future: concurrent.futures.Future[None]
 
 
+def _move_file_args(
+    job: conversion_orchestrator.ConversionJob, dry_run: bool
+) -> typing.List[str]:
+    args = [
+        "--file-path=%s" % (job.file),
+        "--file-destination=%s" % job.destination,
+        "--title=%s" % (job.title),
+        "--album=%s" % (job.album),
+        "--speed=%f" % (job.speed),
+    ]
+    if job.archive_destination:
+        args += ["--archive-destination=%s" % (job.archive_destination)]
+    if job.loudness_cache:
+        args += ["--loudness-cache=%s" % (job.loudness_cache)]
+    if job.threads:
+        args += ["--threads=%d" % (job.threads)]
+    if dry_run:
+        args += ["--dry-run"]
+    return args
+
+
+def _run_move_file(
+    jobs: typing.List[conversion_orchestrator.ConversionJob],
+    max_workers: int,
+    dry_run: bool,
+    worker_pool: bool,
+) -> None:
+    with (
+        concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor,
+        _start_process_pool(worker_pool, max_workers) as process_pool,
+    ):
+        output_queue: queue.Queue[WorkOutput] = queue.Queue()
+        work_units = []
+        for index, job in enumerate(jobs):
+            args = _move_file_args(job, dry_run)
+            if process_pool is None:
+                future = executor.submit(_work, output_queue, index, args)
+            else:
+                future = executor.submit(
+                    _work_in_process_pool, process_pool, output_queue, index, args
+                )
+            # Called once all of the work unit's output has been queued.
+            future.add_done_callback(
+                functools.partial(_put_finished, output_queue, index)
+            )
+            work_units.append(ProcessWorkUnit(job.destination, future))
+
+        work_units_running = len(work_units)
+        while work_units_running:
+            output = output_queue.get()
+            work_unit = work_units[output.work_unit_index]
+            if output.line is not None:
+                print("[%s] %s" % (work_unit.file_destination.name, output.line))
+                continue
+
+            work_units_running -= 1
+            exception = work_unit.future.exception()
+            if exception:
+                print(
+                    "[%s] Hit an exception:\n\t%s"
+                    % (work_unit.file_destination.name, exception)
+                )
+
+
+def _print_job_output(job: conversion_orchestrator.ConversionJob, line: str) -> None:
+    print("[%s] %s" % (job.destination.name, line))
+
+
 def process_and_move_files_over(
     files: typing.List[full_podcast_episode.FullPodcastEpisode],
     destination: pathlib.Path,
     archive_folder: pathlib.Path,
     dry_run: bool,
+    worker_pool: bool = False,
+    async_conversion: bool = False,
+    loudness_cache_folder: typing.Optional[pathlib.Path] = None,
+    ffmpeg_threads: typing.Optional[int] = None,
 ) -> typing.List[pathlib.Path]:
+    """Archive, convert and move |files| to |destination| in parallel.
+
+    Each file is handled by move_file.py in a new Python process, or with
+    |worker_pool|, in worker processes started once up front. With
+    |async_conversion|, ffmpeg is instead run directly from an event loop.
+    Output is printed tagged with the file's name as soon as it's ready.
+    With |loudness_cache_folder|, loudness is normalized in two passes, and
+    the first pass is skipped for files already measured.
+    The longest files are started first, and as many run at once as there
+    are CPUs free for their |ffmpeg_threads|.
+    """
     if not destination.is_dir():
         raise InvalidDestinationError(
             f'Invalid destination folder passed into process_and_move_files_over. Expected a folder but "{destination}" isn\'t.'
@@ -117,71 +266,87 @@ def process_and_move_files_over(
             f'Invalid archive folder passed into process_and_move_files_over. Expected a folder but "{archive_folder}" isn\'t.'
         )
 
-    # Limit the number of workers to less than the number of CPUs so I can still use the computer while converting.
-    cpus_available = os.cpu_count() or 1
-    max_workers = max(cpus_available - 2, 1)
+    max_workers = conversion_scheduler.max_conversions(ffmpeg_threads)
 
-    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
-        work_units = []
-        for file in files:
-            title_prefix = "%04d_" % (file.index) if file.index else ""
-            title = _generate_title(file.path, title_prefix)
-
-            album = file.path.parent.name
-
-            file_destination = pathlib.Path(destination, file.path.name)
-            args = [
-                "--file-path=%s" % (file.path),
-                "--file-destination=%s" % file_destination,
-                "--title=%s" % (title),
-                "--album=%s" % (album),
-                "--speed=%f" % (file.speed),
-            ]
-            if file.archive == archive.Archive.YES:
-                archive_destination = archive_folder.joinpath(
-                    file.podcast_show_name, file.path.name
-                )
-                args += ["--archive-destination=%s" % (archive_destination)]
-            if dry_run:
-                args += ["--dry-run"]
-
-            q: queue.Queue[str] = queue.Queue()
-            work_unit = ProcessWorkUnit(
-                file_destination, q, executor.submit(_work, q, args)
+    jobs = []
+    for file in files:
+        title_prefix = "%04d_" % (file.index) if file.index else ""
+        archive_destination = None
+        if file.archive == archive.Archive.YES:
+            archive_destination = archive_folder.joinpath(
+                file.podcast_show_name, file.path.name
             )
-            work_units.append(work_unit)
-
-        for work_unit in work_units:
-            while not work_unit.future.done():
-                while True:
-                    try:
-                        output = work_unit.shared_queue.get_nowait()
-                        print(output)
-                    except queue.Empty:
-                        break
-            if work_unit.future.exception():
-                print("Hit an exception:\n\t%s" % (work_unit.future.exception()))
-            else:
-                while not work_unit.shared_queue.empty():
-                    print(work_unit.shared_queue.get())
+        jobs.append(
+            conversion_orchestrator.ConversionJob(
+                file=file.path,
+                destination=pathlib.Path(destination, file.path.name),
+                title=_generate_title(file.path, title_prefix),
+                album=file.path.parent.name,
+                speed=file.speed,
+                expected_duration=file.listening_time,
+                archive_destination=archive_destination,
+                loudness_cache=loudness_cache_folder,
+                threads=ffmpeg_threads,
+            )
+        )
+    scheduled_jobs = conversion_scheduler.longest_first(jobs)
+
+    if async_conversion:
+        errors = conversion_orchestrator.convert(
+            scheduled_jobs, max_workers, dry_run, _print_job_output
+        )
+        for job, error in zip(scheduled_jobs, errors):
+            if error:
+                _print_job_output(job, "Hit an exception:\n\t%s" % (error))
+    else:
+        _run_move_file(scheduled_jobs, max_workers, dry_run, worker_pool)
 
-        # If this is a dry run, we can stop now and just return an empty list as no files were moved.
-        if dry_run:
-            return []
+    # If this is a dry run, we can stop now and just return an empty list as no files were moved.
+    if dry_run:
+        return []
 
-        # Since this wasn't a dry run, ensure the original files were deleted and return the moved paths.
-        all_files_delete = True
-        for file in files:
-            if file.path.exists():
-                all_files_delete = False
-                print("%s wasn't deleted, check if it was converted." % (file.path,))
+    # Since this wasn't a dry run, ensure the original files were deleted and return the moved paths.
+    all_files_delete = True
+    for file in files:
+        if file.path.exists():
+            all_files_delete = False
+            print("%s wasn't deleted, check if it was converted." % (file.path,))
 
-        # TODO(https://github.com/seniorcodereviewbuddy/podcast/issues/53)
-        # Add a custom exception instead of using Exception.
-        if not all_files_delete:
-            raise Exception("Failed to delete all files")
+    # TODO(https://github.com/seniorcodereviewbuddy/podcast/issues/53)
+    # Add a custom exception instead of using Exception.
+    if not all_files_delete:
+        raise Exception("Failed to delete all files")
 
-        return [work_unit.file_destination for work_unit in work_units]
+    return [job.destination for job in jobs]
+
+
+def load_duration_cache(path: pathlib.Path) -> duration_cache.DurationCache:
+    """Load the duration cache at |path|, starting over if it can't be read.
+
+    The cache only speeds up scanning, so a corrupt one isn't worth stopping
+    for. It's rewritten the next time it's saved.
+    """
+    cache = duration_cache.DurationCache()
+    try:
+        cache.load(path)
+    except duration_cache.DurationCacheLoadingError as e:
+        print("WARNING: Ignoring the duration cache. %s" % (e))
+        cache = duration_cache.DurationCache()
+    return cache
+
+
+def load_scan_snapshot(
+    path: pathlib.Path, podcast_shows: typing.Sequence[podcast_show.PodcastShow]
+) -> None:
+    """Load the scan snapshots at |path|, rescanning every show if they can't be read.
+
+    Like the duration cache, the snapshots only speed up scanning and are
+    rewritten the next time they're saved.
+    """
+    try:
+        scan_snapshot.load(path, podcast_shows)
+    except scan_snapshot.ScanSnapshotLoadingError as e:
+        print("WARNING: Ignoring the scan snapshot. %s" % (e))
 
 
 def get_batch_of_podcast_files(
@@ -192,6 +357,8 @@ def get_batch_of_podcast_files(
         typing.Dict[pathlib.Path, typing.List[pathlib.Path]]
     ] = None,
     user_prompt: user_input.PromptYesOrNo_Alias = user_input.prompt_yes_or_no,
+    rng: typing.Optional[random.Random] = None,
+    optimize: bool = False,
 ) -> typing.List[full_podcast_episode.FullPodcastEpisode]:
     """
     GetBatchofPodcastFiles returns |duration_limit| time of podcasts.
@@ -199,26 +366,29 @@ def get_batch_of_podcast_files(
     the |required_files|, even if that exceeds the given duration duration.
     If we haven't passed the requested duration, it will add podcasts in
     priority order until it is just over the duration limit.
+    Durations are compared as listening time, after each show's speed up.
+    With |optimize|, the last priority used is instead picked from to fill the
+    listening time left as closely as possible, without going over.
     """
-    files = database.get_oldest_files(num_oldest_files_to_get)
+    session = selection_session.SelectionSession()
+    database.get_oldest_files(num_oldest_files_to_get, session=session)
 
     required_files = required_files if required_files else {}
-    files.extend(
-        database.get_specified_files(
-            required_files, files_to_ignore=[x.path for x in files]
-        )
-    )
-
-    time_so_far = sum((x.duration for x in files), datetime.timedelta())
-    priority_duration = duration_limit - time_so_far
+    database.get_specified_files(required_files, session=session)
 
-    files.extend(
+    if optimize:
+        database.fill_podcast_episodes_by_priority(
+            duration_limit - session.listening_time, user_prompt, session=session
+        )
+    else:
         database.get_podcast_episodes_by_priority(
-            priority_duration, user_prompt, files_to_ignore=[x.path for x in files]
+            duration_limit - session.listening_time,
+            user_prompt,
+            session=session,
+            rng=rng,
         )
-    )
 
-    return files
+    return session.episodes
 
 
 def get_podcast_episodes_summary(
@@ -228,14 +398,18 @@ def get_podcast_episodes_summary(
         return "No Potential Files"
 
     total_duration = sum((x.duration for x in podcast_episodes), datetime.timedelta())
+    total_listening_time = sum(
+        (x.listening_time for x in podcast_episodes), datetime.timedelta()
+    )
 
     summary_lines = ["Potential Files:"]
 
     summary_lines += [
-        f"{x.podcast_show_name}: {x.path.name} {x.duration}" for x in podcast_episodes
+        f"{x.podcast_show_name}: {x.path.name} {x.listening_time}"
+        for x in podcast_episodes
     ]
     summary_lines += [
-        f"{len(podcast_episodes)} files in total, duration of {total_duration}"
+        f"{len(podcast_episodes)} files in total, listening time of {total_listening_time} ({total_duration} before speeding up)"
     ]
 
     return "\n".join(summary_lines)
@@ -268,13 +442,26 @@ def main(
         user_settings.podcasts,
         parsed_args.verbose,
     )
-    database.load(user_settings.podcast_database)
+    storage = None
+    if user_settings.database_storage == settings.DatabaseStorage.SQLITE:
+        storage = sqlite_storage.SqliteStorage(user_settings.sqlite_database)
+        database.load_from_sqlite(storage, import_path=user_settings.podcast_database)
+    else:
+        database.load(user_settings.podcast_database)
+    load_scan_snapshot(user_settings.scan_snapshot, database.podcast_shows)
+
+    cache = load_duration_cache(user_settings.duration_cache)
 
-    database.update_podcasts()
+    database.update_podcasts(cache=cache)
     if parsed_args.dry_run:
         print("Skipping database update for dry run")
     else:
-        database.save(user_settings.podcast_database)
+        if storage is not None:
+            database.save_to_sqlite(storage)
+        else:
+            database.commit(user_settings.podcast_database)
+        cache.save(user_settings.duration_cache)
+        scan_snapshot.save(user_settings.scan_snapshot, database.podcast_shows)
         database.update_remaining_time(user_settings.podcast_history)
         database.log_stats(user_settings.podcast_stats)
 
@@ -292,6 +479,7 @@ def main(
         user_settings.time_of_podcasts_to_add,
         user_settings.num_oldest_episodes_to_add,
         user_settings.specified_files,
+        optimize=parsed_args.optimize_batch,
     )
 
     # Print a summary of the collected files and see if the user wants to
@@ -311,6 +499,10 @@ def main(
         user_settings.processed_file_boarding_zone_folder,
         user_settings.archive_folder,
         parsed_args.dry_run,
+        worker_pool=parsed_args.worker_pool,
+        async_conversion=parsed_args.async_conversion,
+        loudness_cache_folder=user_settings.loudness_cache,
+        ffmpeg_threads=user_settings.ffmpeg_threads,
     )
 
     # Currently dry_run isn't support past this point, so we stop early.
@@ -322,6 +514,8 @@ def main(
         )
         return
 
+    loudness_cache.LoudnessCache(user_settings.loudness_cache).prune()
+
     if phone.connect_to_phone():
         copy_results = phone.copy_files_to_phone(moved_files)
 
@@ -1,4 +1,6 @@
+import contextlib
 import datetime
+import io
 import os
 import pathlib
 import shutil
@@ -33,6 +35,12 @@ def _get_x_oldest_episodes(
     return episodes[0:x]
 
 
+# How long the test file takes to listen to at the default speed.
+TEST_FILE_LISTENING_SECONDS = round(
+    test_utils.TEST_FILE_LENGTH_IN_SECONDS / podcast_show.DEFAULT_SPEED
+)
+
+
 def always_say_yes(x: str) -> bool:
     return True
 
@@ -142,6 +150,35 @@ class TestPrepareForPhone(unittest.TestCase):
                 self.root, podcast_shows=podcast_shows
             )
 
+    def test_load_duration_cache_garbage_file(self) -> None:
+        cache_file = pathlib.Path(self.root, "duration_cache.json")
+        with open(cache_file, "wb") as f:
+            f.write(b"\x00garbage{")
+
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            cache = prepare_for_phone.load_duration_cache(cache_file)
+        self.assertEqual(0, len(cache))
+        self.assertIn("Ignoring the duration cache", output.getvalue())
+
+        # Saving replaces the garbage with a cache that loads again.
+        cache.save(cache_file)
+        self.assertEqual(0, len(prepare_for_phone.load_duration_cache(cache_file)))
+
+    def test_load_scan_snapshot_garbage_file(self) -> None:
+        snapshot_file = pathlib.Path(self.root, "scan_snapshot.json")
+        with open(snapshot_file, "wb") as f:
+            f.write(b"\xffgarbage{")
+        podcast_folder = pathlib.Path(self.root, "podcast")
+        os.mkdir(podcast_folder)
+        show = podcast_show.PodcastShow(podcast_folder, podcast_show.P0)
+
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            prepare_for_phone.load_scan_snapshot(snapshot_file, [show])
+        self.assertIsNone(show.scan_snapshot)
+        self.assertIn("Ignoring the scan snapshot", output.getvalue())
+
     def test_process_and_move_files_over_invalid_destination(self) -> None:
         destination_folder = pathlib.Path(self.root, "destination")
         archive_folder = pathlib.Path(self.root, "archive")
@@ -211,6 +248,52 @@ class TestPrepareForPhone(unittest.TestCase):
             os.listdir(os.path.join(archive_folder, podcast_folder)),
         )
 
+    def test_process_and_move_files_over_worker_pool_dry_run(self) -> None:
+        podcast_folder = pathlib.Path("podcast_show")
+        podcast_test_show = self._create_podcast_show(
+            podcast_folder, podcast_show.P1, 3
+        )
+        podcast_test_show.archive = archive.Archive.YES
+
+        unprocessed_files = podcast_test_show.remaining_episodes()
+        copied_folder = pathlib.Path(self.root, "copied")
+        copied_folder.mkdir()
+        archive_folder = pathlib.Path(self.root, "archive")
+        archive_folder.mkdir()
+
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            moved_files = prepare_for_phone.process_and_move_files_over(
+                unprocessed_files,
+                copied_folder,
+                archive_folder,
+                True,
+                worker_pool=True,
+            )
+        self.assertEqual([], moved_files)
+
+        # Each file's output is tagged with its name, and is in order for that file.
+        lines = output.getvalue().splitlines()
+        for file in unprocessed_files:
+            tag = "[%s] " % (file.path.name)
+            self.assertEqual(
+                [
+                    tag + "Dry run, would have archived %s" % (file.path),
+                    tag
+                    + "Dry run, would have moved %s to %s"
+                    % (file.path, copied_folder.joinpath(file.path.name)),
+                    tag + "With album %s" % (podcast_folder),
+                ],
+                [x for x in lines if x.startswith(tag)],
+            )
+        self.assertEqual(3 * len(unprocessed_files), len(lines))
+        self.assertCountEqual(
+            _list_of_full_podcast_episodes_to_list_of_names(unprocessed_files),
+            os.listdir(podcast_test_show.podcast_folder),
+        )
+        self.assertEqual([], os.listdir(copied_folder))
+        self.assertEqual([], os.listdir(archive_folder))
+
     def test_move_files_overs_no_archive(self) -> None:
         podcast_folder = pathlib.Path(self.root, "new show")
         podcast_test_show = self._create_podcast_show(
@@ -341,7 +424,7 @@ class TestPrepareForPhone(unittest.TestCase):
 
         files = prepare_for_phone.get_batch_of_podcast_files(
             database,
-            datetime.timedelta(seconds=test_utils.TEST_FILE_LENGTH_IN_SECONDS - 1),
+            datetime.timedelta(seconds=TEST_FILE_LISTENING_SECONDS - 1),
             num_oldest_files_to_get=0,
             user_prompt=lambda x: True,
         )
@@ -350,7 +433,7 @@ class TestPrepareForPhone(unittest.TestCase):
 
         files = prepare_for_phone.get_batch_of_podcast_files(
             database,
-            datetime.timedelta(seconds=test_utils.TEST_FILE_LENGTH_IN_SECONDS * 2 - 1),
+            datetime.timedelta(seconds=TEST_FILE_LISTENING_SECONDS * 2 - 1),
             num_oldest_files_to_get=0,
             user_prompt=lambda x: True,
         )
@@ -359,13 +442,43 @@ class TestPrepareForPhone(unittest.TestCase):
 
         files = prepare_for_phone.get_batch_of_podcast_files(
             database,
-            datetime.timedelta(seconds=test_utils.TEST_FILE_LENGTH_IN_SECONDS * 3 - 1),
+            datetime.timedelta(seconds=TEST_FILE_LISTENING_SECONDS * 3 - 1),
             num_oldest_files_to_get=0,
             user_prompt=lambda x: True,
         )
         expected_result = _get_x_oldest_episodes(priority_show, 3)
         self.assertCountEqual(files, expected_result)
 
+    def test_get_batch_of_podcast_files_optimized(self) -> None:
+        priority_path = pathlib.Path("priority_podcast")
+        priority_show = self._create_podcast_show(
+            priority_path, podcast_show.P0, 3, episodes_start_time=6666
+        )
+
+        old_podcast_path = pathlib.Path("old_podcast")
+        old_podcast_show = self._create_podcast_show(
+            old_podcast_path, podcast_show.P2, 3, episodes_start_time=3000
+        )
+
+        podcast_shows = [priority_show, old_podcast_show]
+        database = podcast_database.PodcastDatabase(podcast_shows, False)
+        database.update_podcasts(allow_prompt=False)
+
+        # Room for two and a half episodes, where picking at random would
+        # go over with a third.
+        listening_time = datetime.timedelta(seconds=TEST_FILE_LISTENING_SECONDS)
+        files = prepare_for_phone.get_batch_of_podcast_files(
+            database,
+            listening_time * 2.5,
+            num_oldest_files_to_get=1,
+            user_prompt=lambda x: True,
+            optimize=True,
+        )
+        expected_result = _get_x_oldest_episodes(
+            old_podcast_show, 1
+        ) + _get_x_oldest_episodes(priority_show, 1)
+        self.assertCountEqual(files, expected_result)
+
     def test_get_batch_of_podcast_files_only_oldest(self) -> None:
         old_path = pathlib.Path("priority_podcast")
         old_show = self._create_podcast_show(
@@ -386,7 +499,7 @@ class TestPrepareForPhone(unittest.TestCase):
 
         files = prepare_for_phone.get_batch_of_podcast_files(
             database,
-            datetime.timedelta(seconds=test_utils.TEST_FILE_LENGTH_IN_SECONDS - 1),
+            datetime.timedelta(seconds=TEST_FILE_LISTENING_SECONDS - 1),
             num_oldest_files_to_get=1,
             user_prompt=lambda x: True,
         )
@@ -395,7 +508,7 @@ class TestPrepareForPhone(unittest.TestCase):
 
         files = prepare_for_phone.get_batch_of_podcast_files(
             database,
-            datetime.timedelta(seconds=test_utils.TEST_FILE_LENGTH_IN_SECONDS * 2 - 1),
+            datetime.timedelta(seconds=TEST_FILE_LISTENING_SECONDS * 2 - 1),
             num_oldest_files_to_get=2,
             user_prompt=lambda x: True,
         )
@@ -404,7 +517,7 @@ class TestPrepareForPhone(unittest.TestCase):
 
         files = prepare_for_phone.get_batch_of_podcast_files(
             database,
-            datetime.timedelta(seconds=test_utils.TEST_FILE_LENGTH_IN_SECONDS * 3 - 1),
+            datetime.timedelta(seconds=TEST_FILE_LISTENING_SECONDS * 3 - 1),
             num_oldest_files_to_get=3,
             user_prompt=lambda x: True,
         )
@@ -431,7 +544,7 @@ class TestPrepareForPhone(unittest.TestCase):
 
         files = prepare_for_phone.get_batch_of_podcast_files(
             database,
-            datetime.timedelta(seconds=test_utils.TEST_FILE_LENGTH_IN_SECONDS * 2 - 1),
+            datetime.timedelta(seconds=TEST_FILE_LISTENING_SECONDS * 2 - 1),
             num_oldest_files_to_get=1,
             user_prompt=lambda x: True,
         )
@@ -442,7 +555,7 @@ class TestPrepareForPhone(unittest.TestCase):
 
         files = prepare_for_phone.get_batch_of_podcast_files(
             database,
-            datetime.timedelta(seconds=test_utils.TEST_FILE_LENGTH_IN_SECONDS * 4 - 1),
+            datetime.timedelta(seconds=TEST_FILE_LISTENING_SECONDS * 4 - 1),
             num_oldest_files_to_get=2,
             user_prompt=lambda x: True,
         )
@@ -471,7 +584,7 @@ class TestPrepareForPhone(unittest.TestCase):
 
         files = prepare_for_phone.get_batch_of_podcast_files(
             database,
-            datetime.timedelta(seconds=test_utils.TEST_FILE_LENGTH_IN_SECONDS - 1),
+            datetime.timedelta(seconds=TEST_FILE_LISTENING_SECONDS - 1),
             num_oldest_files_to_get=1,
             user_prompt=lambda x: True,
         )
@@ -480,7 +593,7 @@ class TestPrepareForPhone(unittest.TestCase):
 
         files = prepare_for_phone.get_batch_of_podcast_files(
             database,
-            datetime.timedelta(seconds=test_utils.TEST_FILE_LENGTH_IN_SECONDS * 3 - 1),
+            datetime.timedelta(seconds=TEST_FILE_LISTENING_SECONDS * 3 - 1),
             num_oldest_files_to_get=1,
             user_prompt=lambda x: True,
         )
@@ -489,7 +602,7 @@ class TestPrepareForPhone(unittest.TestCase):
 
         files = prepare_for_phone.get_batch_of_podcast_files(
             database,
-            datetime.timedelta(seconds=test_utils.TEST_FILE_LENGTH_IN_SECONDS * 4 - 1),
+            datetime.timedelta(seconds=TEST_FILE_LISTENING_SECONDS * 4 - 1),
             num_oldest_files_to_get=1,
             user_prompt=lambda x: True,
         )
@@ -591,7 +704,7 @@ class TestPrepareForPhone(unittest.TestCase):
         oldest_episodes = _get_x_oldest_episodes(show, 3)
         files = prepare_for_phone.get_batch_of_podcast_files(
             database,
-            datetime.timedelta(seconds=test_utils.TEST_FILE_LENGTH_IN_SECONDS * 3 - 1),
+            datetime.timedelta(seconds=TEST_FILE_LISTENING_SECONDS * 3 - 1),
             num_oldest_files_to_get=1,
             required_files={
                 pathlib.Path(show_path.name): [
@@ -616,9 +729,7 @@ class TestPrepareForPhone(unittest.TestCase):
         with self.assertRaises(podcast_database.PodcastEpisodePathError):
             prepare_for_phone.get_batch_of_podcast_files(
                 database,
-                datetime.timedelta(
-                    seconds=test_utils.TEST_FILE_LENGTH_IN_SECONDS * 4 - 1
-                ),
+                datetime.timedelta(seconds=TEST_FILE_LISTENING_SECONDS * 4 - 1),
                 num_oldest_files_to_get=1,
                 required_files={
                     pathlib.Path(show_path.name): [pathlib.Path("fake_path")]
@@ -646,7 +757,7 @@ class TestPrepareForPhone(unittest.TestCase):
                 index=1,
                 path=pathlib.Path("Show 2"),
                 podcast_show_name="fake_show",
-                speed=1.0,
+                speed=2.0,
                 archive=archive.Archive.NO,
                 modification_time=datetime.datetime.now(),
                 duration=datetime.timedelta(minutes=20),
@@ -657,8 +768,8 @@ class TestPrepareForPhone(unittest.TestCase):
 
         expected_summary = """Potential Files:
 fake_show: Show 1 0:15:00
-fake_show: Show 2 0:20:00
-2 files in total, duration of 0:35:00"""
+fake_show: Show 2 0:10:00
+2 files in total, listening time of 0:25:00 (0:35:00 before speeding up)"""
         self.assertEqual(summary, expected_summary)
 
     def test_remove_unneeded_backups_no_files_on_phone(self) -> None:
@@ -0,0 +1,92 @@
+import argparse
+import os
+import pathlib
+import sys
+import tempfile
+import time
+import typing
+
+import podcast_episode
+import podcast_show
+
+
+def _create_files(folder: pathlib.Path, num_files: int) -> None:
+    # Spread the modification times out like downloads over time would be.
+    now = int(time.time())
+    for i in range(num_files):
+        path = pathlib.Path(folder, "episode_%06d.mp3" % (i))
+        with open(path, "wb"):
+            pass
+        os.utime(path, (now - i * 60, now - i * 60))
+
+
+def _scan_with_iterdir(folder: pathlib.Path) -> typing.List[pathlib.Path]:
+    """The scan as done before scandir, including the stat to create an episode."""
+    files_present = frozenset(f.absolute() for f in folder.iterdir())
+    new_episodes = []
+    for f in files_present:
+        if not podcast_episode.is_podcast_file(f):
+            continue
+        new_episodes.append((f, podcast_episode.modified_time(f)))
+        f.stat()
+    new_episodes.sort(key=lambda x: (x[1], x[0]))
+    return [x[0] for x in new_episodes]
+
+
+def _scan_with_scandir(folder: pathlib.Path) -> typing.List[pathlib.Path]:
+    show = podcast_show.PodcastShow(folder, podcast_show.P0)
+    return [x.path for x in show.find_new_files()]
+
+
+def _time(
+    scan: typing.Callable[[pathlib.Path], typing.List[pathlib.Path]],
+    folder: pathlib.Path,
+    repeat: int,
+) -> typing.Tuple[float, int]:
+    best = None
+    found = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        found = len(scan(folder))
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    assert best is not None
+    return best, found
+
+
+def main(args: typing.Optional[typing.List[str]]) -> int:
+    parser = argparse.ArgumentParser(
+        description="Compare scanning a show folder with iterdir and with scandir"
+    )
+    parser.add_argument(
+        "--files", type=int, default=50000, help="Number of files to create"
+    )
+    parser.add_argument(
+        "--repeat", type=int, default=3, help="Number of times to time each scan"
+    )
+    parsed_args = parser.parse_args(args)
+
+    with tempfile.TemporaryDirectory() as root:
+        folder = pathlib.Path(root, "podcast")
+        os.mkdir(folder)
+        _create_files(folder, parsed_args.files)
+
+        iterdir_time, iterdir_found = _time(
+            _scan_with_iterdir, folder, parsed_args.repeat
+        )
+        scandir_time, scandir_found = _time(
+            _scan_with_scandir, folder, parsed_args.repeat
+        )
+
+    if iterdir_found != scandir_found:
+        print("Scans found different files: %d vs %d" % (iterdir_found, scandir_found))
+        return 1
+
+    print("Scanned %d files" % (scandir_found))
+    print("iterdir: %.3fs" % (iterdir_time))
+    print("scandir: %.3fs (%.1fx)" % (scandir_time, iterdir_time / scandir_time))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
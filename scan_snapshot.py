@@ -0,0 +1,109 @@
+import json
+import pathlib
+import time
+import typing
+
+import atomic_file
+
+SNAPSHOT_VERSION = 1
+
+# A directory modified this recently could still be changed again within the
+# same timestamp tick, so its modification time can't be trusted to skip it.
+RACY_MODIFICATION_NS = 2 * 1000 * 1000 * 1000
+
+# (size, modification time in ns) of each entry in a show's folder.
+Entries_TypeAlias = typing.Dict[str, typing.Tuple[int, int]]
+
+
+class ScanSnapshotLoadingError(Exception):
+    pass
+
+
+class ShowSnapshot(typing.NamedTuple):
+    """The state of a show's folder as of its last scan."""
+
+    # None if the folder must be rescanned even if its time hasn't changed.
+    directory_mtime_ns: typing.Optional[int]
+    entries: Entries_TypeAlias
+
+    @classmethod
+    def new(cls, directory_mtime_ns: int, entries: Entries_TypeAlias) -> "ShowSnapshot":
+        if time.time_ns() - directory_mtime_ns < RACY_MODIFICATION_NS:
+            return cls(None, entries)
+        return cls(directory_mtime_ns, entries)
+
+    def is_current(self, directory_mtime_ns: int) -> bool:
+        return self.directory_mtime_ns == directory_mtime_ns
+
+
+class _Show(typing.Protocol):
+    podcast_name: str
+    next_index: typing.Optional[int]
+    scan_snapshot: typing.Optional[ShowSnapshot]
+
+
+def load(path: pathlib.Path, podcast_shows: typing.Sequence[_Show]) -> int:
+    """Load snapshots for |podcast_shows|, which must already be loaded.
+
+    Snapshots taken when a show had a different next_index don't describe the
+    loaded episodes, so they are dropped and the show gets a full scan.
+    """
+    if not path.is_file():
+        return 0
+
+    with open(path, "r", encoding="utf-8") as f:
+        try:
+            raw_json = json.load(f)
+        except ValueError as e:
+            # Also covers files that aren't UTF-8.
+            raise ScanSnapshotLoadingError(
+                "Failed to parse scan snapshot %s. Error:\n%s" % (path, e)
+            )
+
+    if not isinstance(raw_json, dict) or raw_json.get("version") != SNAPSHOT_VERSION:
+        print("Ignoring scan snapshot %s with unknown version" % (path))
+        return 0
+
+    # Every snapshot is read before any is set, so a bad file changes no show.
+    snapshots: typing.Dict[str, typing.Optional[ShowSnapshot]] = {}
+    try:
+        raw_shows = raw_json["shows"]
+        for show in podcast_shows:
+            raw_show = raw_shows.get(show.podcast_name)
+            if raw_show is None or raw_show["next_index"] != show.next_index:
+                snapshots[show.podcast_name] = None
+                continue
+
+            snapshots[show.podcast_name] = ShowSnapshot(
+                raw_show["directory_mtime_ns"],
+                dict((name, (x[0], x[1])) for name, x in raw_show["entries"].items()),
+            )
+    except (AttributeError, IndexError, KeyError, TypeError) as e:
+        raise ScanSnapshotLoadingError(
+            "Failed to load shows from scan snapshot %s. Error:\n%r" % (path, e)
+        )
+
+    for show in podcast_shows:
+        show.scan_snapshot = snapshots[show.podcast_name]
+    return sum(1 for x in snapshots.values() if x is not None)
+
+
+def save(path: pathlib.Path, podcast_shows: typing.Sequence[_Show]) -> None:
+    """Save the snapshots of |podcast_shows|.
+
+    This should be called after the podcast database is saved, so a snapshot
+    never describes episodes that didn't make it into the database.
+    """
+    raw_shows = {}
+    for show in podcast_shows:
+        if show.scan_snapshot is None:
+            continue
+        raw_shows[show.podcast_name] = {
+            "next_index": show.next_index,
+            "directory_mtime_ns": show.scan_snapshot.directory_mtime_ns,
+            "entries": show.scan_snapshot.entries,
+        }
+
+    atomic_file.write_text(
+        path, json.dumps({"version": SNAPSHOT_VERSION, "shows": raw_shows})
+    )
@@ -0,0 +1,91 @@
+import os
+import pathlib
+import tempfile
+import unittest
+
+import podcast_show
+import scan_snapshot
+
+
+class TestScanSnapshot(unittest.TestCase):
+    def setUp(self) -> None:
+        self._root_directory = tempfile.TemporaryDirectory()
+        self.root = pathlib.Path(self._root_directory.name)
+        self.snapshot_file = pathlib.Path(self.root, "scan_snapshot.json")
+
+        podcast_folder = pathlib.Path(self.root, "podcast")
+        os.mkdir(podcast_folder)
+        self.show = podcast_show.PodcastShow(podcast_folder, podcast_show.P0)
+        self.show.next_index = 5
+        self.show.scan_snapshot = scan_snapshot.ShowSnapshot(
+            1330712222 * 1000 * 1000 * 1000, {"podcast_1.mp3": (1234, 5678)}
+        )
+
+    def tearDown(self) -> None:
+        self._root_directory.cleanup()
+
+    def _new_show(self) -> podcast_show.PodcastShow:
+        show = podcast_show.PodcastShow(self.show.podcast_folder, podcast_show.P0)
+        show.next_index = self.show.next_index
+        return show
+
+    def test_save_and_load(self) -> None:
+        scan_snapshot.save(self.snapshot_file, [self.show])
+
+        show = self._new_show()
+        self.assertEqual(1, scan_snapshot.load(self.snapshot_file, [show]))
+        self.assertEqual(self.show.scan_snapshot, show.scan_snapshot)
+
+    def test_load_drops_snapshot_for_different_next_index(self) -> None:
+        scan_snapshot.save(self.snapshot_file, [self.show])
+
+        show = self._new_show()
+        show.next_index = None
+        self.assertEqual(0, scan_snapshot.load(self.snapshot_file, [show]))
+        self.assertIsNone(show.scan_snapshot)
+
+    def test_load_missing_file(self) -> None:
+        show = self._new_show()
+        self.assertEqual(0, scan_snapshot.load(self.snapshot_file, [show]))
+        self.assertIsNone(show.scan_snapshot)
+
+    def test_load_bad_file(self) -> None:
+        with open(self.snapshot_file, "w", encoding="utf-8") as f:
+            f.write("not json")
+
+        with self.assertRaises(scan_snapshot.ScanSnapshotLoadingError):
+            scan_snapshot.load(self.snapshot_file, [self._new_show()])
+
+    def test_load_not_an_object(self) -> None:
+        with open(self.snapshot_file, "w", encoding="utf-8") as f:
+            f.write("[]")
+
+        show = self._new_show()
+        self.assertEqual(0, scan_snapshot.load(self.snapshot_file, [show]))
+        self.assertIsNone(show.scan_snapshot)
+
+    def test_load_malformed_file(self) -> None:
+        for raw_shows in [
+            None,
+            '{"podcast": {"next_index": 5}}',
+            '{"podcast": {"next_index": 5, "directory_mtime_ns": 1, '
+            '"entries": {"podcast_1.mp3": 3}}}',
+        ]:
+            with open(self.snapshot_file, "w", encoding="utf-8") as f:
+                if raw_shows is None:
+                    f.write('{"version": %d}' % (scan_snapshot.SNAPSHOT_VERSION))
+                else:
+                    f.write(
+                        '{"version": %d, "shows": %s}'
+                        % (scan_snapshot.SNAPSHOT_VERSION, raw_shows)
+                    )
+
+            show = self._new_show()
+            with self.subTest(raw_shows=raw_shows):
+                with self.assertRaises(scan_snapshot.ScanSnapshotLoadingError):
+                    scan_snapshot.load(self.snapshot_file, [show])
+                self.assertIsNone(show.scan_snapshot)
+
+
+if __name__ == "__main__":
+    unittest.main()
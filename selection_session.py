@@ -0,0 +1,53 @@
+import datetime
+import pathlib
+import typing
+
+import full_podcast_episode
+
+
+def as_path_set(
+    paths: typing.Optional[typing.Iterable[pathlib.Path]],
+) -> typing.AbstractSet[pathlib.Path]:
+    """Return |paths| as a set, without copying it if it already is one."""
+    if paths is None:
+        return frozenset()
+    if isinstance(paths, typing.AbstractSet):
+        return paths
+    return frozenset(paths)
+
+
+class SelectionSession(object):
+    """The episodes picked so far while building a batch.
+
+    Every selection stage skips the paths the session already holds and adds
+    its own picks to it, so later stages never pick the same episode again.
+    """
+
+    def __init__(self, files_to_ignore: typing.Iterable[pathlib.Path] = ()):
+        self.episodes: typing.List[full_podcast_episode.FullPodcastEpisode] = []
+        self.listening_time = datetime.timedelta()
+        self._chosen_paths: typing.Set[pathlib.Path] = set(files_to_ignore)
+
+    @classmethod
+    def resume(
+        cls,
+        session: typing.Optional["SelectionSession"],
+        files_to_ignore: typing.Optional[typing.Iterable[pathlib.Path]] = None,
+    ) -> "SelectionSession":
+        """Return |session|, or a new one, that also ignores |files_to_ignore|."""
+        if session is None:
+            return cls(files_to_ignore or ())
+        session._chosen_paths.update(files_to_ignore or ())
+        return session
+
+    @property
+    def chosen_paths(self) -> typing.AbstractSet[pathlib.Path]:
+        return self._chosen_paths
+
+    def __contains__(self, path: typing.Any) -> bool:
+        return path in self._chosen_paths
+
+    def add(self, episode: full_podcast_episode.FullPodcastEpisode) -> None:
+        self.episodes.append(episode)
+        self.listening_time += episode.listening_time
+        self._chosen_paths.add(episode.path)
@@ -0,0 +1,57 @@
+import datetime
+import pathlib
+import unittest
+
+import archive
+import full_podcast_episode
+import selection_session
+
+
+def _episode(name: str, seconds: int) -> full_podcast_episode.FullPodcastEpisode:
+    return full_podcast_episode.FullPodcastEpisode(
+        index=1,
+        path=pathlib.Path("show", name),
+        podcast_show_name="show",
+        speed=1.0,
+        archive=archive.Archive.NO,
+        modification_time=datetime.datetime.fromisoformat("2020-02-02"),
+        duration=datetime.timedelta(seconds=seconds),
+    )
+
+
+class TestSelectionSession(unittest.TestCase):
+    def test_add(self) -> None:
+        ignored = pathlib.Path("show", "ignored.mp3")
+        session = selection_session.SelectionSession([ignored])
+        self.assertIn(ignored, session)
+
+        first = _episode("first.mp3", 10)
+        second = _episode("second.mp3", 20)
+        session.add(first)
+        session.add(second)
+
+        self.assertEqual([first, second], session.episodes)
+        self.assertEqual(datetime.timedelta(seconds=30), session.listening_time)
+        self.assertEqual({ignored, first.path, second.path}, session.chosen_paths)
+
+    def test_resume(self) -> None:
+        ignored = pathlib.Path("show", "ignored.mp3")
+        new_session = selection_session.SelectionSession.resume(None, [ignored])
+        self.assertIn(ignored, new_session)
+
+        session = selection_session.SelectionSession()
+        other = pathlib.Path("show", "other.mp3")
+        self.assertIs(
+            session, selection_session.SelectionSession.resume(session, [other])
+        )
+        self.assertIn(other, session)
+
+    def test_as_path_set(self) -> None:
+        paths = {pathlib.Path("a.mp3")}
+        self.assertIs(paths, selection_session.as_path_set(paths))
+        self.assertEqual(paths, selection_session.as_path_set([pathlib.Path("a.mp3")]))
+        self.assertEqual(frozenset(), selection_session.as_path_set(None))
+
+
+if __name__ == "__main__":
+    unittest.main()
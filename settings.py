@@ -1,4 +1,5 @@
 import datetime
+import enum
 import json
 import os
 import pathlib
@@ -15,6 +16,13 @@ class SettingsError(Exception):
     pass
 
 
+class DatabaseStorage(enum.Enum):
+    # The text or binary database file, with its journal.
+    FILE = 1
+    # A SQLite database, updated with only what changed.
+    SQLITE = 2
+
+
 class Settings(object):
     _EXPECTED_STRINGS = [
         "ANDROID_PHONE_ID",
@@ -87,6 +95,29 @@ class Settings(object):
             hours=time_of_podcasts_to_add_in_hours
         )
 
+        database_storage = raw_json.get("DATABASE_STORAGE", DatabaseStorage.FILE.name)
+        try:
+            self._DATABASE_STORAGE = DatabaseStorage[str(database_storage).upper()]
+        except KeyError:
+            raise SettingsError(
+                'Setting DATABASE_STORAGE must be one of %s, got "%s" in %s instead.'
+                % (
+                    ", ".join(x.name.lower() for x in DatabaseStorage),
+                    database_storage,
+                    settings_file,
+                )
+            )
+
+        ffmpeg_threads = raw_json.get("FFMPEG_THREADS")
+        if ffmpeg_threads is not None and not (
+            str(ffmpeg_threads).isdigit() and int(ffmpeg_threads) > 0
+        ):
+            raise SettingsError(
+                'Setting FFMPEG_THREADS must be a positive integer, got "%s" in %s instead.'
+                % (ffmpeg_threads, settings_file)
+            )
+        self._FFMPEG_THREADS = None if ffmpeg_threads is None else int(ffmpeg_threads)
+
         self._PODCASTS = podcasts
         self._SPECIFIED_FILES = specified_files
 
@@ -122,6 +153,15 @@ class Settings(object):
     def time_of_podcasts_to_add(self) -> datetime.timedelta:
         return self._TIME_OF_PODCASTS_TO_ADD
 
+    @property
+    def database_storage(self) -> DatabaseStorage:
+        return self._DATABASE_STORAGE
+
+    @property
+    def ffmpeg_threads(self) -> typing.Optional[int]:
+        """Threads each ffmpeg conversion uses, or None to let ffmpeg decide."""
+        return self._FFMPEG_THREADS
+
     @property
     def podcasts(self) -> typing.List[podcast_show.PodcastShow]:
         return self._PODCASTS
@@ -142,6 +182,22 @@ class Settings(object):
     def podcast_database(self) -> pathlib.Path:
         return pathlib.Path(self._USER_DATA_FOLDER, "podcast.db")
 
+    @property
+    def sqlite_database(self) -> pathlib.Path:
+        return pathlib.Path(self._USER_DATA_FOLDER, "podcast.sqlite")
+
+    @property
+    def duration_cache(self) -> pathlib.Path:
+        return pathlib.Path(self._USER_DATA_FOLDER, "duration_cache.json")
+
+    @property
+    def loudness_cache(self) -> pathlib.Path:
+        return pathlib.Path(self._USER_DATA_FOLDER, "loudness_cache")
+
+    @property
+    def scan_snapshot(self) -> pathlib.Path:
+        return pathlib.Path(self._USER_DATA_FOLDER, "scan_snapshot.json")
+
     @property
     def podcast_history(self) -> pathlib.Path:
         return pathlib.Path(self._USER_DATA_FOLDER, "history.txt")
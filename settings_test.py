@@ -2,6 +2,7 @@ import datetime
 import json
 import pathlib
 import tempfile
+import typing
 import unittest
 
 import settings
@@ -86,6 +87,68 @@ class TestSettings(unittest.TestCase):
                 ):
                     settings.DefaultSettings(pathlib.Path(f.name))
 
+    def test_database_storage(self) -> None:
+        for value, want in [
+            (None, settings.DatabaseStorage.FILE),
+            ("file", settings.DatabaseStorage.FILE),
+            ("sqlite", settings.DatabaseStorage.SQLITE),
+        ]:
+            with self.subTest(value=value):
+                with tempfile.NamedTemporaryFile(mode="w", delete_on_close=False) as f:
+                    storage_settings: typing.Dict[str, typing.Any] = (
+                        self._default_settings.copy()
+                    )
+                    if value is not None:
+                        storage_settings["DATABASE_STORAGE"] = value
+                    f.write(json.dumps(storage_settings))
+                    f.close()
+
+                    user_settings = settings.DefaultSettings(pathlib.Path(f.name))
+                    self.assertEqual(want, user_settings.database_storage)
+
+    def test_database_storage_invalid(self) -> None:
+        with tempfile.NamedTemporaryFile(mode="w", delete_on_close=False) as f:
+            invalid_settings: typing.Dict[str, typing.Any] = (
+                self._default_settings.copy()
+            )
+            invalid_settings["DATABASE_STORAGE"] = "paper"
+            f.write(json.dumps(invalid_settings))
+            f.close()
+
+            with self.assertRaisesRegex(settings.SettingsError, "DATABASE_STORAGE"):
+                settings.DefaultSettings(pathlib.Path(f.name))
+
+    def test_ffmpeg_threads(self) -> None:
+        for value, want in [(None, None), (2, 2), ("4", 4)]:
+            with self.subTest(value=value):
+                with tempfile.NamedTemporaryFile(mode="w", delete_on_close=False) as f:
+                    thread_settings: typing.Dict[str, typing.Any] = (
+                        self._default_settings.copy()
+                    )
+                    if value is not None:
+                        thread_settings["FFMPEG_THREADS"] = value
+                    f.write(json.dumps(thread_settings))
+                    f.close()
+
+                    user_settings = settings.DefaultSettings(pathlib.Path(f.name))
+                    self.assertEqual(want, user_settings.ffmpeg_threads)
+
+    def test_ffmpeg_threads_invalid(self) -> None:
+        for value in [0, -1, "many"]:
+            with self.subTest(value=value):
+                with tempfile.NamedTemporaryFile(mode="w", delete_on_close=False) as f:
+                    invalid_settings: typing.Dict[str, typing.Any] = (
+                        self._default_settings.copy()
+                    )
+                    invalid_settings["FFMPEG_THREADS"] = value
+                    f.write(json.dumps(invalid_settings))
+                    f.close()
+
+                    with self.assertRaisesRegex(
+                        settings.SettingsError, "FFMPEG_THREADS"
+                    ):
+                        settings.DefaultSettings(pathlib.Path(f.name))
+
     def test_settings_invalid_json(self) -> None:
         with tempfile.NamedTemporaryFile(mode="w", delete_on_close=False) as f:
             f.write("")
@@ -0,0 +1,247 @@
+"""Store the podcast database in SQLite, saving only what changed."""
+
+import pathlib
+import typing
+
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.orm import Session
+
+import database_format
+import models
+import podcast_episode
+
+# Ids per DELETE, to stay under SQLite's limit on bound parameters.
+_DELETE_BATCH_SIZE = 500
+
+_EpisodeValues_TypeAlias = typing.Tuple[int, int, int]
+
+
+class _SavedShow(typing.NamedTuple):
+    show_id: int
+    next_index: typing.Optional[int]
+    priority: typing.Optional[int]
+    # The id and (index, duration, modification time) of each episode by path.
+    episodes: typing.Dict[str, typing.Tuple[int, _EpisodeValues_TypeAlias]]
+
+
+def _episode_values(
+    episode: podcast_episode.PodcastEpisode,
+) -> _EpisodeValues_TypeAlias:
+    return (episode.index, episode.duration, episode.modification_time)
+
+
+class SqliteStorage(object):
+    def __init__(self, db_path: pathlib.Path):
+        self.engine = models.get_engine(db_path)
+        models.init_db(self.engine)
+        # What's in the database, as of the last load or save.
+        self._saved: typing.Dict[str, _SavedShow] = {}
+
+    def load(self) -> typing.List[database_format.ShowRecord]:
+        """Load every show and episode with one query each."""
+        with Session(self.engine) as session:
+            shows = session.execute(
+                select(
+                    models.ShowModel.id,
+                    models.ShowModel.folder_name,
+                    models.ShowModel.next_index,
+                    models.ShowModel.priority,
+                ).order_by(models.ShowModel.folder_name)
+            ).all()
+            episodes = session.execute(
+                select(
+                    models.EpisodeModel.id,
+                    models.EpisodeModel.show_id,
+                    models.EpisodeModel.path,
+                    models.EpisodeModel.episode_index,
+                    models.EpisodeModel.duration,
+                    models.EpisodeModel.modification_time,
+                ).order_by(models.EpisodeModel.id)
+            ).all()
+
+        episodes_by_show: typing.Dict[int, typing.List[typing.Any]] = dict(
+            (x.id, []) for x in shows
+        )
+        for episode in episodes:
+            episodes_by_show[episode.show_id].append(episode)
+
+        records = []
+        self._saved = {}
+        for show in shows:
+            show_episodes = episodes_by_show[show.id]
+            records.append(
+                database_format.ShowRecord(
+                    show.folder_name,
+                    show.next_index,
+                    [
+                        podcast_episode.PodcastEpisode(
+                            pathlib.Path(x.path),
+                            x.episode_index,
+                            x.duration,
+                            x.modification_time,
+                        )
+                        for x in show_episodes
+                    ],
+                )
+            )
+            self._saved[show.folder_name] = _SavedShow(
+                show.id,
+                show.next_index,
+                show.priority,
+                dict(
+                    (
+                        x.path,
+                        (x.id, (x.episode_index, x.duration, x.modification_time)),
+                    )
+                    for x in show_episodes
+                ),
+            )
+        return records
+
+    def save(
+        self,
+        records: typing.Sequence[database_format.ShowRecord],
+        priorities: typing.Optional[typing.Dict[str, int]] = None,
+    ) -> None:
+        """Make the database match |records|, by only writing the differences.
+
+        |priorities| are the shows' priorities by name, when they're known.
+        """
+        priorities = priorities or {}
+        with models.session_scope(self.engine) as session:
+            names = frozenset(x.name for x in records)
+            removed_shows = [x for name, x in self._saved.items() if name not in names]
+            self._delete(
+                session,
+                models.EpisodeModel.show_id,
+                [x.show_id for x in removed_shows],
+            )
+            self._delete(
+                session, models.ShowModel.id, [x.show_id for x in removed_shows]
+            )
+
+            new_shows = [x for x in records if x.name not in self._saved]
+            show_ids = dict((name, x.show_id) for name, x in self._saved.items())
+            if new_shows:
+                rows = session.execute(
+                    insert(models.ShowModel).returning(
+                        models.ShowModel.id,
+                        models.ShowModel.folder_name,
+                        sort_by_parameter_order=True,
+                    ),
+                    [
+                        {
+                            "folder_name": x.name,
+                            "next_index": x.next_index,
+                            "priority": priorities.get(x.name),
+                        }
+                        for x in new_shows
+                    ],
+                )
+                for row in rows:
+                    show_ids[row.folder_name] = row.id
+
+            show_updates: typing.List[typing.Dict[str, typing.Any]] = []
+            removed_episodes: typing.List[int] = []
+            changed_episodes: typing.List[typing.Dict[str, typing.Any]] = []
+            new_episodes: typing.List[typing.Dict[str, typing.Any]] = []
+            for record in records:
+                show_id = show_ids[record.name]
+                saved = self._saved.get(record.name)
+                saved_episodes = saved.episodes if saved is not None else {}
+                priority = priorities.get(
+                    record.name, saved.priority if saved is not None else None
+                )
+                if saved is not None and (
+                    saved.next_index != record.next_index or saved.priority != priority
+                ):
+                    show_updates.append(
+                        {
+                            "id": show_id,
+                            "next_index": record.next_index,
+                            "priority": priority,
+                        }
+                    )
+
+                paths = set()
+                for episode in record.episodes:
+                    path = str(episode.path)
+                    paths.add(path)
+                    values = _episode_values(episode)
+                    saved_episode = saved_episodes.get(path)
+                    if saved_episode is None:
+                        new_episodes.append(
+                            {
+                                "show_id": show_id,
+                                "path": path,
+                                "episode_index": values[0],
+                                "duration": values[1],
+                                "modification_time": values[2],
+                            }
+                        )
+                    elif saved_episode[1] != values:
+                        changed_episodes.append(
+                            {
+                                "id": saved_episode[0],
+                                "episode_index": values[0],
+                                "duration": values[1],
+                                "modification_time": values[2],
+                            }
+                        )
+                removed_episodes.extend(
+                    x[0] for path, x in saved_episodes.items() if path not in paths
+                )
+
+            self._delete(session, models.EpisodeModel.id, removed_episodes)
+            if show_updates:
+                session.execute(update(models.ShowModel), show_updates)
+            if changed_episodes:
+                session.execute(update(models.EpisodeModel), changed_episodes)
+            new_episode_ids = {}
+            if new_episodes:
+                rows = session.execute(
+                    insert(models.EpisodeModel).returning(
+                        models.EpisodeModel.id,
+                        models.EpisodeModel.show_id,
+                        models.EpisodeModel.path,
+                        sort_by_parameter_order=True,
+                    ),
+                    new_episodes,
+                )
+                for row in rows:
+                    new_episode_ids[(row.show_id, row.path)] = row.id
+
+        saved_shows = {}
+        for record in records:
+            show_id = show_ids[record.name]
+            previous = self._saved.get(record.name)
+            previous_episodes = previous.episodes if previous is not None else {}
+            episodes = {}
+            for episode in record.episodes:
+                path = str(episode.path)
+                previous_episode = previous_episodes.get(path)
+                episode_id = (
+                    previous_episode[0]
+                    if previous_episode is not None
+                    else new_episode_ids[(show_id, path)]
+                )
+                episodes[path] = (episode_id, _episode_values(episode))
+            previous_priority = previous.priority if previous is not None else None
+            saved_shows[record.name] = _SavedShow(
+                show_id,
+                record.next_index,
+                priorities.get(record.name, previous_priority),
+                episodes,
+            )
+        self._saved = saved_shows
+
+    def _delete(
+        self,
+        session: Session,
+        column: typing.Any,
+        ids: typing.List[int],
+    ) -> None:
+        for i in range(0, len(ids), _DELETE_BATCH_SIZE):
+            session.execute(
+                delete(column.class_).where(column.in_(ids[i : i + _DELETE_BATCH_SIZE]))
+            )
@@ -0,0 +1,147 @@
+"""Tests for the SQLite storage backend."""
+
+import pathlib
+import tempfile
+import typing
+import unittest
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+import database_format
+import models
+import podcast_episode
+import sqlite_storage
+
+
+def _fields(
+    records: typing.List[database_format.ShowRecord],
+) -> typing.List[typing.Tuple[str, typing.Optional[int], typing.List[typing.Any]]]:
+    return [
+        (
+            x.name,
+            x.next_index,
+            [(e.path, e.index, e.duration, e.modification_time) for e in x.episodes],
+        )
+        for x in records
+    ]
+
+
+class TestSqliteStorage(unittest.TestCase):
+    def setUp(self) -> None:
+        self._temp_dir = tempfile.TemporaryDirectory()
+        self.root = pathlib.Path(self._temp_dir.name)
+        self.db_path = self.root / "podcast.sqlite"
+        self.storages: typing.List[sqlite_storage.SqliteStorage] = []
+
+    def tearDown(self) -> None:
+        # Release all connections, so Windows can delete the database.
+        for storage in self.storages:
+            storage.engine.dispose()
+        self._temp_dir.cleanup()
+
+    def _storage(self) -> sqlite_storage.SqliteStorage:
+        storage = sqlite_storage.SqliteStorage(self.db_path)
+        self.storages.append(storage)
+        return storage
+
+    def _episode(self, show: str, index: int) -> podcast_episode.PodcastEpisode:
+        return podcast_episode.PodcastEpisode(
+            self.root / show / ("episode_%d.mp3" % (index)),
+            index,
+            60 * index,
+            1330712222 + index,
+        )
+
+    def _episode_ids(
+        self, storage: sqlite_storage.SqliteStorage
+    ) -> typing.Dict[str, int]:
+        with Session(storage.engine) as session:
+            return dict(
+                (x.path, x.id)
+                for x in session.execute(
+                    select(models.EpisodeModel.path, models.EpisodeModel.id)
+                )
+            )
+
+    def test_empty(self) -> None:
+        self.assertEqual([], self._storage().load())
+
+    def test_save_and_load(self) -> None:
+        records = [
+            database_format.ShowRecord("empty_show", None, []),
+            database_format.ShowRecord(
+                "show", 3, [self._episode("show", 1), self._episode("show", 2)]
+            ),
+        ]
+        storage = self._storage()
+        storage.save(records, {"empty_show": 2, "show": 0})
+
+        self.assertEqual(_fields(records), _fields(self._storage().load()))
+
+        storage.save(records, {"empty_show": 1})
+        with Session(storage.engine) as session:
+            self.assertEqual(
+                [("empty_show", 1), ("show", 0)],
+                [
+                    tuple(x)
+                    for x in session.execute(
+                        select(
+                            models.ShowModel.folder_name, models.ShowModel.priority
+                        ).order_by(models.ShowModel.folder_name)
+                    )
+                ],
+            )
+
+    def test_save_only_changes(self) -> None:
+        storage = self._storage()
+        storage.save(
+            [
+                database_format.ShowRecord(
+                    "show", 3, [self._episode("show", 1), self._episode("show", 2)]
+                ),
+                database_format.ShowRecord(
+                    "removed_show", 2, [self._episode("removed_show", 1)]
+                ),
+            ]
+        )
+        kept_ids = self._episode_ids(storage)
+
+        changed = self._episode("show", 2)
+        changed.duration += 1
+        records = [
+            database_format.ShowRecord("new_show", 2, [self._episode("new_show", 1)]),
+            database_format.ShowRecord("show", 4, [changed, self._episode("show", 3)]),
+        ]
+        storage.save(records)
+
+        # Updated episodes keep their rows.
+        self.assertEqual(
+            kept_ids[str(changed.path)],
+            self._episode_ids(storage)[str(changed.path)],
+        )
+        self.assertEqual(_fields(records), _fields(self._storage().load()))
+
+        # Saving again without changes writes nothing new.
+        ids = self._episode_ids(storage)
+        storage.save(records)
+        self.assertEqual(ids, self._episode_ids(storage))
+
+    def test_saves_after_load(self) -> None:
+        self._storage().save(
+            [database_format.ShowRecord("show", 2, [self._episode("show", 1)])]
+        )
+
+        storage = self._storage()
+        records = storage.load()
+        records[0].episodes.append(self._episode("show", 2))
+        storage.save([records[0]._replace(next_index=3)])
+
+        self.assertEqual(
+            _fields([records[0]._replace(next_index=3)]),
+            _fields(self._storage().load()),
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()